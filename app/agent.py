@@ -2,25 +2,34 @@
 import os
 from dotenv import load_dotenv
 
-print("🔧 Agent financier + MÉMOIRE DE SESSION (LangChain v0.3)…")
 load_dotenv()
 
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.agents import AgentExecutor, create_react_agent
+from langchain_core.runnables import RunnablePassthrough
+from langchain_core.tools import render_text_description
+from langchain.agents import AgentExecutor
+from langchain.agents.output_parsers import ReActSingleInputOutputParser
 
-# Outils
-from app.tools.rag_finance_docs import search_financial_documents
-from app.tools.recherche_web_tavily import search_web_tavily
-from app.tools.stock_data_api import get_stock_data
-from app.tools.calculatrice_financiere import calculatrice_financiere
-from app.tools.email_tools import draft_email, send_email_smtp
+# Outils (registre paresseux : chaque module d'outil est importé à son premier appel)
+from app.tools.registry import get_tools
 
 # Routeur
 from app.router import build_router, route_query
 
 # Mémoire
-from app.memory import with_memory  # get_session_history non requis ici
+from app.memory import session_scope, with_memory  # get_session_history non requis ici
+
+# Appels OpenAI (limites RPM/TPM partagées)
+from app.llm_scheduler import make_chat_model
+
+# Scratchpad compact (observations anciennes résumées)
+from app.scratchpad import format_compact_scratchpad
+
+# Préchargement spéculatif de l'outil probable (pendant le routage)
+from app import prefetch
+
+# Traces / métriques
+from app.tracing import TracingCallback, setup_tracing, span, trace
 
 # Config
 from app.config import validate_config, MODEL_NAME, CREATOR_NAME
@@ -78,6 +87,11 @@ RÈGLES OUTILS (TRÈS IMPORTANTES) :
     1) Si les champs to/subject/body ne sont pas fournis, utilise d'abord `draft_email` pour proposer un brouillon.
     2) Une fois confirmé par l'utilisateur ET si tout est fourni, utilise `send_email_smtp`.
     3) N'affirme JAMAIS avoir envoyé un e-mail si l'outil d'envoi renvoie une erreur.
+    4) `send_email_smtp` met l'e-mail en file d'envoi : dis qu'il est "en cours d'envoi" (avec son numéro), pas "envoyé".
+    5) Même e-mail personnalisé pour une LISTE de destinataires (clients, fichier CSV) : un seul appel à
+       `bulk_email` (aperçu d'abord, puis 'send=yes' après confirmation), jamais une boucle de send_email_smtp.
+- Chiffre précis d'un rapport (CA, segment, BPA, marge d'une année) : essaie d'abord
+  `financial_facts` ; s'il ne trouve rien, utilise `search_financial_documents`.
 
 - Quand tu choisis un outil, n'ajoute RIEN après la ligne "Action Input: ...".
   Le système exécutera l'outil et te fournira "Observation:" tout seul au tour suivant.
@@ -101,17 +115,20 @@ Thought / Action / Action Input / (Observation fourni par le système) ... puis
 """
 
 
-def build_agent():
-    llm = ChatOpenAI(model=os.getenv("MODEL_NAME", MODEL_NAME or "gpt-4o-mini"), temperature=0)
+# Un seul callback partagé (thread-safe) : spans LLM et outils de toutes les requêtes.
+_TRACING = TracingCallback()
+
+
+def build_agent(llm=None, verbose: bool = True):
+    """
+    Construit l'AgentExecutor ReAct.
+    `llm` permet d'injecter un autre modèle de chat (ex: stand-in de bench/replay.py).
+    """
+    setup_tracing()
+    if llm is None:
+        llm = make_chat_model(model=os.getenv("MODEL_NAME", MODEL_NAME or "gpt-4o-mini"), temperature=0)
 
-    tools = list(map(_as_tool, [
-        search_financial_documents,
-        search_web_tavily,
-        get_stock_data,
-        calculatrice_financiere,
-        draft_email,
-        send_email_smtp,
-        ]))
+    tools = list(map(_as_tool, get_tools()))
 
     # ✅ Mémoire: on insère le placeholder de messages 'chat_history'
     prompt = ChatPromptTemplate.from_messages([
@@ -121,12 +138,21 @@ def build_agent():
         ("assistant", "{agent_scratchpad}"),
     ]).partial(creator_name=CREATOR_NAME)
 
-    react_agent = create_react_agent(llm=llm, tools=tools, prompt=prompt)
+    # Équivalent de create_react_agent, mais avec notre scratchpad : la dernière
+    # observation reste entière, les précédentes sont résumées sous un plafond de tokens.
+    prompt = prompt.partial(tools=render_text_description(tools), tool_names=", ".join(t.name for t in tools))
+    react_agent = (
+        RunnablePassthrough.assign(agent_scratchpad=lambda x: format_compact_scratchpad(
+            x.get("prefetched", []) + x["intermediate_steps"]))
+        | prompt
+        | llm.bind(stop=["\nObservation"])
+        | ReActSingleInputOutputParser()
+    )
 
     agent_executor = AgentExecutor(
         agent=react_agent,
         tools=tools,
-        verbose=True,
+        verbose=verbose,
         return_intermediate_steps=True,
         max_iterations=8,
         handle_parsing_errors=True,
@@ -139,46 +165,95 @@ def build_router_llm():
     return build_router(model_name=os.getenv("MODEL_NAME", MODEL_NAME or "gpt-4o-mini"))
 
 
-def _invoke_with_memory(agent, payload: dict, session_id: str = "local"):
+def _invoke_with_memory(agent, payload: dict, session_id: str = "local", callbacks=None):
     """
     Enveloppe l'agent avec la mémoire et invoque avec un session_id.
     Le prompt doit contenir MessagesPlaceholder('chat_history').
+    `callbacks` : handlers supplémentaires (ex: flux SSE des étapes, app/server.py).
     """
     runnable = with_memory(agent)  # léger wrapper, store partagé par session_id
-    return runnable.invoke(
-        payload,
-        config={"configurable": {"session_id": session_id}},
-    )
+    with span("agent"):
+        return runnable.invoke(
+            payload,
+            config={"configurable": {"session_id": session_id}, "callbacks": [_TRACING, *(callbacks or [])]},
+        )
 
 
-def handle_query(agent, router_llm, user_input: str, session_id: str = "local"):
-    route = route_query(router_llm, user_input)
+def handle_query(agent, router_llm, user_input: str, session_id: str = "local", callbacks=None,
+                 namespace=None):
+    """`namespace` : corpus RAG du desk / client (voir rag/namespaces.py), retenu par la session."""
+    with trace("handle_query", session_id=session_id) as t, session_scope(session_id, namespace) as ns:
+        if ns:
+            t.attrs["namespace"] = ns
+        spec = prefetch.start(agent.tools, user_input)      # tourne pendant le routage
+        with span("router") as attrs:
+            route = route_query(router_llm, user_input)
+            attrs["action"] = route.action
+        t.attrs["route"] = route.action
+        step = prefetch.take(spec, route.action)
+        if spec is not None:
+            t.attrs["prefetch"] = spec.tool if step else "cancelled"
+        result = _run_routed(agent, route, user_input, session_id, prefetched=step, callbacks=callbacks)
+        result["trace_id"] = t.trace_id
+        result["route"] = route.action
+        return result
+
+
+def _run_routed(agent, route, user_input: str, session_id: str, prefetched=None, callbacks=None):
     action_to_tool = {
         "calc": "calculatrice_financiere",
         "stock": "stock_data_api",
         "web": "search_web_tavily",
         "RAG": "search_financial_documents",
         "email": "draft_email",
+        "risk": "risk_analytics",
+        "portfolio": "portfolio_analytics",
+        "rebalance": "portfolio_analytics",
+        "options": "options_pricing",
+        "bonds": "bond_analytics",
+        "kpi": "financial_facts",
+        "statements": "financial_facts",
     }
     hint = ""
     if route.action == "smalltalk":
         hint = "C'est du smalltalk. Réponds SANS outil, mais en utilisant OBLIGATOIREMENT le format 'Final Answer:'."
     elif route.action == "email":
         hint = ("Si to/subject/body manquent → Action: draft_email. "
-                "Sinon et si l'utilisateur confirme → Action: send_email_smtp.")
+                "Sinon et si l'utilisateur confirme → Action: send_email_smtp. "
+                "Liste de destinataires → Action: bulk_email.")
     else:
         hint = f"UTILISE d'abord l'outil: {action_to_tool.get(route.action, '')}".strip()
 
-    return _invoke_with_memory(agent, {"input": user_input, "hint": hint}, session_id=session_id)
+    if prefetched is None:
+        return _invoke_with_memory(agent, {"input": user_input, "hint": hint}, session_id=session_id,
+                                   callbacks=callbacks)
+
+    # Étape déjà faite (préchargement) : l'observation est dans le scratchpad.
+    hint = (f"L'outil {prefetched[0].tool} a déjà été appelé (Observation ci-dessous). "
+            "Si elle suffit, donne directement la Final Answer ; sinon choisis une autre Action.")
+    result = _invoke_with_memory(agent, {"input": user_input, "hint": hint, "prefetched": [prefetched]},
+                                 session_id=session_id, callbacks=callbacks)
+    result["intermediate_steps"] = [prefetched] + list(result.get("intermediate_steps", []))
+    return result
 
 
-def handle_query_force(agent, user_input: str, tool_name: str, session_id: str = "local"):
+def handle_query_force(agent, user_input: str, tool_name: str, session_id: str = "local", callbacks=None,
+                       namespace=None):
     """Forcer l'utilisation d'un outil via le HINT (bypass routeur)."""
     hint = f"UTILISE d'abord l'outil: {tool_name}"
-    return _invoke_with_memory(agent, {"input": user_input, "hint": hint}, session_id=session_id)
+    with trace("handle_query", session_id=session_id, route=f"force:{tool_name}") as t, \
+            session_scope(session_id, namespace) as ns:
+        if ns:
+            t.attrs["namespace"] = ns
+        result = _invoke_with_memory(agent, {"input": user_input, "hint": hint}, session_id=session_id,
+                                     callbacks=callbacks)
+        result["trace_id"] = t.trace_id
+        result["route"] = f"force:{tool_name}"
+        return result
 
 
 if __name__ == "__main__":
+    print("🔧 Agent financier + MÉMOIRE DE SESSION (LangChain v0.3)…")
     print("🎯 Test de l'agent financier AVEC mémoire…")
     try:
         validate_config()
@@ -233,6 +308,7 @@ if __name__ == "__main__":
     print("\n" + "="*40)
     print("TEST 4B: stock_data_api (APPEL DIRECT)")
     try:
+        from app.tools.stock_data_api import get_stock_data
         print("➡️ Tool.invoke('pe NVDA') ->", get_stock_data.invoke("pe NVDA"))
         print("➡️ Tool.invoke('close NVDA 1mo 1d') ->", get_stock_data.invoke("close NVDA 1mo 1d"))
     except Exception as e:
@@ -253,6 +329,7 @@ if __name__ == "__main__":
     print("\n" + "="*40)
     print("TEST 5B: RAG (APPEL DIRECT)")
     try:
+        from app.tools.rag_finance_docs import search_financial_documents
         r5b = search_financial_documents.invoke("Liste les segments de revenus de NVIDIA pour 2024 d'après mes PDF.")
         print("➡️ Tool.invoke ->\n", r5b)
     except Exception as e:
@@ -0,0 +1,225 @@
+# app/batch_runner.py
+"""
+Exécution "headless" d'un lot de questions (ex: des milliers de questions d'analystes la nuit).
+
+Entrée  : fichier JSONL, une question par ligne :
+    {"id": "q1", "question": "CAGR de 1000 à 1300 en 3 ans ?"}
+    {"id": "q2", "question": "...", "session_id": "client-42"}     # mémoire partagée
+    {"id": "q3", "question": "...", "tool": "stock_data_api"}      # outil forcé
+    {"id": "q4", "question": "...", "namespace": "desk-taux"}      # corpus RAG du desk
+    ("input" est accepté à la place de "question" ; sans "id", le numéro de ligne sert d'id)
+Sortie  : fichier JSONL, une ligne par question : output, étapes intermédiaires
+          (outil, entrée, observation), route, tokens, durée, erreur éventuelle.
+
+- Les questions d'une même session_id sont traitées dans l'ordre (la mémoire en dépend) ;
+  les sessions différentes tournent en parallèle (--concurrency).
+- Budget global : on n'entame plus de nouvelle question une fois --max-tokens ou
+  --max-requests (appels LLM) consommés ; --qpm espace les démarrages.
+- Reprise : relancer la même commande saute les questions déjà réussies
+  (les lignes en erreur sont retentées).
+
+Usage:
+    python -m app.batch_runner questions.jsonl results.jsonl --concurrency 8 --max-tokens 2000000
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from langchain_community.callbacks import get_openai_callback
+
+from app.agent import build_agent, build_router_llm, handle_query, handle_query_force
+from app.config import validate_config
+from app.llm_scheduler import get_scheduler, priority, track_wait
+from app.memory import clear_session_history
+
+
+class Budget:
+    """Budget partagé (tokens, requêtes LLM) et espacement des démarrages, thread-safe."""
+
+    def __init__(self, max_tokens: Optional[int] = None, max_requests: Optional[int] = None,
+                 qpm: Optional[float] = None):
+        self.max_tokens = max_tokens
+        self.max_requests = max_requests
+        self.interval = 60.0 / qpm if qpm else 0.0
+        self.tokens = self.requests = 0
+        self.cost = 0.0
+        self._next_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def exhausted(self) -> bool:
+        with self._lock:
+            return ((self.max_tokens is not None and self.tokens >= self.max_tokens)
+                    or (self.max_requests is not None and self.requests >= self.max_requests))
+
+    def pace(self) -> None:
+        """Attend le créneau de démarrage suivant (--qpm)."""
+        if not self.interval:
+            return
+        with self._lock:
+            slot = max(self._next_start, time.monotonic())
+            self._next_start = slot + self.interval
+        time.sleep(max(0.0, slot - time.monotonic()))
+
+    def charge(self, tokens: int, requests: int, cost: float) -> None:
+        with self._lock:
+            self.tokens += tokens
+            self.requests += requests
+            self.cost += cost
+
+
+def read_questions(path: str) -> List[Dict]:
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            q = json.loads(line)
+            q["id"] = str(q.get("id", lineno))
+            q["question"] = q.get("question") or q.get("input") or ""
+            items.append(q)
+    return items
+
+
+def done_ids(path: str) -> set:
+    """Ids déjà traités sans erreur dans un fichier de résultats existant (reprise)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                r = json.loads(line)
+            except json.JSONDecodeError:
+                continue                  # dernière ligne tronquée par une interruption
+            if not r.get("error"):
+                done.add(str(r.get("id")))
+    return done
+
+
+def _steps(result: Dict) -> List[Dict]:
+    out = []
+    for action, observation in result.get("intermediate_steps", []) or []:
+        out.append({
+            "tool": getattr(action, "tool", str(action)),
+            "tool_input": getattr(action, "tool_input", None),
+            "observation": str(observation),
+        })
+    return out
+
+
+class BatchRunner:
+    def __init__(self, agent, router_llm, out_path: str, budget: Budget, concurrency: int = 4):
+        self.agent = agent
+        self.router_llm = router_llm
+        self.out_path = out_path
+        self.budget = budget
+        self.concurrency = concurrency
+        self.stop = threading.Event()
+        self.counts = {"ok": 0, "error": 0, "skipped_budget": 0}
+        self._lock = threading.Lock()
+        self._out = open(out_path, "a", encoding="utf-8")
+
+    def _write(self, record: Dict) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._out.write(line + "\n")
+            self._out.flush()              # chaque résultat est sur disque : reprise possible
+            self.counts["error" if record.get("error") else "ok"] += 1
+
+    def run_one(self, q: Dict, session_id: str) -> None:
+        self.budget.pace()
+        record = {"id": q["id"], "question": q["question"], "session_id": session_id,
+                  "tool": q.get("tool") or None}
+        t0 = time.perf_counter()
+        with get_openai_callback() as cb, priority("batch"), track_wait() as wait:
+            try:
+                if q.get("tool"):
+                    res = handle_query_force(self.agent, q["question"], q["tool"], session_id=session_id,
+                                             namespace=q.get("namespace"))
+                else:
+                    res = handle_query(self.agent, self.router_llm, q["question"], session_id=session_id,
+                                       namespace=q.get("namespace"))
+                record.update(output=res.get("output", ""), intermediate_steps=_steps(res),
+                              hint=res.get("hint"), error=None)
+            except Exception as e:
+                record.update(output=None, intermediate_steps=[], error=f"{type(e).__name__}: {e}")
+        record["timings"] = {"elapsed_s": round(time.perf_counter() - t0, 3),
+                             "queue_wait_s": round(wait.seconds, 3)}
+        record["tokens"] = {"prompt": cb.prompt_tokens, "completion": cb.completion_tokens,
+                            "total": cb.total_tokens, "llm_requests": cb.successful_requests,
+                            "cost_usd": round(cb.total_cost, 6)}
+        self.budget.charge(cb.total_tokens, cb.successful_requests, cb.total_cost)
+        self._write(record)
+
+    def run_session(self, session_id: str, items: List[Dict]) -> None:
+        try:
+            for q in items:
+                if self.stop.is_set():
+                    return
+                if self.budget.exhausted():
+                    with self._lock:
+                        self.counts["skipped_budget"] += 1
+                    continue
+                self.run_one(q, session_id)
+        finally:
+            clear_session_history(session_id)   # libère la mémoire des sessions terminées
+
+    def run(self, questions: Iterable[Dict]) -> Dict[str, int]:
+        sessions: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        for q in questions:
+            sid = q.get("session_id") or f"batch-{q['id']}"
+            sessions.setdefault(sid, []).append(q)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as ex:
+            futures = [ex.submit(self.run_session, sid, items) for sid, items in sessions.items()]
+            try:
+                for f in futures:
+                    f.result()
+            except KeyboardInterrupt:
+                # on termine les questions en cours, on n'en commence pas de nouvelles
+                print("\nInterruption : fin des questions en cours…", file=sys.stderr)
+                self.stop.set()
+                for f in futures:
+                    f.cancel()
+        self._out.close()
+        return self.counts
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Exécute un lot de questions JSONL avec l'agent financier.")
+    p.add_argument("input", help="questions JSONL")
+    p.add_argument("output", help="résultats JSONL (complété en cas de reprise)")
+    p.add_argument("--concurrency", type=int, default=4, help="sessions traitées en parallèle")
+    p.add_argument("--max-tokens", type=int, default=None, help="budget global de tokens LLM")
+    p.add_argument("--max-requests", type=int, default=None, help="budget global d'appels LLM")
+    p.add_argument("--qpm", type=float, default=None, help="questions démarrées par minute (max)")
+    args = p.parse_args(argv)
+
+    validate_config()
+    questions = read_questions(args.input)
+    done = done_ids(args.output)
+    todo = [q for q in questions if q["id"] not in done]
+    print(f"📋 {len(questions)} questions, {len(done)} déjà traitées, {len(todo)} à traiter.")
+
+    runner = BatchRunner(build_agent(), build_router_llm(), args.output,
+                         Budget(args.max_tokens, args.max_requests, args.qpm), args.concurrency)
+    t0 = time.perf_counter()
+    counts = runner.run(todo)
+    elapsed = time.perf_counter() - t0
+    b = runner.budget
+    print(f"✅ {counts['ok']} ok, {counts['error']} en erreur, {counts['skipped_budget']} non lancées (budget) "
+          f"en {elapsed:.1f}s ({(counts['ok'] + counts['error']) / max(elapsed, 1e-9):.2f} q/s)")
+    print(f"   Tokens: {b.tokens} | Appels LLM: {b.requests} | Coût estimé: ${b.cost:.4f}")
+    s = get_scheduler().stats()["batch"]
+    print(f"   Attente ordonnanceur OpenAI: moy {s['avg_wait_s']:.2f}s, max {s['max_wait_s']:.2f}s")
+    return 0 if counts["error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# app/cache.py
+"""
+Cache en mémoire à durée de vie (TTL) avec regroupement des requêtes ("single-flight").
+
+- `get_or_compute(key, fn)` : renvoie la valeur en cache si elle est encore fraîche,
+  sinon appelle `fn()` UNE seule fois même si plusieurs threads demandent la même clé
+  au même moment : les autres attendent le résultat du premier.
+- Les erreurs ne sont pas mises en cache (elles sont propagées à tous les appelants
+  en attente, puis la clé est libérée).
+- `stats()` expose les compteurs (hits, misses, coalesced, taux de hit) pour le suivi.
+- `stale_ttl` : une entrée expirée reste lisible `stale_ttl` secondes de plus via
+  `get_stale(key)` (réponse dégradée quand l'amont est en panne).
+"""
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+def normalize_query(text: str) -> str:
+    """'  Quelles NEWS sur Nvidia ?? ' -> 'quelles news sur nvidia' (casse, accents, ponctuation, espaces)."""
+    t = unicodedata.normalize("NFKD", text or "")
+    t = "".join(c for c in t if not unicodedata.combining(c)).lower()
+    t = re.sub(r"[^\w\s]", " ", t)
+    return re.sub(r"\s+", " ", t).strip()
+
+
+class TTLCache:
+    """Cache LRU borné, entrées expirées après `ttl` secondes, thread-safe."""
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 1024, name: str = "cache", stale_ttl: float = 0.0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.name = name
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()   # clé -> (expire_at, valeur)
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.coalesced = self.errors = self.stale_hits = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            return self._get_locked(key)
+
+    def _get_locked(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        now = time.monotonic()
+        if item[0] < now:
+            if item[0] + self.stale_ttl < now:
+                del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return item[1]
+
+    def get_stale(self, key: Hashable) -> Optional[Any]:
+        """Valeur même expirée (dans la fenêtre `stale_ttl`), sinon None."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] + self.stale_ttl < time.monotonic():
+                return None
+            self.stale_hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            value = self._get_locked(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            fut = self._inflight.get(key)
+            if fut is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                fut = self._inflight[key] = Future()
+                leader = True
+
+        if not leader:
+            return fut.result()          # attend le calcul en cours (ou relance son erreur)
+
+        try:
+            value = fn()
+        except BaseException as e:
+            with self._lock:
+                self.errors += 1
+                del self._inflight[key]
+            fut.set_exception(e)
+            raise
+        self.set(key, value)
+        with self._lock:
+            del self._inflight[key]
+        fut.set_result(value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "stale_hits": self.stale_hits,
+                # un appel regroupé n'a pas déclenché d'appel amont : il compte comme un hit
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
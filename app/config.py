@@ -11,6 +11,7 @@ Variables gérées :
 - Chemins vers les répertoires de données (data/)
 - Chemin vers le stockage du vector store (vectorstore/)
 - Choix du backend pour le vector store (faiss ou chroma)
+- Choix du backend d'embeddings (openai, local, onnx)
 """
 
 # Importe les modules nécessaires
@@ -29,13 +30,9 @@ load_dotenv()
 # Si elle n'est pas trouvée, tente par sécurité "openai_key" (utilisé dans certains TP).
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") or os.getenv("openai_key")
 
-# Vérification de sécurité : si aucune clé n'est trouvée, l'application ne
-# peut pas fonctionner. On arrête le programme avec un message d'erreur clair.
-if not OPENAI_API_KEY:
-    raise SystemExit(
-        "ERREUR: OPENAI_API_KEY (ou openai_key) non définie dans le fichier .env. "
-        "Veuillez créer un compte sur platform.openai.com pour en obtenir une et le mettre dans le .env."
-    )
+# Pas de vérification ici : importer la config ne doit jamais arrêter le programme
+# (outils hors ligne, tests, profil de démarrage...). Les points d'entrée appellent
+# validate_config() (en bas de ce fichier), qui donne un message d'erreur clair.
 
 # Définit le modèle LLM à utiliser pour la génération.
 # Utilise "gpt-4o-mini" par défaut si la variable MODEL_NAME n'est pas
@@ -45,6 +42,26 @@ MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o-mini")
 # creator 
 CREATOR_NAME = os.getenv("CREATOR_NAME", "Diallo Mamadou Cherif")
 
+# Budgets OpenAI partagés par TOUS les appels du processus (chat + embeddings),
+# voir app/llm_scheduler.py : requêtes/minute et tokens/minute. 0 = pas de limite.
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = float(os.getenv("OPENAI_TPM", "200000"))
+
+# Scratchpad de l'agent ReAct (voir app/scratchpad.py) : les SCRATCHPAD_KEEP_LAST
+# dernières observations restent entières, les plus anciennes sont résumées
+# (SCRATCHPAD_SUMMARY_CHARS caractères) puis réduites à une référence si le
+# scratchpad dépasse SCRATCHPAD_MAX_TOKENS.
+SCRATCHPAD_MAX_TOKENS = int(os.getenv("SCRATCHPAD_MAX_TOKENS", "1500"))
+SCRATCHPAD_SUMMARY_CHARS = int(os.getenv("SCRATCHPAD_SUMMARY_CHARS", "400"))
+SCRATCHPAD_KEEP_LAST = int(os.getenv("SCRATCHPAD_KEEP_LAST", "1"))
+
+# Préchargement spéculatif (voir app/prefetch.py) : l'outil probable (RAG, cours,
+# CAGR) est lancé pendant le routage ; son résultat est attendu au plus
+# PREFETCH_WAIT secondes une fois la catégorie confirmée. PREFETCH_ENABLED=0 pour couper.
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1").lower() not in ("0", "false", "no")
+PREFETCH_WAIT = float(os.getenv("PREFETCH_WAIT", "10"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "8"))
+
 
 # === Section 2: Configuration du RAG (Retrieval-Augmented Generation) ===
 # 
@@ -66,6 +83,29 @@ PERSIST_DIR = os.getenv("PERSIST_PATH", "vectorstore")
 # faiss est développé par Facebook(plus rapide, comme bloc-notes), chroma(petite base de données) est développé par ChromaDB.
 VS_BACKEND = os.getenv("VECTORSTORE_BACKEND", "faiss")  # Options: 'faiss' ou 'chroma'
 
+# Moteur d'embeddings du RAG (le MÊME doit servir à l'ingestion et aux requêtes,
+# relancer `python -m rag.ingest` après un changement), voir rag/embeddings.py :
+# 'openai' : OpenAIEmbeddings (réseau, payant, ~100-300 ms par requête) ;
+# 'local'  : hachage de n-grammes + projection SVD apprise à l'ingestion, CPU, sans réseau ;
+# 'onnx'   : modèle ONNX local (ONNX_MODEL_DIR contenant model.onnx + tokenizer.json,
+#            nécessite `pip install onnxruntime`).
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "openai")
+LOCAL_EMBED_DIM = int(os.getenv("LOCAL_EMBED_DIM", "256"))
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "models/embeddings")
+
+# Base SQLite des faits financiers structurés (KPI extraits des tableaux des
+# rapports à l'ingestion, voir rag/facts.py). Par défaut à côté de l'index.
+FACTS_DB = os.getenv("FACTS_DB", os.path.join(PERSIST_DIR, "facts.sqlite"))
+
+# Espaces de noms (un corpus par desk / client, voir rag/namespaces.py) : l'espace
+# RAG_DEFAULT_NAMESPACE reste l'index historique de PERSIST_DIR, les autres ont leur
+# propre index (et base de faits) sous RAG_NAMESPACES_DIR/<nom>/, documents dans
+# DOCS_DIR/<nom>/. Un worker garde au plus RAG_MAX_NAMESPACES index en mémoire
+# (les moins récemment interrogés sont déchargés, rechargés à la demande).
+RAG_DEFAULT_NAMESPACE = os.getenv("RAG_DEFAULT_NAMESPACE", "default")
+RAG_NAMESPACES_DIR = os.getenv("RAG_NAMESPACES_DIR", os.path.join(PERSIST_DIR, "namespaces"))
+RAG_MAX_NAMESPACES = int(os.getenv("RAG_MAX_NAMESPACES", "8"))
+
 
 # === Section 3: Configuration des Outils (Tools) ===
 
@@ -74,6 +114,84 @@ VS_BACKEND = os.getenv("VECTORSTORE_BACKEND", "faiss")  # Options: 'faiss' ou 'c
 # Cette clé est nécessaire pour l'outil `recherche_web_tavily.py`.
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 
+# Cache des recherches web : durée de vie (secondes) et nombre maximal d'entrées.
+# Une même question (normalisée) posée dans ce délai réutilise résultats et résumé.
+WEB_CACHE_TTL = float(os.getenv("WEB_CACHE_TTL", "300"))
+WEB_CACHE_MAX = int(os.getenv("WEB_CACHE_MAX", "512"))
+
+# Dossier des fichiers que les outils peuvent lire (file=chaine.csv, book.csv,
+# clients.csv...). Le nom vient du LLM : tout chemin hors de ce dossier et toute
+# URL sont refusés (voir app/user_files.py).
+USER_FILES_DIR = os.getenv("USER_FILES_DIR", "userfiles")
+
+# === Section 4: Données de marché ===
+# Dossier du stockage local des séries OHLCV (colonnes NumPy memory-mappées,
+# voir app/price_store.py). Les historiques y sont ajoutés de façon incrémentale.
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", "pricestore")
+
+# Durée (en secondes) pendant laquelle les données stockées sont considérées
+# comme fraîches : au-delà, seule la fin de la série est retéléchargée.
+PRICE_STORE_TTL = float(os.getenv("PRICE_STORE_TTL", "900"))
+
+# === Section 5: E-mails sortants ===
+# Les envois passent par une file d'attente SQLite (voir app/mail_queue.py)
+# vidée en arrière-plan par MAIL_WORKERS threads, qui partagent un pool de
+# SMTP_POOL_SIZE sessions SMTP déjà authentifiées.
+MAIL_QUEUE_DB = os.getenv("MAIL_QUEUE_DB", "mailqueue.sqlite")
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+
+# Nouvelles tentatives en cas d'échec temporaire : délai MAIL_RETRY_BASE secondes,
+# doublé à chaque essai, puis abandon (statut 'failed') après MAIL_MAX_ATTEMPTS.
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_RETRY_BASE = float(os.getenv("MAIL_RETRY_BASE", "2"))
+
+# === Section 6: Observabilité ===
+# Traces par requête et métriques (voir app/tracing.py). Exportateur :
+# 'json' (une ligne JSON par requête dans TRACE_LOG, ou stderr si vide),
+# 'prometheus' (endpoint local http://127.0.0.1:METRICS_PORT/metrics) ou 'none'.
+# Serveur à plusieurs processus : un seul worker obtient METRICS_PORT, scraper
+# plutôt la route /metrics de chaque worker (app/server.py).
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACE_LOG = os.getenv("TRACE_LOG", "")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+# === Section 7: Service HTTP (app/server.py) ===
+# SERVER_WORKERS requêtes traitées en parallèle, SERVER_QUEUE en attente au plus :
+# au-delà, réponse HTTP 429 immédiate (Retry-After). SESSION_MAX = nombre de
+# sessions gardées en mémoire (les moins récemment utilisées sont oubliées).
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "8"))
+SERVER_QUEUE = int(os.getenv("SERVER_QUEUE", "32"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+
+# === Section 8: Résilience des appels amont ===
+# Délais maximaux (secondes) par amont, voir app/resilience.py : au-delà, l'appel est
+# abandonné et l'outil répond en mode dégradé (cache, données stockées, message clair).
+YFINANCE_TIMEOUT = float(os.getenv("YFINANCE_TIMEOUT", "15"))
+TAVILY_TIMEOUT = float(os.getenv("TAVILY_TIMEOUT", "12"))
+RETRIEVER_TIMEOUT = float(os.getenv("RETRIEVER_TIMEOUT", "10"))
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "20"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+# Requête doublée si la première n'a pas répondu après N secondes (0 = jamais).
+# Réservé aux appels idempotents (recherche Tavily, P/E yfinance).
+TAVILY_HEDGE_AFTER = float(os.getenv("TAVILY_HEDGE_AFTER", "4"))
+YFINANCE_HEDGE_AFTER = float(os.getenv("YFINANCE_HEDGE_AFTER", "0"))
+
+# Disjoncteurs : ouverts après BREAKER_FAILURES échecs consécutifs, appel d'essai
+# après BREAKER_RESET_S secondes. RESILIENCE_WORKERS = threads (et appels en cours
+# au plus) PAR amont : un amont bloqué ne peut pas priver les autres de threads.
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_S = float(os.getenv("BREAKER_RESET_S", "30"))
+RESILIENCE_WORKERS = int(os.getenv("RESILIENCE_WORKERS", "16"))
+
+# Réponses périmées conservées (secondes après expiration) pour servir une
+# réponse dégradée quand l'amont est en panne (cache web, P/E).
+STALE_TTL = float(os.getenv("STALE_TTL", "86400"))
+
 # Vérification de sécurité : Si la recherche web est considérée comme
 # --- AU LIEU DE lever SystemExit directement, fais ceci ---
 def validate_config():
@@ -81,4 +199,5 @@ def validate_config():
     if not OPENAI_API_KEY: missing.append("OPENAI_API_KEY")
     if not TAVILY_API_KEY: missing.append("TAVILY_API_KEY")
     if missing:
-        raise SystemExit(f"ERREUR: clés manquantes: {', '.join(missing)}")
+        raise SystemExit(f"ERREUR: clés manquantes: {', '.join(missing)} (à définir dans le fichier .env ; "
+                         "clé OpenAI sur platform.openai.com)")
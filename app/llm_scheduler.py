@@ -0,0 +1,269 @@
+# app/llm_scheduler.py
+"""
+Ordonnanceur unique pour TOUS les appels OpenAI du processus (chat + embeddings).
+
+Le routeur, l'agent, le résumé web et les embeddings du RAG appellent OpenAI
+chacun de leur côté : sous charge ils prennent des 429 ensemble puis réessaient
+ensemble. Ici, chaque appel passe d'abord par `LLMScheduler.acquire()` :
+- deux seaux à jetons partagés, requêtes/minute (OPENAI_RPM) et tokens/minute
+  (OPENAI_TPM), le coût en tokens étant estimé avant l'appel (tiktoken) puis
+  corrigé avec l'usage réel renvoyé par l'API ;
+- file à priorités : le chat interactif passe avant le batch, qui passe avant
+  l'ingestion (`with priority("batch"): ...`, porté par une contextvar) ;
+- le temps d'attente de chaque appel est mesuré (`track_wait()`, `stats()`).
+- chaque client a un délai réseau (OPENAI_TIMEOUT) et un nombre borné de
+  nouvelles tentatives (OPENAI_MAX_RETRIES) : plus d'appel suspendu sans fin.
+
+Les clients sont créés via `make_chat_model()` / `make_embeddings()`.
+"""
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from app.config import OPENAI_MAX_RETRIES, OPENAI_RPM, OPENAI_TIMEOUT, OPENAI_TPM
+from app.tracing import METRICS
+
+PRIORITIES = {"interactive": 0, "batch": 1, "ingest": 2}
+DEFAULT_COMPLETION_TOKENS = 256     # estimation de la réponse quand max_tokens n'est pas fixé
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("llm_priority", default="interactive")
+_wait_box: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar("llm_wait", default=None)
+
+
+@contextmanager
+def priority(level: str):
+    """Fixe la priorité des appels LLM faits dans ce bloc ('interactive', 'batch', 'ingest')."""
+    if level not in PRIORITIES:
+        raise ValueError(f"Priorité inconnue: {level} (attendu: {', '.join(PRIORITIES)})")
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class _WaitTracker:
+    def __init__(self, box: List[float]):
+        self._box = box
+
+    @property
+    def seconds(self) -> float:
+        return self._box[0]
+
+    @property
+    def calls(self) -> int:
+        return int(self._box[1])
+
+
+@contextmanager
+def track_wait():
+    """Cumule l'attente passée dans l'ordonnanceur par les appels de ce bloc (une requête utilisateur)."""
+    box = [0.0, 0]
+    token = _wait_box.set(box)
+    try:
+        yield _WaitTracker(box)
+    finally:
+        _wait_box.reset(token)
+
+
+_ENCODER = None
+
+
+def estimate_tokens(text: str) -> int:
+    global _ENCODER
+    if _ENCODER is None:
+        try:
+            import tiktoken
+            _ENCODER = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _ENCODER = False
+    if _ENCODER:
+        return len(_ENCODER.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+class _Bucket:
+    """Seau à jetons (capacité = débit par minute, rechargé en continu). Le niveau peut devenir négatif (dette)."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.level = per_minute
+        self.stamp = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Secondes à attendre avant de pouvoir prélever `amount` (0 si possible tout de suite)."""
+        self._refill(now)
+        need = min(amount, self.capacity) - self.level       # une requête > capacité passe quand le seau est plein
+        return max(0.0, need / self.rate)
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+
+class LLMScheduler:
+    """Limiteur RPM/TPM partagé + file à priorités (0 = plus prioritaire). Désactivé si rpm = tpm = 0."""
+
+    def __init__(self, rpm: float = OPENAI_RPM, tpm: float = OPENAI_TPM):
+        self.rpm = _Bucket(rpm) if rpm > 0 else None
+        self.tpm = _Bucket(tpm) if tpm > 0 else None
+        self._cond = threading.Condition()
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._stats: Dict[str, Dict[str, float]] = {
+            p: {"calls": 0, "wait_s": 0.0, "max_wait_s": 0.0, "tokens_est": 0, "tokens_real": 0} for p in PRIORITIES}
+
+    def _delay(self, tokens: int, now: float) -> float:
+        d = 0.0
+        if self.rpm:
+            d = max(d, self.rpm.delay(1, now))
+        if self.tpm:
+            d = max(d, self.tpm.delay(tokens, now))
+        return d
+
+    def acquire(self, tokens: int, level: Optional[str] = None) -> float:
+        """Bloque jusqu'à ce que l'appel puisse partir ; renvoie le temps d'attente (s)."""
+        level = level or _priority.get()
+        t0 = time.monotonic()
+        if self.rpm or self.tpm:
+            entry = (PRIORITIES[level], next(self._seq))
+            with self._cond:
+                heapq.heappush(self._heap, entry)
+                while True:
+                    if self._heap[0] == entry:
+                        d = self._delay(tokens, time.monotonic())
+                        if d <= 0:
+                            heapq.heappop(self._heap)
+                            if self.rpm:
+                                self.rpm.take(1)
+                            if self.tpm:
+                                self.tpm.take(tokens)
+                            self._cond.notify_all()
+                            break
+                        self._cond.wait(d)
+                    else:
+                        self._cond.wait()
+        waited = time.monotonic() - t0
+        with self._cond:
+            s = self._stats[level]
+            s["calls"] += 1
+            s["wait_s"] += waited
+            s["max_wait_s"] = max(s["max_wait_s"], waited)
+            s["tokens_est"] += tokens
+        METRICS.observe("llm_queue_wait_seconds", waited, priority=level)
+        box = _wait_box.get()
+        if box is not None:
+            box[0] += waited
+            box[1] += 1
+        return waited
+
+    def settle(self, estimated: int, actual: int, level: Optional[str] = None) -> None:
+        """Corrige le seau TPM avec l'usage réel (rend ou prélève la différence)."""
+        level = level or _priority.get()
+        with self._cond:
+            if self.tpm:
+                self.tpm.take(actual - estimated)
+            self._stats[level]["tokens_real"] += actual
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._cond:
+            out = {}
+            for p, s in self._stats.items():
+                out[p] = dict(s, avg_wait_s=s["wait_s"] / s["calls"] if s["calls"] else 0.0)
+            out["queued"] = len(self._heap)
+            return out
+
+
+_SCHEDULER: Optional[LLMScheduler] = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = LLMScheduler()
+        return _SCHEDULER
+
+
+class _SchedulerCallback(BaseCallbackHandler):
+    """Passe chaque appel chat par l'ordonnanceur (bloque dans on_*_start, corrige dans on_llm_end)."""
+
+    run_inline = True
+    raise_error = True      # une erreur de l'ordonnanceur ne doit pas laisser partir l'appel
+
+    def __init__(self, max_tokens: Optional[int] = None):
+        self.completion = max_tokens or DEFAULT_COMPLETION_TOKENS
+        self._pending: Dict[Any, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, text: str) -> None:
+        est = estimate_tokens(text) + self.completion
+        level = _priority.get()
+        get_scheduler().acquire(est, level)
+        with self._lock:
+            self._pending[run_id] = (est, level)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "\n".join(str(m.content) for batch in messages for m in batch))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "\n".join(prompts))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            est, level = self._pending.pop(run_id, (None, None))
+        if est is None:
+            return
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        actual = usage.get("total_tokens")
+        if actual:
+            get_scheduler().settle(est, int(actual), level)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._pending.pop(run_id, None)
+
+
+def make_chat_model(**kwargs) -> ChatOpenAI:
+    """ChatOpenAI dont les appels passent par l'ordonnanceur partagé."""
+    cb = _SchedulerCallback(kwargs.get("max_tokens"))
+    kwargs["callbacks"] = list(kwargs.get("callbacks") or []) + [cb]
+    kwargs.setdefault("timeout", OPENAI_TIMEOUT)
+    kwargs.setdefault("max_retries", OPENAI_MAX_RETRIES)
+    return ChatOpenAI(**kwargs)
+
+
+class ScheduledOpenAIEmbeddings(OpenAIEmbeddings):
+    """OpenAIEmbeddings dont chaque requête (lot de `chunk_size` textes) passe par l'ordonnanceur."""
+
+    def embed_documents(self, texts: List[str], chunk_size: Optional[int] = None) -> List[List[float]]:
+        size = chunk_size or self.chunk_size
+        out: List[List[float]] = []
+        for i in range(0, len(texts), size):
+            batch = texts[i:i + size]
+            get_scheduler().acquire(sum(estimate_tokens(t) for t in batch))
+            out.extend(super().embed_documents(batch, chunk_size=size))
+        return out
+
+    def embed_query(self, text: str) -> List[float]:
+        get_scheduler().acquire(estimate_tokens(text))
+        return super().embed_documents([text])[0]
+
+
+def make_embeddings(**kwargs) -> OpenAIEmbeddings:
+    kwargs.setdefault("timeout", OPENAI_TIMEOUT)
+    kwargs.setdefault("max_retries", OPENAI_MAX_RETRIES)
+    return ScheduledOpenAIEmbeddings(**kwargs)
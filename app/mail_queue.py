@@ -0,0 +1,375 @@
+# app/mail_queue.py
+"""
+Envoi d'e-mails en file d'attente, avec un pool de connexions SMTP.
+
+- `SMTPPool` : garde quelques sessions SMTP déjà authentifiées (STARTTLS + login
+  faits une fois) et les réutilise d'un envoi à l'autre.
+- `MailQueue` : file durable (SQLite) vidée par des threads en arrière-plan.
+  `enqueue()` rend la main dès que le message est écrit sur disque ; les envois
+  en échec sont retentés avec un délai exponentiel, puis marqués 'failed'.
+  Un message pris en charge porte un bail (claimed_at, claimed_by) : la base peut
+  être partagée par plusieurs processus (Streamlit, Chainlit, workers uvicorn...),
+  et un message 'sending' n'est repris que si son bail a expiré (SENDING_LEASE,
+  crash de l'expéditeur), jamais pendant qu'un autre processus l'envoie.
+- Les sessions SMTP ont un délai réseau (SMTP_TIMEOUT) et passent par le disjoncteur
+  "smtp" (app/resilience.py) : serveur injoignable -> les envois sont reportés sans
+  consommer de tentative, au lieu de bloquer les workers.
+
+Statuts d'un message : queued -> sending -> sent | failed.
+"""
+import os
+import queue
+import socket
+import smtplib
+import sqlite3
+import ssl
+import threading
+import time
+from contextlib import contextmanager
+from email.message import EmailMessage
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.config import (BREAKER_RESET_S, MAIL_MAX_ATTEMPTS, MAIL_QUEUE_DB, MAIL_RETRY_BASE,
+                        MAIL_WORKERS, SMTP_POOL_SIZE, SMTP_TIMEOUT)
+from app.resilience import CircuitOpen, breaker
+from app.tracing import METRICS
+
+SmtpConf = Tuple[str, int, str, str, str, bool]
+
+IDLE_CHECK = 30.0        # au-delà (s) d'inactivité, on vérifie la session par un NOOP
+POLL_INTERVAL = 1.0      # réveil des workers pour les messages en attente de retry
+RETRY_CAP = 600.0        # délai maximal entre deux tentatives (s)
+# un envoi (deux sessions au plus, chacune bornée par SMTP_TIMEOUT par opération) dure
+# bien moins ; au-delà, l'expéditeur est réputé mort et le message est repris
+SENDING_LEASE = 10 * SMTP_TIMEOUT
+
+
+def smtp_conf() -> SmtpConf:
+    host = os.getenv("SMTP_HOST", "")
+    port = int(os.getenv("SMTP_PORT", "587"))
+    user = os.getenv("SMTP_USER", "")
+    pwd  = os.getenv("SMTP_PASS", "")
+    from_addr = os.getenv("SMTP_FROM", user or "")
+    use_tls = os.getenv("SMTP_TLS", "true").lower() in {"1","true","yes","on"}
+    if not (host and port and user and pwd and from_addr):
+        raise RuntimeError("Config SMTP manquante (SMTP_HOST/PORT/USER/PASS/FROM).")
+    return host, port, user, pwd, from_addr, use_tls
+
+
+def build_message(from_addr: str, to: str, subject: str, body: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = from_addr
+    msg["To"] = to
+    msg["Subject"] = subject
+    msg.set_content(body)
+    return msg
+
+
+def _is_permanent(e: Exception) -> bool:
+    """Erreurs 5xx (destinataire refusé, auth...) : inutile de réessayer."""
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(e, smtplib.SMTPResponseException) and 500 <= e.smtp_code < 600
+
+
+# ---------- Pool de connexions ----------
+class SMTPPool:
+    """Pool borné de sessions SMTP authentifiées, partagé entre threads."""
+
+    def __init__(self, size: int = SMTP_POOL_SIZE, conf: Callable[[], SmtpConf] = smtp_conf):
+        self.size = size
+        self.conf = conf
+        self._idle: "queue.LifoQueue[Tuple[smtplib.SMTP, float]]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.opened = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        host, port, user, pwd, _, use_tls = self.conf()
+        if use_tls and port == 465:
+            server = smtplib.SMTP_SSL(host=host, port=port, context=ssl.create_default_context(),
+                                      timeout=SMTP_TIMEOUT)
+        else:
+            server = smtplib.SMTP(host=host, port=port, timeout=SMTP_TIMEOUT)
+            server.ehlo()
+            if use_tls:
+                server.starttls(context=ssl.create_default_context())
+                server.ehlo()
+        server.login(user, pwd)
+        self.opened += 1
+        return server
+
+    def _take(self) -> smtplib.SMTP:
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < IDLE_CHECK:
+                return server
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except smtplib.SMTPException:
+                pass
+            self._discard(server)
+
+    @staticmethod
+    def _discard(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    @contextmanager
+    def connection(self):
+        """Emprunte une session ; elle est rendue au pool si tout s'est bien passé, fermée sinon."""
+        with self._slots:
+            server = self._take()
+            try:
+                yield server
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # le serveur a répondu (ex: destinataire refusé, 5xx) : la session reste utilisable
+                self._idle.put((server, time.monotonic()))
+                raise
+            except (smtplib.SMTPServerDisconnected, OSError):
+                # session coupée ou erreur socket (SMTPException hérite d'OSError : testé après)
+                self._discard(server)
+                raise
+            except Exception:
+                self._idle.put((server, time.monotonic()))
+                raise
+            else:
+                self._idle.put((server, time.monotonic()))
+
+    def send(self, msg: EmailMessage) -> None:
+        """Envoie un message ; une session morte (timeout serveur) est remplacée une fois."""
+        b = breaker("smtp")
+        if not b.allow():
+            raise CircuitOpen("smtp indisponible (disjoncteur ouvert)")
+        try:
+            try:
+                with self.connection() as server:
+                    server.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                with self.connection() as server:
+                    server.send_message(msg)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            b.record_success()      # le serveur a répondu : erreur liée au message, pas à l'amont
+            raise
+        except BaseException:       # connexion refusée, délai dépassé, session coupée, ou autre :
+            b.record_failure()      # toujours conclure (sinon un appel d'essai laisse le disjoncteur bloqué)
+            raise
+        b.record_success()
+
+    def close(self) -> None:
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(server)
+
+
+# ---------- File d'attente durable ----------
+class MailQueue:
+    """File SQLite des e-mails sortants, vidée par `workers` threads en arrière-plan."""
+
+    def __init__(self, path: str = MAIL_QUEUE_DB, workers: int = MAIL_WORKERS,
+                 pool: Optional[SMTPPool] = None, max_attempts: int = MAIL_MAX_ATTEMPTS,
+                 retry_base: float = MAIL_RETRY_BASE):
+        self.path = path
+        self.workers = workers
+        self.pool = pool or SMTPPool()
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+        with self._conn() as c:
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, to_addr TEXT NOT NULL,"
+                " subject TEXT NOT NULL, body TEXT NOT NULL, batch TEXT,"
+                " status TEXT NOT NULL DEFAULT 'queued', attempts INTEGER NOT NULL DEFAULT 0,"
+                " next_attempt_at REAL NOT NULL DEFAULT 0, last_error TEXT,"
+                " created_at REAL NOT NULL, sent_at REAL, claimed_at REAL, claimed_by TEXT)"
+            )
+            c.execute("CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (status, next_attempt_at)")
+            # base créée avant les baux : colonnes ajoutées (un seul processus y parvient)
+            cols = {r[1] for r in c.execute("PRAGMA table_info(outbox)")}
+            for col, kind in (("claimed_at", "REAL"), ("claimed_by", "TEXT")):
+                if col not in cols:
+                    try:
+                        c.execute(f"ALTER TABLE outbox ADD COLUMN {col} {kind}")
+                    except sqlite3.OperationalError:
+                        pass                          # ajoutée entre-temps par un autre processus
+
+    def _conn(self) -> sqlite3.Connection:
+        # une connexion par thread (sqlite3 n'aime pas le partage entre threads)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # --- côté producteur ---
+    def enqueue(self, to: str, subject: str, body: str, batch: Optional[str] = None) -> int:
+        return self.enqueue_many([(to, subject, body)], batch=batch)[0]
+
+    def enqueue_many(self, messages: Iterable[Tuple[str, str, str]], batch: Optional[str] = None) -> List[int]:
+        """Écrit tous les messages dans une seule transaction ; renvoie leurs identifiants."""
+        now = time.time()
+        c = self._conn()
+        ids = []
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            for to, subject, body in messages:
+                cur = c.execute(
+                    "INSERT INTO outbox (to_addr, subject, body, batch, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (to, subject, body, batch, now))
+                ids.append(cur.lastrowid)
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        self.start()
+        self._wake.set()
+        return ids
+
+    def status(self, ids: Iterable[int]) -> Dict[int, Dict]:
+        ids = list(ids)
+        if not ids:
+            return {}
+        rows = self._conn().execute(
+            f"SELECT id, to_addr, status, attempts, last_error FROM outbox WHERE id IN ({','.join('?' * len(ids))})",
+            ids).fetchall()
+        return {r[0]: {"to": r[1], "status": r[2], "attempts": r[3], "error": r[4]} for r in rows}
+
+    def wait(self, ids: Iterable[int], timeout: Optional[float] = None) -> Dict[int, Dict]:
+        """Attend que les messages soient 'sent' ou 'failed' (ou la fin du délai) ; renvoie leurs statuts."""
+        ids = list(ids)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            st = self.status(ids)
+            if all(s["status"] in ("sent", "failed") for s in st.values()):
+                return st
+            if deadline is not None and time.monotonic() >= deadline:
+                return st
+            time.sleep(0.05)
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        out = {"queued": 0, "sending": 0, "sent": 0, "failed": 0}
+        out.update(dict(rows))
+        out["smtp_sessions_opened"] = self.pool.opened
+        return out
+
+    # --- côté workers ---
+    def start(self) -> None:
+        with self._start_lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"mail-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+        self.pool.close()
+
+    @staticmethod
+    def _owner() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+    def _claim(self) -> Optional[Tuple[int, str, str, str, int]]:
+        """Prend un message prêt, ou un 'sending' dont le bail a expiré (expéditeur mort)."""
+        c = self._conn()
+        now = time.time()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            row = c.execute(
+                "SELECT id, to_addr, subject, body, attempts FROM outbox"
+                " WHERE (status = 'queued' AND next_attempt_at <= ?)"
+                "    OR (status = 'sending' AND COALESCE(claimed_at, 0) < ?)"
+                " ORDER BY id LIMIT 1",
+                (now, now - SENDING_LEASE)).fetchone()
+            if row:
+                c.execute("UPDATE outbox SET status = 'sending', claimed_at = ?, claimed_by = ? WHERE id = ?",
+                          (now, self._owner(), row[0]))
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        return row
+
+    def _worker(self) -> None:
+        while not self._stop.is_set():
+            try:
+                row = self._claim()
+                if row is None:
+                    self._wake.wait(POLL_INTERVAL)
+                    self._wake.clear()
+                    continue
+                self._deliver(*row)
+            except Exception:
+                # base verrouillée par un autre processus, disque plein... : le worker survit
+                # (un message déjà pris sera repris à l'expiration de son bail)
+                METRICS.inc("mail_worker_errors_total")
+                self._stop.wait(POLL_INTERVAL)
+
+    def _deliver(self, msg_id: int, to: str, subject: str, body: str, attempts: int) -> None:
+        c = self._conn()
+        attempts += 1
+        try:
+            from_addr = self.pool.conf()[4]
+            self.pool.send(build_message(from_addr, to, subject, body))
+        except CircuitOpen as e:
+            # serveur en panne connue : on reporte sans compter de tentative
+            c.execute("UPDATE outbox SET status = 'queued', last_error = ?, next_attempt_at = ? WHERE id = ?",
+                      (str(e), time.time() + BREAKER_RESET_S, msg_id))
+            return
+        except Exception as e:
+            err = f"{type(e).__name__}: {e}"
+            if _is_permanent(e) or attempts >= self.max_attempts:
+                c.execute("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                          (attempts, err, msg_id))
+            else:
+                delay = min(RETRY_CAP, self.retry_base * 2 ** (attempts - 1))
+                c.execute("UPDATE outbox SET status = 'queued', attempts = ?, last_error = ?,"
+                          " next_attempt_at = ? WHERE id = ?", (attempts, err, time.time() + delay, msg_id))
+            return
+        c.execute("UPDATE outbox SET status = 'sent', attempts = ?, last_error = NULL, sent_at = ? WHERE id = ?",
+                  (attempts, time.time(), msg_id))
+
+
+_QUEUE: Optional[MailQueue] = None
+_QUEUE_LOCK = threading.Lock()
+
+
+def get_mail_queue() -> MailQueue:
+    """File partagée par tout le processus (workers démarrés au premier envoi)."""
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            _QUEUE = MailQueue()
+        return _QUEUE
+
+
+if __name__ == "__main__":
+    # Petit test : état de la file
+    print(get_mail_queue().stats())
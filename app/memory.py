@@ -1,17 +1,75 @@
 # app/memory.py (v0.3-compatible)
 
-from typing import Dict
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
 from langchain_core.chat_history import InMemoryChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
 
-# Petit store en mémoire par session_id
-_STORE: Dict[str, InMemoryChatMessageHistory] = {}
+from app.config import SESSION_MAX
+from rag.namespaces import resolve
+
+# Petit store en mémoire par session_id, borné : au-delà de SESSION_MAX sessions,
+# la moins récemment utilisée est oubliée (processus serveur de longue durée).
+_STORE: "OrderedDict[str, InMemoryChatMessageHistory]" = OrderedDict()
+_LOCK = threading.Lock()
 
 def get_session_history(session_id: str) -> InMemoryChatMessageHistory:
     """Retourne (ou crée) l'historique pour une session donnée."""
-    if session_id not in _STORE:
-        _STORE[session_id] = InMemoryChatMessageHistory()
-    return _STORE[session_id]
+    with _LOCK:
+        history = _STORE.get(session_id)
+        if history is None:
+            history = _STORE[session_id] = InMemoryChatMessageHistory()
+            while len(_STORE) > SESSION_MAX:
+                _STORE.popitem(last=False)
+        else:
+            _STORE.move_to_end(session_id)
+        return history
+
+def session_count() -> int:
+    return len(_STORE)
+
+# Espace de noms RAG (desk / client, voir rag/namespaces.py) de chaque session : fixé
+# par sa première requête qui en donne un, puis conservé. Pendant une requête, il est
+# publié dans un contextvar que lisent les outils (RAG, faits KPI), threads compris
+# (les pools de l'application copient le contexte).
+_NAMESPACES: "OrderedDict[str, str]" = OrderedDict()
+_CURRENT_NAMESPACE: ContextVar[Optional[str]] = ContextVar("rag_namespace", default=None)
+
+def bind_namespace(session_id: str, namespace: Optional[str] = None) -> Optional[str]:
+    """
+    Espace de la session (None = espace par défaut). ValueError si le nom est invalide
+    ou si la session est déjà liée à un autre espace (pas de mélange de corpus dans un historique).
+    """
+    namespace = resolve(namespace) if namespace else None
+    with _LOCK:
+        bound = _NAMESPACES.get(session_id)
+        if namespace and bound and namespace != bound:
+            raise ValueError(f"Session {session_id!r} déjà liée à l'espace {bound!r}")
+        if bound:
+            _NAMESPACES.move_to_end(session_id)
+            return bound
+        if namespace:
+            _NAMESPACES[session_id] = namespace
+            while len(_NAMESPACES) > SESSION_MAX:
+                _NAMESPACES.popitem(last=False)
+        return namespace
+
+@contextmanager
+def session_scope(session_id: str, namespace: Optional[str] = None) -> Iterator[Optional[str]]:
+    """Publie l'espace de la session pour la durée d'une requête."""
+    token = _CURRENT_NAMESPACE.set(bind_namespace(session_id, namespace))
+    try:
+        yield _CURRENT_NAMESPACE.get()
+    finally:
+        _CURRENT_NAMESPACE.reset(token)
+
+def current_namespace() -> Optional[str]:
+    """Espace de la requête en cours (None hors requête ou session sans espace)."""
+    return _CURRENT_NAMESPACE.get()
 
 def with_memory(runnable):
     """
@@ -25,3 +83,9 @@ def with_memory(runnable):
         input_messages_key="input",
         history_messages_key="chat_history",
     )
+
+def clear_session_history(session_id: str) -> None:
+    """Oublie une session (ex: fin d'une session du batch runner)."""
+    with _LOCK:
+        _STORE.pop(session_id, None)
+        _NAMESPACES.pop(session_id, None)
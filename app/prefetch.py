@@ -0,0 +1,125 @@
+# app/prefetch.py
+"""
+Préchargement spéculatif d'outils, en parallèle du routage.
+
+Sans préchargement, une requête enchaîne : routeur (souvent un appel LLM) -> 1er appel
+LLM de l'agent (choix de l'outil) -> outil (réseau) -> 2e appel LLM. Pour beaucoup de
+questions, l'outil et son entrée se devinent à partir de signaux bon marché :
+
+- "selon mes documents / d'après le rapport..."   -> search_financial_documents(question)
+- tickers en majuscules + "cours / clôture / P/E" -> stock_data_api('close|pe TICKERS ...')
+- "CAGR" + trois nombres                          -> calculatrice_financiere('cagr a b n')
+
+`start()` lance l'outil deviné dans un pool dès l'arrivée de la question. Quand le
+routeur confirme la catégorie, `take()` attend le résultat (au plus PREFETCH_WAIT s)
+et le renvoie comme une étape ReAct déjà faite (action + observation) : l'agent
+reçoit l'observation dans son scratchpad au lieu de demander l'outil. Sinon la
+spéculation est annulée (ou son résultat ignoré si elle a déjà démarré), de même
+quand l'attente dépasse PREFETCH_WAIT.
+"""
+import contextvars
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from langchain_core.agents import AgentAction
+
+from app.config import PREFETCH_ENABLED, PREFETCH_WAIT, PREFETCH_WORKERS
+from app.tracing import METRICS, span
+
+# Catégories du routeur qui confirment chaque outil spéculé
+CONFIRMS: Dict[str, Tuple[str, ...]] = {
+    "search_financial_documents": ("RAG",),
+    "stock_data_api": ("stock",),
+    "calculatrice_financiere": ("calc",),
+}
+
+_DOCS = re.compile(r"\b(selon|d['’]apr[eè]s|dans)\s+(mes|nos|les|le|la|ce)\s+"
+                   r"(docs?|documents?|rapports?|pdfs?|corpus|10-?k)\b", re.IGNORECASE)
+_TICKER = re.compile(r"\b[A-Z]{2,5}(?:\.[A-Z]{1,2})?\b")
+# sigles fréquents qui ne sont pas des tickers
+_NOT_TICKERS = {"PE", "PER", "BPA", "EPS", "CAGR", "ROI", "NPV", "VAN", "IRR", "TRI", "ETF", "PDF", "USD",
+                "EUR", "GBP", "JPY", "CHF", "TTM", "CA", "PIB", "BCE", "FED", "IA", "AI", "ESG", "VAR",
+                "CVAR", "PNL", "SMTP", "RAG", "OK"}
+_CLOSE = re.compile(r"\b(cours|cl[oô]ture|close|prix)\b", re.IGNORECASE)
+_PE = re.compile(r"\b(p\s*/\s*e|per|pe|price[- ]to[- ]earnings)\b", re.IGNORECASE)
+_PERIODS = [(re.compile(r"\b(5|cinq)\s+(jours|days)\b|\bsemaine\b", re.I), "5d"),
+            (re.compile(r"\b(3|trois)\s+mois\b", re.I), "3mo"),
+            (re.compile(r"\b(6|six)\s+mois\b", re.I), "6mo"),
+            (re.compile(r"\b(1|un)\s+an\b|\b12\s+mois\b|\bann[ée]e\b", re.I), "1y")]
+_CAGR = re.compile(r"\b(cagr|taux\s+de\s+croissance\s+annuel)", re.IGNORECASE)
+_NUMBER = re.compile(r"(?<![\w.])\d+(?:[.,]\d+)?(?![\w.])")
+
+
+@dataclass
+class Speculation:
+    tool: str
+    tool_input: str
+    future: Optional[Future] = None
+
+
+def guess(user_input: str) -> Optional[Speculation]:
+    """Outil + entrée probables, d'après des signaux lexicaux (aucun appel LLM)."""
+    if _DOCS.search(user_input):
+        return Speculation("search_financial_documents", user_input.strip())
+    tickers = [t for t in dict.fromkeys(_TICKER.findall(user_input)) if t not in _NOT_TICKERS]
+    if tickers and _PE.search(user_input) and not _CLOSE.search(user_input):
+        return Speculation("stock_data_api", f"pe {' '.join(tickers)}")
+    if tickers and _CLOSE.search(user_input):
+        period = next((p for rx, p in _PERIODS if rx.search(user_input)), "1mo")
+        return Speculation("stock_data_api", f"close {' '.join(tickers)} {period} 1d")
+    nums = _NUMBER.findall(user_input)
+    if _CAGR.search(user_input) and len(nums) == 3:
+        return Speculation("calculatrice_financiere", "cagr " + " ".join(n.replace(",", ".") for n in nums))
+    return None
+
+
+# threads créés au premier submit : rien ne démarre à l'import
+_POOL = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+
+
+def start(tools, user_input: str) -> Optional[Speculation]:
+    """Devine l'outil et le lance en arrière-plan (dans le contexte de trace de la requête)."""
+    if not PREFETCH_ENABLED:
+        return None
+    spec = guess(user_input)
+    by_name = {t.name: t for t in tools}
+    if spec is None or spec.tool not in by_name:
+        return None
+
+    def run() -> str:
+        with span("prefetch", tool=spec.tool):
+            return str(by_name[spec.tool].invoke(spec.tool_input))
+
+    ctx = contextvars.copy_context()
+    spec.future = _POOL.submit(ctx.run, run)
+    METRICS.inc("prefetch_total", tool=spec.tool, outcome="started")
+    return spec
+
+
+def take(spec: Optional[Speculation], action: str) -> Optional[Tuple[AgentAction, str]]:
+    """Étape ReAct préremplie si le routeur confirme la spéculation ; sinon annule et renvoie None."""
+    if spec is None:
+        return None
+    if action not in CONFIRMS.get(spec.tool, ()):
+        cancelled = spec.future.cancel()
+        METRICS.inc("prefetch_total", tool=spec.tool, outcome="cancelled" if cancelled else "wasted")
+        return None
+    try:
+        with span("prefetch_wait", tool=spec.tool):
+            observation = spec.future.result(timeout=PREFETCH_WAIT)
+    except FutureTimeout:
+        # encore en file : retiré, pour que l'amont lent ne soit pas appelé deux fois
+        # (déjà démarré, il ne peut pas être interrompu : son résultat est ignoré)
+        cancelled = spec.future.cancel()
+        METRICS.inc("prefetch_total", tool=spec.tool, outcome="timeout_cancelled" if cancelled else "timeout")
+        return None
+    except Exception:
+        METRICS.inc("prefetch_total", tool=spec.tool, outcome="error")
+        return None
+    METRICS.inc("prefetch_total", tool=spec.tool, outcome="used")
+    log = (f"Thought: Résultat préchargé de {spec.tool}.\n"
+           f"Action: {spec.tool}\nAction Input: \"{spec.tool_input}\"")
+    return AgentAction(tool=spec.tool, tool_input=spec.tool_input, log=log), observation
@@ -0,0 +1,314 @@
+# app/price_store.py
+"""
+Stockage local des séries OHLCV (colonnes NumPy memory-mappées).
+
+Chaque (intervalle, ticker) a son propre dossier :
+
+    <PRICE_STORE_DIR>/<interval>/<TICKER>/
+        ts.i8                      horodatages (int64, ns UTC), triés
+        open.f8 high.f8 low.f8 close.f8 volume.f8   colonnes float64
+        meta.json                  début demandé + date du dernier fetch
+
+Les colonnes sont des fichiers binaires bruts : on AJOUTE les nouvelles barres
+en fin de fichier et on les relit avec `np.memmap`, donc une requête de plage
+renvoie des vues (zéro copie) sur le disque.
+
+Politique de rafraîchissement :
+- ticker inconnu           -> téléchargement de toute la période demandée ;
+- période plus longue      -> on complète le début (backfill) une seule fois ;
+- données plus vieilles que PRICE_STORE_TTL -> on ne télécharge QUE la fin,
+  depuis la dernière barre stockée (qui est réécrite : elle peut être partielle).
+Les tickers qui ont besoin du même téléchargement sont groupés en un seul
+appel `yf.download`.
+
+Concurrence : le plan (qui télécharger) est fait sous un verrou court ; les
+téléchargements se font hors verrou. Chaque (ticker, intervalle) en cours de
+rafraîchissement a un seul propriétaire : les autres requêtes qui en ont besoin
+attendent son résultat, celles qui portent sur d'autres tickers ne sont pas bloquées.
+Les écritures passent par fichier temporaire + os.replace : un lecteur garde des
+memmaps valides, et `bars` ramène les colonnes à leur longueur commune.
+"""
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from app.config import PRICE_STORE_DIR, PRICE_STORE_TTL, YFINANCE_TIMEOUT
+from app.resilience import guarded
+from app.tracing import span
+
+FIELDS = ("open", "high", "low", "close", "volume")
+_YF_FIELDS = {"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"}
+
+_PERIOD_RE = re.compile(r"^(\d+)(d|wk|mo|y)$", re.IGNORECASE)
+_PERIOD_DAYS = {"d": 1, "wk": 7, "mo": 31, "y": 366}
+
+
+class Bars(NamedTuple):
+    """Barres OHLCV d'un ticker (vues memmap, lecture seule)."""
+    ticker: str
+    ts: np.ndarray      # int64, ns UTC
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def index(self) -> pd.DatetimeIndex:
+        return pd.to_datetime(self.ts, utc=True)
+
+
+def period_start(period: str, now: Optional[pd.Timestamp] = None) -> Optional[pd.Timestamp]:
+    """
+    Convertit une période yfinance ('5d', '1mo', '2y', 'ytd', 'max') en date de début UTC.
+    Renvoie None pour 'max'. Lève ValueError si la période est inconnue.
+    """
+    now = now or pd.Timestamp.now(tz="UTC")
+    p = period.lower()
+    if p == "max":
+        return None
+    if p == "ytd":
+        return pd.Timestamp(year=now.year, month=1, day=1, tz="UTC")
+    m = _PERIOD_RE.match(p)
+    if not m:
+        raise ValueError(f"Période invalide: '{period}' (ex: 5d, 1mo, 1y, ytd, max)")
+    days = int(m.group(1)) * _PERIOD_DAYS[m.group(2)]
+    return (now - pd.Timedelta(days=days)).normalize()
+
+
+def _to_ns(index) -> np.ndarray:
+    idx = pd.DatetimeIndex(index)
+    idx = idx.tz_localize("UTC") if idx.tz is None else idx.tz_convert("UTC")
+    return idx.asi8.astype(np.int64)
+
+
+class PriceStore:
+    """Cache local OHLCV, incrémental, partagé par les outils de marché."""
+
+    def __init__(self, root: str = PRICE_STORE_DIR, ttl: float = PRICE_STORE_TTL):
+        self.root = root
+        self.ttl = ttl
+        self._lock = threading.Lock()                                # protège _inflight (plan)
+        self._inflight: Dict[Tuple[str, str], Future] = {}            # (ticker, intervalle) -> rafraîchissement
+
+    # ---------- Accès disque ----------
+    def _dir(self, ticker: str, interval: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_.^=-]+", "_", ticker.upper())
+        return os.path.join(self.root, interval, safe)
+
+    def _meta(self, ticker: str, interval: str) -> dict:
+        path = os.path.join(self._dir(ticker, interval), "meta.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, ticker: str, interval: str, meta: dict) -> None:
+        path = os.path.join(self._dir(ticker, interval), "meta.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+    def _column(self, ticker: str, interval: str, name: str) -> np.ndarray:
+        ext = "i8" if name == "ts" else "f8"
+        dtype = np.int64 if name == "ts" else np.float64
+        path = os.path.join(self._dir(ticker, interval), f"{name}.{ext}")
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r")
+
+    def _write(self, ticker: str, interval: str, cols: Dict[str, np.ndarray], keep: int) -> None:
+        """
+        Conserve les `keep` premières barres puis écrit `cols` à la suite.
+        Chaque colonne est réécrite dans un fichier temporaire puis remplacée par
+        os.replace : jamais de fichier tronqué sous un memmap ouvert (SIGBUS), les
+        lecteurs en cours gardent l'ancienne version.
+        """
+        d = self._dir(ticker, interval)
+        os.makedirs(d, exist_ok=True)
+        for name in ("ts",) + FIELDS:
+            ext = "i8" if name == "ts" else "f8"
+            path = os.path.join(d, f"{name}.{ext}")
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                if keep:
+                    f.write(np.asarray(self._column(ticker, interval, name))[:keep].tobytes())
+                f.write(np.ascontiguousarray(cols[name]).tobytes())
+            os.replace(tmp, path)
+
+    def bars(self, ticker: str, interval: str = "1d") -> Bars:
+        """Toutes les barres stockées (aucun accès réseau)."""
+        t = ticker.upper()
+        cols = [self._column(t, interval, n) for n in ("ts",) + FIELDS]
+        # pendant une écriture, les colonnes déjà remplacées peuvent être plus longues
+        n = min(len(c) for c in cols)
+        return Bars(t, *(c[:n] for c in cols))
+
+    # ---------- Téléchargement ----------
+    @staticmethod
+    def _frame_to_cols(frame: pd.DataFrame, ticker: str) -> Optional[Dict[str, np.ndarray]]:
+        if frame is None or frame.empty:
+            return None
+        if isinstance(frame.columns, pd.MultiIndex):
+            if ticker not in frame.columns.get_level_values(-1):
+                return None
+            frame = frame.xs(ticker, axis=1, level=-1)
+        frame = frame.dropna(subset=["Close"])
+        if frame.empty:
+            return None
+        cols = {"ts": _to_ns(frame.index)}
+        for name, yf_name in _YF_FIELDS.items():
+            cols[name] = frame[yf_name].to_numpy(dtype=np.float64) if yf_name in frame else np.full(len(frame), np.nan)
+        return cols
+
+    @staticmethod
+    def _download(tickers: List[str], start: Optional[pd.Timestamp], interval: str) -> pd.DataFrame:
+        kwargs = {"start": start.strftime("%Y-%m-%d")} if start is not None else {"period": "max"}
+        # délai max + disjoncteur partagé "yfinance" (UpstreamError si dépassé / ouvert)
+        with span("yfinance", tickers=len(tickers), interval=interval):
+            return guarded("yfinance", yf.download, tickers, timeout=YFINANCE_TIMEOUT, interval=interval,
+                           progress=False, auto_adjust=True, threads=len(tickers) > 1,
+                           multi_level_index=True, **kwargs)
+
+    def _backfill(self, tickers: List[str], start: Optional[pd.Timestamp], interval: str) -> None:
+        """Complète le début de l'historique (réécrit les colonnes, opération rare)."""
+        if not tickers:
+            return
+        frame = self._download(tickers, start, interval)
+        for t in tickers:
+            new = self._frame_to_cols(frame, t)
+            old = self.bars(t, interval)
+            meta = self._meta(t, interval)
+            meta["start"] = None if start is None else int(start.value)
+            meta["fetched_at"] = time.time()
+            if new is None:
+                # ticker sans données : on mémorise quand même le fetch (pas de retéléchargement avant le TTL)
+                os.makedirs(self._dir(t, interval), exist_ok=True)
+                self._write_meta(t, interval, meta)
+                continue
+            if len(old):
+                # on garde la partie stockée pour tout ce qui suit le dernier point téléchargé
+                tail = old.ts > new["ts"][-1]
+                new = {n: np.concatenate([new[n], np.asarray(getattr(old, n))[tail]]) for n in new}
+            self._write(t, interval, new, keep=0)
+            self._write_meta(t, interval, meta)
+
+    def _append_tail(self, tickers: List[str], interval: str) -> None:
+        """Télécharge uniquement les barres postérieures à la dernière stockée."""
+        groups: Dict[pd.Timestamp, List[str]] = {}
+        for t in tickers:
+            last = pd.Timestamp(int(self.bars(t, interval).ts[-1]), tz="UTC")
+            groups.setdefault(last.normalize(), []).append(t)
+        for start, group in groups.items():
+            frame = self._download(group, start, interval)
+            for t in group:
+                old_ts = self.bars(t, interval).ts
+                new = self._frame_to_cols(frame, t)
+                meta = self._meta(t, interval)
+                meta["fetched_at"] = time.time()
+                if new is not None:
+                    # réécrit à partir de la première barre reçue (la dernière peut être partielle)
+                    keep = int(np.searchsorted(old_ts, new["ts"][0], side="left"))
+                    self._write(t, interval, new, keep=keep)
+                self._write_meta(t, interval, meta)
+
+    @staticmethod
+    def _covers(meta: dict, start: Optional[pd.Timestamp]) -> bool:
+        """Vrai si l'historique déjà téléchargé remonte au moins jusqu'à `start`."""
+        if "start" not in meta:
+            return False
+        if meta["start"] is None:  # 'max' déjà téléchargé
+            return True
+        return start is not None and start.value >= meta["start"]
+
+    def refresh(self, tickers: Iterable[str], period: str = "1mo", interval: str = "1d") -> None:
+        """Met le store à jour pour couvrir `period` (réseau uniquement si nécessaire)."""
+        start = period_start(period)
+        now = time.time()
+        backfill, tail, waiting = [], [], {}
+        mine: Dict[Tuple[str, str], Future] = {}
+        with self._lock:                    # plan seulement : aucun accès réseau sous ce verrou
+            for t in dict.fromkeys(x.upper() for x in tickers):
+                key = (t, interval)
+                if key in self._inflight:   # déjà en cours ailleurs : on attendra son résultat
+                    waiting[t] = self._inflight[key]
+                    continue
+                meta = self._meta(t, interval)
+                stored = len(self.bars(t, interval)) > 0
+                if not self._covers(meta, start):
+                    backfill.append(t)
+                elif now - meta.get("fetched_at", 0) > self.ttl:
+                    (tail if stored else backfill).append(t)
+                else:
+                    continue
+                mine[key] = self._inflight[key] = Future()
+        error: Optional[BaseException] = None
+        try:
+            self._backfill(backfill, start, interval)
+            self._append_tail(tail, interval)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            with self._lock:
+                for key, fut in mine.items():
+                    del self._inflight[key]
+                    if error is not None:
+                        fut.set_exception(error)
+                    else:
+                        fut.set_result(None)
+        if waiting:
+            for fut in waiting.values():
+                fut.result()                # propage l'échec (UpstreamError...) du propriétaire
+            # le propriétaire a pu rafraîchir une période plus courte : on revérifie
+            self.refresh(list(waiting), period, interval)
+
+    # ---------- Lecture ----------
+    def get(self, ticker: str, period: str = "1mo", interval: str = "1d", refresh: bool = True) -> Bars:
+        """Barres de `ticker` sur `period` (vues zéro-copie sur le store)."""
+        return self.get_many([ticker], period, interval, refresh)[ticker.upper()]
+
+    def get_many(self, tickers: Iterable[str], period: str = "1mo", interval: str = "1d",
+                 refresh: bool = True) -> Dict[str, Bars]:
+        tickers = list(dict.fromkeys(t.upper() for t in tickers))
+        if refresh:
+            self.refresh(tickers, period, interval)
+        start = period_start(period)
+        out: Dict[str, Bars] = {}
+        for t in tickers:
+            b = self.bars(t, interval)
+            i = 0 if start is None else int(np.searchsorted(b.ts, start.value, side="left"))
+            out[t] = Bars(t, *(np.asarray(col)[i:] for col in b[1:]))
+        return out
+
+    def close_matrix(self, tickers: Iterable[str], period: str = "1y", interval: str = "1d",
+                     refresh: bool = True) -> pd.DataFrame:
+        """Matrice des clôtures (index: dates, colonnes: tickers), alignée sur l'union des dates."""
+        series = {
+            t: pd.Series(np.asarray(b.close), index=b.index())
+            for t, b in self.get_many(tickers, period, interval, refresh).items() if len(b)
+        }
+        if not series:
+            return pd.DataFrame()
+        return pd.DataFrame(series).sort_index()
+
+
+_STORE: Optional[PriceStore] = None
+
+def get_price_store() -> PriceStore:
+    """Store partagé du process (créé au premier appel)."""
+    global _STORE
+    if _STORE is None:
+        _STORE = PriceStore()
+    return _STORE
@@ -0,0 +1,63 @@
+# app/quant.py
+"""
+Petites fonctions numériques partagées par les outils quantitatifs
+(risque, options, portefeuille...). Tout est vectorisé NumPy, sans SciPy.
+"""
+import numpy as np
+
+_SQRT2PI = np.sqrt(2.0 * np.pi)
+
+
+def norm_pdf(x):
+    """Densité de la loi normale centrée réduite."""
+    x = np.asarray(x, dtype=float)
+    return np.exp(-0.5 * x * x) / _SQRT2PI
+
+
+def _erfc(x):
+    """erfc(x) (Numerical Recipes 'erfcc', erreur relative < 1.2e-7)."""
+    z = np.abs(x)
+    t = 1.0 / (1.0 + 0.5 * z)
+    r = t * np.exp(
+        -z * z - 1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (
+            -0.18628806 + t * (0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (
+                -0.82215223 + t * 0.17087277))))))))
+    )
+    return np.where(x >= 0, r, 2.0 - r)
+
+
+def norm_cdf(x):
+    """Fonction de répartition de la loi normale centrée réduite."""
+    x = np.asarray(x, dtype=float)
+    return 0.5 * _erfc(-x / np.sqrt(2.0))
+
+
+# Coefficients de l'algorithme d'Acklam pour l'inverse de la loi normale
+_A = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+      1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+_B = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+      6.680131188771972e+01, -1.328068155288572e+01)
+_C = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+      -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+_D = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+      3.754408661907416e+00)
+
+
+def norm_ppf(p):
+    """Quantile de la loi normale centrée réduite (algorithme d'Acklam, erreur relative ~1e-9)."""
+    p = np.asarray(p, dtype=float)
+    q = np.where(p < 0.5, p, 1.0 - p)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # queue (q < 0.02425)
+        r = np.sqrt(-2.0 * np.log(q))
+        tail = (((((_C[0] * r + _C[1]) * r + _C[2]) * r + _C[3]) * r + _C[4]) * r + _C[5]) / \
+               ((((_D[0] * r + _D[1]) * r + _D[2]) * r + _D[3]) * r + 1.0)
+        # région centrale
+        u = q - 0.5
+        s = u * u
+        central = (((((_A[0] * s + _A[1]) * s + _A[2]) * s + _A[3]) * s + _A[4]) * s + _A[5]) * u / \
+                  (((((_B[0] * s + _B[1]) * s + _B[2]) * s + _B[3]) * s + _B[4]) * s + 1.0)
+    x = np.where(q < 0.02425, tail, central)  # x = quantile de q (<= 0)
+    x = np.where(p < 0.5, x, -x)
+    x = np.where(p <= 0.0, -np.inf, np.where(p >= 1.0, np.inf, x))
+    return x
@@ -0,0 +1,231 @@
+# app/resilience.py
+"""
+Résilience des appels amont (yfinance, Tavily, retriever, SMTP...).
+
+Sans protection, un amont qui ne répond plus bloque un thread d'agent pendant des
+minutes, et pendant une panne toutes les requêtes s'empilent derrière lui.
+
+- `guarded(upstream, fn, ...)` : exécute `fn` avec un délai maximal (le thread
+  appelant est libéré à l'échéance, même si l'appel amont reste bloqué en
+  arrière-plan), derrière un disjoncteur propre à l'amont.
+- Cloisons ("bulkheads") : chaque amont a son propre pool de RESILIENCE_WORKERS
+  threads et au plus autant d'appels en cours. Un amont bloqué n'immobilise que ses
+  threads ; au-delà, ses appels sont refusés aussitôt (`BulkheadFull`) au lieu de
+  s'empiler, et les autres amonts continuent de répondre.
+- Disjoncteur (`CircuitBreaker`) : après BREAKER_FAILURES échecs consécutifs
+  (erreurs ou délais dépassés) il s'ouvre et les appels échouent immédiatement
+  (`CircuitOpen`) pendant BREAKER_RESET_S secondes ; ensuite UN appel d'essai passe
+  (semi-ouvert) : succès -> refermé, échec -> rouvert.
+- Requêtes doublées ("hedging") : si `hedge_after` est fixé et que la première
+  tentative n'a pas répondu dans ce délai, une seconde identique est lancée et la
+  première réponse valide est gardée (borne la latence de queue ; uniquement pour
+  des appels idempotents).
+
+Les outils rattrapent `UpstreamError` et répondent en mode dégradé (cache périmé,
+données déjà stockées, message clair) plutôt que d'attendre.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+from app.config import BREAKER_FAILURES, BREAKER_RESET_S, RESILIENCE_WORKERS
+from app.tracing import METRICS
+
+
+class UpstreamError(Exception):
+    """Appel amont refusé ou abandonné par la couche de résilience."""
+
+
+class CircuitOpen(UpstreamError):
+    pass
+
+
+class DeadlineExceeded(UpstreamError):
+    pass
+
+
+class BulkheadFull(UpstreamError):
+    pass
+
+
+class CircuitBreaker:
+    """Disjoncteur fermé / ouvert / semi-ouvert, thread-safe."""
+
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, reset_after: float = BREAKER_RESET_S):
+        self.name = name
+        self.failures = failures
+        self.reset_after = reset_after
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state_locked(time.monotonic())
+
+    def _state_locked(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "open" if now - self._opened_at < self.reset_after else "half_open"
+
+    def allow(self) -> bool:
+        """Vrai si l'appel peut partir (en semi-ouvert : un seul appel d'essai à la fois)."""
+        with self._lock:
+            state = self._state_locked(time.monotonic())
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            if self._probing or self._consecutive >= self.failures:
+                if self._opened_at is None or self._probing:
+                    METRICS.inc("circuit_opened_total", upstream=self.name)
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self) -> None:
+        """Appel autorisé mais jamais lancé : libère l'essai semi-ouvert sans juger l'amont."""
+        with self._lock:
+            self._probing = False
+
+    def reset(self) -> None:
+        self.record_success()
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+_STATE_VALUE = {"closed": 0.0, "half_open": 1.0, "open": 2.0}
+
+
+def breaker(upstream: str) -> CircuitBreaker:
+    """Disjoncteur partagé d'un amont (créé au premier usage)."""
+    with _BREAKERS_LOCK:
+        b = _BREAKERS.get(upstream)
+        if b is None:
+            b = _BREAKERS[upstream] = CircuitBreaker(upstream)
+        return b
+
+
+def breaker_states() -> Dict[str, str]:
+    with _BREAKERS_LOCK:
+        items = list(_BREAKERS.items())
+    return {name: b.state for name, b in items}
+
+
+METRICS.register_gauge("circuit_state", lambda: {
+    (("upstream", name),): _STATE_VALUE[state] for name, state in breaker_states().items()})
+
+class _Bulkhead:
+    """Pool et créneaux réservés à un amont."""
+
+    def __init__(self, upstream: str, size: int = RESILIENCE_WORKERS):
+        self.size = size
+        self._slots = threading.BoundedSemaphore(size)
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"upstream-{upstream}")
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Optional[Future]:
+        """Lance l'appel, ou None si l'amont a déjà `size` appels en cours (même abandonnés)."""
+        if not self._slots.acquire(blocking=False):
+            return None
+        with self._lock:
+            self._inflight += 1
+        ctx = contextvars.copy_context()           # spans rattachés à la trace de la requête
+        fut = self._pool.submit(ctx.run, fn, *args, **kwargs)
+        fut.add_done_callback(self._done)          # fin réelle de l'appel (ou annulation)
+        return fut
+
+    def _done(self, _fut: Future) -> None:
+        with self._lock:
+            self._inflight -= 1
+        self._slots.release()
+
+
+_BULKHEADS: Dict[str, _Bulkhead] = {}
+_BULKHEADS_LOCK = threading.Lock()
+
+
+def _bulkhead(upstream: str) -> _Bulkhead:
+    with _BULKHEADS_LOCK:
+        bh = _BULKHEADS.get(upstream)
+        if bh is None:
+            bh = _BULKHEADS[upstream] = _Bulkhead(upstream)
+        return bh
+
+
+METRICS.register_gauge("upstream_inflight", lambda: {
+    (("upstream", name),): float(bh.inflight) for name, bh in list(_BULKHEADS.items())})
+
+
+def guarded(upstream: str, fn: Callable[..., Any], *args, timeout: float,
+            hedge_after: Optional[float] = None, **kwargs) -> Any:
+    """
+    Appelle `fn(*args, **kwargs)` sous délai `timeout` (s) et disjoncteur de `upstream`.
+    Lève CircuitOpen ou BulkheadFull (sans appel), DeadlineExceeded, ou l'exception de `fn`.
+    """
+    b = breaker(upstream)
+    if not b.allow():
+        METRICS.inc("upstream_calls_total", upstream=upstream, outcome="short_circuit")
+        raise CircuitOpen(f"{upstream} indisponible (disjoncteur ouvert)")
+
+    bh = _bulkhead(upstream)
+    first = bh.submit(fn, *args, **kwargs)
+    if first is None:
+        b.release()
+        METRICS.inc("upstream_calls_total", upstream=upstream, outcome="rejected")
+        raise BulkheadFull(f"{upstream} saturé ({bh.size} appels en cours)")
+
+    deadline = time.monotonic() + timeout
+    pending = {first}
+    hedged = False
+    error: Optional[BaseException] = None
+    while pending:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        step = deadline - now
+        if hedge_after and not hedged:
+            step = min(step, max(0.0, hedge_after - (timeout - (deadline - now))))
+        done, pending = wait(pending, timeout=step, return_when=FIRST_COMPLETED)
+        for fut in done:
+            if fut.exception() is None:
+                b.record_success()
+                METRICS.inc("upstream_calls_total", upstream=upstream, outcome="hedged_ok" if hedged else "ok")
+                for other in pending:
+                    other.cancel()
+                return fut.result()
+            error = fut.exception()
+        if not done and hedge_after and not hedged and time.monotonic() < deadline:
+            hedged = True
+            extra = bh.submit(fn, *args, **kwargs)    # pas de doublon si la cloison est pleine
+            if extra is not None:
+                METRICS.inc("upstream_hedges_total", upstream=upstream)
+                pending.add(extra)
+    for fut in pending:
+        fut.cancel()                                 # sans effet si déjà démarré : résultat ignoré
+    b.record_failure()
+    if error is not None and not pending:
+        METRICS.inc("upstream_calls_total", upstream=upstream, outcome="error")
+        raise error
+    METRICS.inc("upstream_calls_total", upstream=upstream, outcome="timeout")
+    raise DeadlineExceeded(f"{upstream} n'a pas répondu en {timeout:g} s")
@@ -7,6 +7,8 @@ from typing import Literal, Optional, List, Tuple
 import re
 from langchain_openai import ChatOpenAI
 
+from app.llm_scheduler import make_chat_model
+
 Action = Literal[
     "smalltalk","RAG","web","stock","calc","portfolio","valuation","fx",
     "events","kpi","risk","statements","esg","options","bonds","parity",
@@ -22,8 +24,14 @@ _PATTERNS: List[Tuple[str, Action]] = [
     (r"\b(qui\s*t['’]?a\s*cr(é|e)é|ton\s*cr(é|e)ateur|cr(é|e)é\s*par\s*qui|who\s*created\s*you)\b", "smalltalk"),
     (r"\b(selon\s+(le|la)\s+(rapport|document)|dans\s+mes\s+docs|corpus)\b", "RAG"),
     (r"\b(actu|actualités|news|dernières nouvelles|latest\s+news)\b", "web"),
+    (r"\b(chiffre\s+d['’]affaires|revenue|revenus|bpa|eps|marge\s+brute|gross\s+margin|r(é|e)sultat\s+net|net\s+income|data\s+center)\b.*\b(19|20)\d{2}\b", "kpi"),
+    (r"\b(obligations?|bonds?|duration|convexit(é|e)|coupon\s+couru|courbe\s+z(é|e)ro|yield\s+to\s+maturity|ytm)\b", "bonds"),
+    (r"\b(options?\s+(d['’]achat|de\s+vente)|call\b|put\b|black[-\s]?(scholes|76)|volatilit(é|e)\s+implicite|greeks|grecques)", "options"),
+    (r"\b(volatilit(é|e)|drawdown|b(ê|e)ta|c?var\b|value\s+at\s+risk)", "risk"),
+    (r"\b(r(é|e)(é|e)quilibr\w*|rebalanc\w*)", "rebalance"),
+    (r"\b(portefeuille|portfolio|p&l|pnl|plus-value latente)", "portfolio"),
     (r"\b(pe\b|p/?e|close\s+[A-Z]{1,6}\b|\bticker\b)\b", "stock"),
-    (r"\b(cagr|cag\b|rendement|roi|npv|van|irr|calcul|%)\b", "calc"),
+    (r"\b(cagr|cag\b|rendement|roi|npv|van|x?irr|tri|mensualit(é|e)s?|amortissement|annuit(é|e)s?|calcul|%)\b", "calc"),
     (r"\b(email|mail|courriel|envoie( r)? un (mail|email)|écris un mail|rédige un mail)\b", "email"), 
 ]
 
@@ -35,7 +43,7 @@ def fastpath_route(user_input: str) -> Optional[Action]:
     return None
 
 def build_router(model_name="gpt-4o-mini", temperature=0.0) -> ChatOpenAI:
-    return ChatOpenAI(model=model_name, temperature=temperature)
+    return make_chat_model(model=model_name, temperature=temperature)
 
 def route_query(llm: ChatOpenAI, user_input: str) -> Route:
     act = fastpath_route(user_input)
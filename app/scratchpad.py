@@ -0,0 +1,101 @@
+# app/scratchpad.py
+"""
+Scratchpad compact pour l'agent ReAct.
+
+Par défaut (format_log_to_str de LangChain), chaque itération renvoie au LLM TOUTES les
+observations précédentes en entier : une observation RAG fait ~3 500 caractères, donc
+le prompt grossit de façon quadratique sur une longue boucle.
+
+Politique appliquée ici (voir build_agent) :
+1.  les SCRATCHPAD_KEEP_LAST dernières observations restent intactes ;
+2.  les plus anciennes sont résumées de façon extractive, sans appel LLM : référence
+    et début de chaque passage ("[1] rapport.pdf ..."), ou à défaut lignes chiffrées
+    d'abord, jusqu'à SCRATCHPAD_SUMMARY_CHARS caractères ;
+3.  si le scratchpad dépasse encore SCRATCHPAD_MAX_TOKENS, les résumés les plus anciens
+    sont remplacés par une simple référence (outil + entrée).
+
+Les lignes "Thought/Action/Action Input" et le préfixe "Observation:" de chaque étape
+sont toujours conservés : le LLM garde la trace de ce qu'il a déjà fait.
+"""
+import re
+from typing import List, Tuple
+
+from langchain_core.agents import AgentAction
+
+from app.config import SCRATCHPAD_KEEP_LAST, SCRATCHPAD_MAX_TOKENS, SCRATCHPAD_SUMMARY_CHARS
+from app.llm_scheduler import estimate_tokens
+from app.tracing import METRICS
+
+_REF = re.compile(r"^\s*\[\d+\]")          # en-têtes de passages RAG / résultats web
+_NUM = re.compile(r"\d")
+
+
+def _clip(text: str, n: int) -> str:
+    return text if len(text) <= n else text[:max(0, n - 1)] + "…"
+
+
+def summarize_observation(observation: str, max_chars: int = SCRATCHPAD_SUMMARY_CHARS) -> str:
+    """Résumé extractif d'une observation, en au plus ~`max_chars` caractères.
+
+    Passages numérotés ("[1] source ...") : chaque passage garde sa référence et son début,
+    le budget étant partagé entre eux. Sinon : lignes chiffrées d'abord, ordre d'origine conservé.
+    """
+    text = str(observation)
+    if len(text) <= max_chars:
+        return text
+    lines = [l.strip() for l in text.splitlines() if l.strip()]
+    blocks: List[List[str]] = []
+    for line in lines:
+        if _REF.match(line) or not blocks:
+            blocks.append([line])
+        else:
+            blocks[-1].append(line)
+    if len(blocks) > 1 and _REF.match(blocks[1][0]):
+        per = max(40, max_chars // len(blocks))
+        kept = "\n".join(_clip(" ".join(b), per) for b in blocks)
+    else:
+        ranked = sorted(range(len(lines)), key=lambda i: (0 if _NUM.search(lines[i]) else 1, i))
+        keep, used = {}, 0
+        for i in ranked:
+            room = max_chars - used
+            if room <= 40:
+                break
+            keep[i] = _clip(lines[i], room)
+            used += len(keep[i]) + 1
+        kept = "\n".join(keep[i] for i in sorted(keep))
+    return f"{kept}\n[observation résumée : {len(text)} → {len(kept)} caractères]"
+
+
+def _reference(action: AgentAction, observation: str) -> str:
+    return (f"[observation déjà exploitée : {action.tool}({str(action.tool_input)[:80]!r}), "
+            f"{len(str(observation))} caractères]")
+
+
+def format_compact_scratchpad(
+    intermediate_steps: List[Tuple[AgentAction, str]],
+    max_tokens: int = SCRATCHPAD_MAX_TOKENS,
+    keep_last: int = SCRATCHPAD_KEEP_LAST,
+    summary_chars: int = SCRATCHPAD_SUMMARY_CHARS,
+) -> str:
+    """Équivalent de format_log_to_str avec observations anciennes résumées sous un plafond de tokens."""
+    n = len(intermediate_steps)
+    old = max(0, n - keep_last)
+    obs = [str(o) if i >= old else summarize_observation(o, summary_chars)
+           for i, (_, o) in enumerate(intermediate_steps)]
+
+    def render() -> str:
+        return "".join(f"{a.log}\nObservation: {o}\nThought: " for (a, _), o in zip(intermediate_steps, obs))
+
+    text = render()
+    if old and estimate_tokens(text) > max_tokens:
+        for i in range(old):
+            obs[i] = _reference(*intermediate_steps[i])
+            text = render()
+            if estimate_tokens(text) <= max_tokens:
+                break
+    if old:
+        # rendu refait à chaque itération ReAct : on ne compte que l'étape qui vient de
+        # sortir des `keep_last` dernières (sinon les mêmes économies seraient recomptées)
+        i = old - 1
+        METRICS.inc("scratchpad_chars_saved_total", max(0, len(str(intermediate_steps[i][1])) - len(obs[i])))
+    return text
@@ -0,0 +1,290 @@
+# app/server.py
+"""
+Service HTTP (ASGI, FastAPI) de l'agent, pour un accès programmatique à forte concurrence.
+
+Endpoints :
+    POST /v1/query          {"input": "...", "session_id": "client-42", "namespace": "desk-taux"} -> JSON
+    POST /v1/query/force    {"input": "...", "tool": "stock_data_api", ...}      -> JSON
+    POST /v1/query/stream   même corps que /v1/query (+ "tool" optionnel)         -> SSE
+    GET  /healthz           vivacité (le processus répond)
+    GET  /readyz            prêt : agent construit et file d'admission non saturée (sinon 503)
+    GET  /metrics           métriques Prometheus (app/tracing.py)
+
+- Admission : SERVER_WORKERS requêtes exécutées en parallèle (pool de threads, l'agent
+  est synchrone), SERVER_QUEUE en attente au plus ; au-delà, 429 immédiat avec
+  Retry-After (contre-pression : le client réessaie plutôt que d'empiler).
+- Sessions : la mémoire de conversation est indexée par session_id (app/memory.py) ;
+  les requêtes d'une même session sont exécutées l'une après l'autre (l'historique
+  en dépend), les sessions différentes en parallèle.
+- Espaces de noms : `namespace` choisit le corpus RAG du desk / client (rag/namespaces.py) ;
+  une session reste liée à l'espace de sa première requête (409 si une requête en demande
+  un autre), sans `namespace` elle réutilise le sien (ou l'espace par défaut).
+- SSE : événements `admitted`, `action` (outil + entrée), `observation`, puis `final`
+  (réponse, route, étapes, trace_id) ou `error`.
+
+Lancement :
+    python -m app.server                      # SERVER_HOST:SERVER_PORT
+    uvicorn app.server:app --workers 4        # plusieurs processus (mémoire par processus)
+"""
+import asyncio
+import json
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from langchain_core.callbacks import BaseCallbackHandler
+from pydantic import BaseModel, Field
+
+from app.config import SERVER_HOST, SERVER_PORT, SERVER_QUEUE, SERVER_WORKERS
+from app.tracing import METRICS
+from rag.namespaces import NAME_RE
+
+
+class QueryIn(BaseModel):
+    input: str = Field(min_length=1)
+    session_id: Optional[str] = None        # absent : session éphémère (sans mémoire partagée)
+    tool: Optional[str] = None              # outil forcé (bypass routeur)
+    namespace: Optional[str] = Field(default=None, pattern=NAME_RE.pattern)   # corpus RAG (desk / client)
+
+
+class Admission:
+    """Contrôle d'admission : `workers` exécutions simultanées, `queue` en attente, 429 au-delà."""
+
+    def __init__(self, workers: int = SERVER_WORKERS, queue: int = SERVER_QUEUE):
+        self.workers = workers
+        self.capacity = workers + queue
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent")
+        self.waiting = 0                     # admises, pas encore démarrées
+        self.running = 0                     # exécutions en cours dans le pool
+        self.rejected = 0
+        self._workers = asyncio.Semaphore(workers)
+
+    @property
+    def queued(self) -> int:
+        return self.waiting
+
+    @property
+    def admitted(self) -> int:
+        return self.waiting + self.running
+
+    def saturated(self) -> bool:
+        return self.admitted >= self.capacity
+
+    def reject_if_saturated(self) -> None:
+        if self.saturated():
+            self.rejected += 1
+            METRICS.inc("server_rejected_total")
+            raise HTTPException(429, "Serveur saturé, réessayez plus tard.", headers={"Retry-After": "1"})
+
+    def admit(self) -> None:
+        """Réserve une place dans la file (429 si pleine) ; `run` la rend."""
+        # boucle asyncio unique, pas d'await entre test et réservation : pas de verrou nécessaire
+        self.reject_if_saturated()
+        self.waiting += 1
+
+    async def run(self, session_lock: asyncio.Lock, fn, *args, **kwargs):
+        """
+        Exécute `fn` pour une requête admise : verrou de session d'abord, worker ensuite (une
+        session bavarde n'occupe qu'un worker à la fois). Worker, verrou et place ne sont rendus
+        qu'à la fin de l'exécution, même si l'appelant est annulé (client SSE parti) : le travail
+        orphelin reste compté dans la limite d'admission au lieu de s'empiler dans le pool.
+        """
+        try:
+            await session_lock.acquire()
+        except BaseException:
+            self.waiting -= 1
+            raise
+        try:
+            await self._workers.acquire()
+        except BaseException:
+            session_lock.release()
+            self.waiting -= 1
+            raise
+        self.waiting -= 1
+        self.running += 1
+
+        def _done(_fut) -> None:
+            self.running -= 1
+            self._workers.release()
+            session_lock.release()
+
+        fut = asyncio.get_running_loop().run_in_executor(self.pool, lambda: fn(*args, **kwargs))
+        fut.add_done_callback(_done)
+        return await asyncio.shield(fut)
+
+
+class _SessionLocks:
+    """Un verrou asyncio par session, libéré automatiquement quand plus personne ne l'utilise."""
+
+    def __init__(self):
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def get(self, session_id: str) -> asyncio.Lock:
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[session_id] = lock
+        return lock
+
+
+class _StepStream(BaseCallbackHandler):
+    """Relaie les étapes de l'agent (thread de travail) vers la file asyncio du flux SSE."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: "asyncio.Queue"):
+        self.loop, self.queue = loop, queue
+
+    def _push(self, event: str, data: Dict[str, Any]) -> None:
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (event, data))
+
+    def on_agent_action(self, action, **kwargs):
+        self._push("action", {"tool": action.tool, "tool_input": action.tool_input})
+
+    def on_tool_end(self, output, **kwargs):
+        self._push("observation", {"output": str(output)[:2000]})
+
+
+def _steps(result: Dict) -> List[Dict]:
+    return [{"tool": getattr(a, "tool", str(a)), "tool_input": getattr(a, "tool_input", None),
+             "observation": str(o)} for a, o in result.get("intermediate_steps", []) or []]
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def create_app(agent=None, router_llm=None, workers: int = SERVER_WORKERS, queue: int = SERVER_QUEUE) -> FastAPI:
+    """
+    Application ASGI. Sans `agent`, l'agent et le routeur réels sont construits au démarrage
+    (clés API vérifiées) ; bench/loadgen.py injecte ceux des stand-ins hors ligne.
+    """
+    from app.agent import build_agent, build_router_llm, handle_query, handle_query_force
+    from app.memory import bind_namespace
+
+    state: Dict[str, Any] = {"agent": agent, "router": router_llm}
+    admission = Admission(workers, queue)
+    sessions = _SessionLocks()
+
+    @asynccontextmanager
+    async def lifespan(_app: FastAPI):
+        if state["agent"] is None:
+            from app.config import validate_config
+            validate_config()
+            state["agent"] = await asyncio.to_thread(build_agent, verbose=False)
+            state["router"] = await asyncio.to_thread(build_router_llm)
+        yield
+        admission.pool.shutdown(wait=False, cancel_futures=True)
+
+    app = FastAPI(title="Assistant financier", lifespan=lifespan)
+    app.state.admission = admission
+
+    def _call(q: QueryIn, session_id: str, callbacks=None) -> Dict:
+        if q.tool:
+            return handle_query_force(state["agent"], q.input, q.tool, session_id=session_id, callbacks=callbacks,
+                                      namespace=q.namespace)
+        return handle_query(state["agent"], state["router"], q.input, session_id=session_id, callbacks=callbacks,
+                            namespace=q.namespace)
+
+    def _session(q: QueryIn) -> str:
+        session_id = q.session_id or f"http-{uuid.uuid4().hex[:12]}"
+        try:
+            bind_namespace(session_id, q.namespace)
+        except ValueError as e:
+            raise HTTPException(409, str(e))
+        return session_id
+
+    async def _answer(q: QueryIn) -> Dict[str, Any]:
+        session_id = _session(q)
+        t0 = time.perf_counter()
+        admission.admit()
+        res = await admission.run(sessions.get(session_id), _call, q, session_id)
+        return {"output": res.get("output", ""), "route": res.get("route"), "trace_id": res.get("trace_id"),
+                "session_id": session_id, "intermediate_steps": _steps(res),
+                "latency_s": round(time.perf_counter() - t0, 4)}
+
+    @app.post("/v1/query")
+    async def query(q: QueryIn):
+        return await _answer(q)
+
+    @app.post("/v1/query/force")
+    async def query_force(q: QueryIn):
+        if not q.tool:
+            raise HTTPException(422, "Champ 'tool' obligatoire pour /v1/query/force.")
+        return await _answer(q)
+
+    @app.post("/v1/query/stream")
+    async def query_stream(q: QueryIn):
+        session_id = _session(q)
+        admission.reject_if_saturated()      # refus AVANT d'ouvrir le flux (vrai code 429)
+
+        async def events() -> AsyncIterator[str]:
+            loop = asyncio.get_running_loop()
+            queue: asyncio.Queue = asyncio.Queue()
+            t0 = time.perf_counter()
+            task = None
+            try:
+                admission.admit()
+                task = asyncio.ensure_future(admission.run(sessions.get(session_id), _call, q, session_id,
+                                                           [_StepStream(loop, queue)]))
+                yield _sse("admitted", {"session_id": session_id})
+                while not (task.done() and queue.empty()):
+                    try:
+                        event, data = await asyncio.wait_for(queue.get(), timeout=0.05)
+                        yield _sse(event, data)
+                    except asyncio.TimeoutError:
+                        pass
+                res = task.result()
+                yield _sse("final", {"output": res.get("output", ""), "route": res.get("route"),
+                                     "trace_id": res.get("trace_id"), "intermediate_steps": _steps(res),
+                                     "latency_s": round(time.perf_counter() - t0, 4)})
+            except HTTPException as e:
+                yield _sse("error", {"status": e.status_code, "detail": e.detail})
+            except Exception as e:
+                yield _sse("error", {"status": 500, "detail": f"{type(e).__name__}: {e}"})
+            finally:
+                if task is not None and not task.done():
+                    # client parti : une requête encore en attente est abandonnée ; une exécution
+                    # déjà lancée va à son terme et garde sa place jusque-là (voir Admission.run)
+                    task.cancel()
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @app.get("/healthz")
+    async def healthz():
+        return {"status": "ok"}
+
+    @app.get("/readyz")
+    async def readyz():
+        from app.memory import session_count
+        from app.resilience import breaker_states
+        ready = state["agent"] is not None and not admission.saturated()
+        body = {"ready": ready, "running": admission.running, "queued": admission.queued,
+                "capacity": admission.capacity, "rejected": admission.rejected,
+                "sessions": session_count(), "breakers": breaker_states()}
+        return JSONResponse(body, status_code=200 if ready else 503)
+
+    @app.get("/metrics")
+    async def metrics():
+        return PlainTextResponse(METRICS.prometheus())
+
+    METRICS.register_gauge("server_inflight", lambda: {(("state", "running"),): float(admission.running),
+                                                       (("state", "queued"),): float(admission.queued)})
+    return app
+
+
+def __getattr__(name: str):
+    # `uvicorn app.server:app` : l'application n'est construite qu'à la demande
+    if name == "app":
+        globals()["app"] = application = create_app()
+        return application
+    raise AttributeError(name)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(create_app(), host=SERVER_HOST, port=SERVER_PORT, log_level="info")
@@ -0,0 +1,115 @@
+# app/startup_profile.py
+"""
+Profil du démarrage à froid d'un worker (import, construction de l'agent, premier message).
+
+Lance un interpréteur neuf avec `python -X importtime`, qui :
+1.  importe app.agent ;
+2.  construit l'agent (modèle de chat factice : aucun appel réseau) ;
+3.  répond à un premier message de smalltalk ("Bonjour").
+
+Rapport : durée de chaque étape, paquets les plus coûteux à l'import (temps propre
+cumulé par paquet racine), outils chargés, et modules lourds présents en mémoire.
+Code de sortie 1 si un module lourd (RAG, pandas, yfinance, clients réseau...) a été
+chargé pour ce premier message : utilisable comme garde-fou en CI.
+
+    python -m app.startup_profile
+    python -m app.startup_profile --top 30 --json startup.json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List
+
+# Modules qui ne doivent PAS être chargés pour répondre à un smalltalk.
+# (langchain.agents importe lui-même une partie de langchain_community : seuls
+# le client Tavily et les vector stores sont surveillés dans ce paquet.)
+HEAVY = ["pandas", "yfinance", "faiss", "langchain_community.tools.tavily_search",
+         "langchain_community.vectorstores", "email_validator",
+         "rag.retriever", "app.price_store", "app.mail_queue", "sqlite3"]
+
+_CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app.agent as ag
+t1 = time.perf_counter()
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+agent = ag.build_agent(llm=FakeListChatModel(responses=["Thought: salutation.\nFinal Answer: Bonjour !"]), verbose=False)
+t2 = time.perf_counter()
+res = ag.handle_query(agent, None, "Bonjour", session_id="startup-profile")
+t3 = time.perf_counter()
+from app.tools.registry import loaded_tools
+print("@@" + json.dumps({
+    "import_s": t1 - t0, "build_s": t2 - t1, "first_message_s": t3 - t2,
+    "route": res.get("route"), "tools_loaded": loaded_tools(),
+    "heavy_loaded": [m for m in HEAVY if m in sys.modules],
+    "modules": len(sys.modules),
+}))
+"""
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Lignes de `-X importtime` -> [{module, self_us, cumulative_us, depth}]."""
+    rows = []
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append({"module": m.group(4), "self_us": int(m.group(1)),
+                         "cumulative_us": int(m.group(2)), "depth": (len(m.group(3)) - 1) // 2})
+    return rows
+
+
+def by_package(rows: List[Dict]) -> Dict[str, float]:
+    """Temps d'import propre (s) cumulé par paquet racine (langchain, openai, pydantic...)."""
+    out: Dict[str, float] = defaultdict(float)
+    for r in rows:
+        out[r["module"].split(".")[0]] += r["self_us"] / 1e6
+    return dict(sorted(out.items(), key=lambda kv: -kv[1]))
+
+
+def profile() -> Dict:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    code = f"HEAVY = {HEAVY!r}\n" + _CHILD
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                          env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    marker = [l for l in proc.stdout.splitlines() if l.startswith("@@")]
+    if proc.returncode != 0 or not marker:
+        raise RuntimeError(f"Échec du profil de démarrage :\n{proc.stderr[-2000:]}")
+    report = json.loads(marker[-1][2:])
+    rows = parse_importtime(proc.stderr)
+    report["import_total_s"] = sum(r["self_us"] for r in rows) / 1e6
+    report["packages"] = by_package(rows)
+    return report
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Profil du démarrage à froid (imports, agent, premier message).")
+    p.add_argument("--top", type=int, default=15, help="nombre de paquets affichés")
+    p.add_argument("--json", help="écrit le rapport dans ce fichier")
+    args = p.parse_args(argv)
+
+    report = profile()
+    print(f"⏱️  import app.agent : {report['import_s']:.3f} s   build_agent : {report['build_s']:.3f} s   "
+          f"1er message ({report['route']}) : {report['first_message_s']:.3f} s")
+    print(f"📦 {report['modules']} modules chargés, {report['import_total_s']:.3f} s d'import au total\n")
+    print(f"{'paquet':<28} {'temps (s)':>9}")
+    for pkg, sec in list(report["packages"].items())[:args.top]:
+        print(f"{pkg:<28} {sec:>9.3f}")
+    print(f"\n🛠️  Outils chargés : {', '.join(report['tools_loaded']) or 'aucun'}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    if report["heavy_loaded"]:
+        print(f"❌ Modules lourds chargés pour un smalltalk : {', '.join(report['heavy_loaded'])}")
+        return 1
+    print("✅ Aucun module lourd chargé pour le premier message.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+# app/tools/bond_analytics.py
+"""
+Analytique obligataire vectorisée (tout un book en un appel).
+Coupons et rendements en %, prix pour 100 de nominal, maturités en années
+(fractionnaires acceptées : le coupon couru est calculé sur la période en cours).
+Commandes:
+  - price <coupon%> <maturité> <rendement%> [freq=2]
+        -> prix pied de coupon / plein coupon, coupon couru, duration de Macaulay,
+           duration modifiée, convexité, DV01
+  - ytm <coupon%> <maturité> <prix_pied_coupon> [freq=2]
+        -> rendement actuariel + les mêmes mesures
+  - book file=book.csv [settle=AAAA-MM-JJ]
+        -> un book entier (colonnes: coupon, maturity, yield|price, [freq], [nominal]) ;
+           maturity peut être une date (années = (date - settle)/365.25)
+  - bootstrap <tenor:par%>,<tenor:par%>,... [freq=2]
+        -> courbe zéro-coupon à partir de taux de rendement au pair
+Chaque paramètre accepte une valeur, une liste '3,4,5' ou une plage '1:10:1'
+(mêmes règles d'appariement / de grille que options_pricing).
+Exemples:
+  price 5 10 4.5
+  price 4 1:10:1 4.2 freq=1
+  ytm 5,3 10,7.25 101.3,96.8
+  bootstrap 0.5:4.0,1:4.1,2:4.3,5:4.6,10:4.9
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from langchain.tools import Tool
+
+from app.tools.options_pricing import _grid, _parse_array
+from app.tools.registry import describe
+from app.tools.risk_analytics import _parse_opts
+from app.tools.stock_data_api import _format_table, _sanitize_cmd
+from app.user_files import resolve_user_file
+
+MAX_ROWS = 25
+
+# ---------- Calculs (vectorisés sur les obligations) ----------
+def _schedule(maturity: np.ndarray, freq: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Échéancier commun à toutes les obligations :
+    renvoie (t, mask, w) avec t[i, k] en périodes depuis aujourd'hui (k-1+w_i),
+    mask[i, k] vrai si le flux k existe, w_i = fraction de période avant le prochain coupon.
+    """
+    periods = maturity * freq
+    n = np.maximum(np.ceil(periods - 1e-9), 1).astype(int)
+    w = periods - (n - 1)
+    k = np.arange(int(n.max()))[None, :]
+    t = k + w[:, None]
+    return t, k < n[:, None], w
+
+def bond_measures(coupon, maturity, yld, freq=2, face=100.0) -> Dict[str, np.ndarray]:
+    """Prix et sensibilités pour des tableaux d'obligations (coupon et rendement en décimal)."""
+    coupon, maturity, yld, freq, face = (a.astype(float).ravel() for a in np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (coupon, maturity, yld, freq, face))))
+    t, mask, w = _schedule(maturity, freq)
+    cpn = (coupon * face / freq)[:, None]
+    cf = np.where(mask, cpn, 0.0)
+    last = mask.sum(axis=1) - 1
+    cf[np.arange(len(cf)), last] += face
+    base = (1.0 + yld / freq)[:, None]
+    df = base ** -t
+    pv = cf * df
+    dirty = pv.sum(axis=1)
+    years = t / freq[:, None]
+    macaulay = (pv * years).sum(axis=1) / dirty
+    modified = macaulay / (1.0 + yld / freq)
+    convexity = (pv * t * (t + 1.0)).sum(axis=1) / (dirty * (base[:, 0] ** 2) * freq ** 2)
+    accrued = coupon * face / freq * (1.0 - w)
+    accrued = np.where(w >= 1.0 - 1e-12, 0.0, accrued)
+    return {
+        "dirty": dirty,
+        "clean": dirty - accrued,
+        "accrued": accrued,
+        "macaulay": macaulay,
+        "modified": modified,
+        "convexity": convexity,
+        "dv01": modified * dirty * 1e-4,
+    }
+
+def yield_to_maturity(coupon, maturity, clean, freq=2, face=100.0,
+                      tol: float = 1e-10, max_iter: int = 50) -> np.ndarray:
+    """Rendement actuariel (décimal) de chaque obligation : Newton vectorisé, borné."""
+    coupon, maturity, clean, freq, face = (a.astype(float).ravel() for a in np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (coupon, maturity, clean, freq, face))))
+    y = np.where(coupon > 0, coupon, 0.03)
+    lo, hi = -0.99 * freq, np.full_like(y, 2.0)
+    for _ in range(max_iter):
+        res = bond_measures(coupon, maturity, y, freq, face)
+        diff = res["clean"] - clean
+        if np.all(np.abs(diff) < tol):
+            break
+        # le prix décroît avec le rendement
+        lo = np.where(diff > 0, y, lo)
+        hi = np.where(diff < 0, y, hi)
+        step = y + diff / (res["modified"] * res["dirty"])
+        y = np.where((step > lo) & (step < hi), step, 0.5 * (lo + hi))
+    return y
+
+def bootstrap_zero_curve(tenors: np.ndarray, par: np.ndarray, freq: int = 2) -> Dict[str, np.ndarray]:
+    """
+    Courbe zéro à partir de rendements au pair (décimal), aux dates de coupon 1/freq, 2/freq, ...
+    Les taux au pair intermédiaires sont interpolés linéairement.
+    """
+    order = np.argsort(tenors)
+    tenors, par = tenors[order], par[order]
+    t = np.arange(1, int(round(tenors[-1] * freq)) + 1) / freq
+    c = np.interp(t, tenors, par) / freq
+    df = np.empty_like(t)
+    annuity = 0.0
+    for k in range(len(t)):                       # récurrence intrinsèquement séquentielle
+        df[k] = (1.0 - c[k] * annuity) / (1.0 + c[k])
+        annuity += df[k]
+    zero = freq * (df ** (-1.0 / (t * freq)) - 1.0)
+    return {"t": t, "par": c * freq, "df": df, "zero": zero, "zero_cont": -np.log(df) / t}
+
+# ---------- Sortie ----------
+def _rows(p: Dict[str, np.ndarray], res: Dict[str, np.ndarray], in_cols: List[Tuple[str, str, str]]) -> str:
+    """Tableau des résultats ; in_cols = [(clé dans p, en-tête, format)]."""
+    n = len(res["dirty"])
+    idx = np.arange(n) if n <= MAX_ROWS else np.linspace(0, n - 1, MAX_ROWS).astype(int)
+    header = (*(h for _, h, _ in in_cols), "Prix", "Plein", "Couru", "D.Mac", "D.Mod", "Convex.", "DV01")
+    rows = [
+        (*(fmt.format(p[k][i]) for k, _, fmt in in_cols),
+         f"{res['clean'][i]:.4f}", f"{res['dirty'][i]:.4f}", f"{res['accrued'][i]:.4f}",
+         f"{res['macaulay'][i]:.3f}", f"{res['modified'][i]:.3f}", f"{res['convexity'][i]:.2f}",
+         f"{res['dv01'][i]:.4f}")
+        for i in idx
+    ]
+    out = _format_table(header, rows)
+    if n > MAX_ROWS:
+        out += f"\n({MAX_ROWS} lignes affichées sur {n}, échantillonnées régulièrement)"
+    return out
+
+# ---------- Commandes ----------
+def _cmd_price(args: List[str], opts: Dict[str, str]) -> str:
+    if len(args) != 3:
+        return "Usage: price <coupon%> <maturité_années> <rendement%> [freq=2]"
+    p = _grid({"coupon": _parse_array(args[0]), "maturity": _parse_array(args[1]),
+               "yield": _parse_array(args[2]), "freq": _parse_array(opts.get("freq", "2"))})
+    res = bond_measures(p["coupon"] / 100.0, p["maturity"], p["yield"] / 100.0, p["freq"])
+    return f"Obligations — {len(res['dirty'])} ligne(s)\n" + _rows(
+        p, res, [("coupon", "Cpn%", "{:g}"), ("maturity", "Mat.", "{:g}"), ("yield", "Rdt%", "{:g}")])
+
+def _cmd_ytm(args: List[str], opts: Dict[str, str]) -> str:
+    if len(args) != 3:
+        return "Usage: ytm <coupon%> <maturité_années> <prix_pied_coupon> [freq=2]"
+    p = _grid({"coupon": _parse_array(args[0]), "maturity": _parse_array(args[1]),
+               "price": _parse_array(args[2]), "freq": _parse_array(opts.get("freq", "2"))})
+    y = yield_to_maturity(p["coupon"] / 100.0, p["maturity"], p["price"], p["freq"])
+    res = bond_measures(p["coupon"] / 100.0, p["maturity"], y, p["freq"])
+    p["ytm"] = y * 100.0
+    return f"Rendements actuariels — {len(y)} ligne(s)\n" + _rows(
+        p, res, [("coupon", "Cpn%", "{:g}"), ("maturity", "Mat.", "{:g}"), ("ytm", "Rdt%", "{:.4f}")])
+
+def _cmd_book(opts: Dict[str, str]) -> str:
+    if "file" not in opts:
+        return "Usage: book file=book.csv [settle=AAAA-MM-JJ] (colonnes: coupon, maturity, yield|price, [freq], [nominal])"
+    df = pd.read_csv(resolve_user_file(opts["file"]))      # confiné à USER_FILES_DIR
+    df.columns = [c.strip().lower() for c in df.columns]
+    if "coupon" not in df or "maturity" not in df or not ({"yield", "price"} & set(df.columns)):
+        return "Colonnes requises: coupon, maturity et yield ou price."
+    maturity = pd.to_numeric(df["maturity"], errors="coerce")
+    if maturity.isna().any():
+        settle = pd.Timestamp(opts.get("settle") or pd.Timestamp.today().normalize())
+        dates = pd.to_datetime(df["maturity"], errors="coerce")
+        maturity = maturity.fillna((dates - settle).dt.days / 365.25)
+    maturity = maturity.to_numpy(dtype=float)
+    coupon = df["coupon"].to_numpy(dtype=float) / 100.0
+    freq = df["freq"].to_numpy(dtype=float) if "freq" in df else np.full(len(df), 2.0)
+    nominal = df["nominal"].to_numpy(dtype=float) if "nominal" in df else np.full(len(df), 100.0)
+    alive = maturity > 0
+    if "yield" in df:
+        y = df["yield"].to_numpy(dtype=float) / 100.0
+    else:
+        y = yield_to_maturity(coupon, np.where(alive, maturity, 1.0), df["price"].to_numpy(dtype=float), freq)
+    res = bond_measures(coupon, np.where(alive, maturity, 1.0), y, freq)
+    mv = res["dirty"] / 100.0 * nominal * alive
+    total = mv.sum()
+    dv01 = (res["dv01"] / 100.0 * nominal * alive).sum()
+    return "\n".join([
+        f"Book obligataire: {int(alive.sum())} lignes valorisées ({int((~alive).sum())} échues ignorées)",
+        f"Valeur de marché (plein coupon) = {total:,.2f}",
+        f"Coupon couru total = {(res['accrued'] / 100.0 * nominal * alive).sum():,.2f}",
+        f"Duration modifiée moyenne pondérée = {(res['modified'] * mv).sum() / total:.3f}",
+        f"Convexité moyenne pondérée = {(res['convexity'] * mv).sum() / total:.2f}",
+        f"DV01 du book = {dv01:,.2f}",
+        f"Rendement moyen pondéré = {(y * mv).sum() / total:.4%}",
+    ])
+
+def _cmd_bootstrap(args: List[str], opts: Dict[str, str]) -> str:
+    pts = [a for arg in args for a in arg.split(",") if a]
+    if len(pts) < 2 or any(":" not in p for p in pts):
+        return "Usage: bootstrap <tenor:par%>,<tenor:par%>,... [freq=2] (ex: bootstrap 1:4.1,2:4.3,5:4.6)"
+    tenors = np.array([float(p.split(":")[0]) for p in pts])
+    par = np.array([float(p.split(":")[1]) for p in pts]) / 100.0
+    freq = int(opts.get("freq", 2))
+    curve = bootstrap_zero_curve(tenors, par, freq)
+    show = np.isin(np.round(curve["t"] * freq), np.round(tenors * freq))
+    rows = [
+        (f"{t:g}", f"{pr:.4%}", f"{z:.4%}", f"{zc:.4%}", f"{d:.6f}")
+        for t, pr, z, zc, d in zip(*(curve[k][show] for k in ("t", "par", "zero", "zero_cont", "df")))
+    ]
+    return (f"Courbe zéro-coupon (bootstrap, freq={freq}, {len(curve['t'])} points calculés)\n"
+            + _format_table(("Tenor", "Pair", "Zéro", "Zéro cont.", "DF"), rows))
+
+def _bond_fn(query: str) -> str:
+    q = _sanitize_cmd(query)
+    parts = q.split()
+    if not parts:
+        return "Commande vide. Ex: 'price 5 10 4.5'"
+    cmd = parts[0].lower()
+    args, opts = _parse_opts(parts[1:])
+    try:
+        if cmd == "price":
+            return _cmd_price(args, opts)
+        if cmd in ("ytm", "yield"):
+            return _cmd_ytm(args, opts)
+        if cmd == "book":
+            return _cmd_book(opts)
+        if cmd == "bootstrap":
+            return _cmd_bootstrap(args, opts)
+    except ValueError as e:
+        return f"Paramètres invalides: {e}"
+    except Exception as e:
+        return f"Erreur analytique obligataire: {e}"
+    return f"Commande inconnue: '{cmd}'. Commandes valides: 'price', 'ytm', 'book', 'bootstrap'."
+
+bond_analytics = Tool.from_function(
+    func=_bond_fn,
+    name="bond_analytics",
+    description=describe("bond_analytics")
+)
@@ -1,13 +1,243 @@
 # app/tools/calculatrice_financiere.py
 """
-Calculatrice financière simple (CAGR, alias 'cag').
+Calculatrice financière (CAGR, VAN, TRI, XIRR, annuités, amortissement, ROI).
+Plusieurs séries de flux peuvent être passées en UNE commande, séparées par ';'
+(ou '|') : le TRI est alors résolu de façon vectorisée sur toutes les séries.
 Exemples:
-  - cagr 1000 1300 3
-  - cag 1000 1300 3
+  - cagr 1000 1300 3            (alias: cag)
+  - npv 0.08 -1000,300,400,500  (alias: van)      -> taux puis flux (t = 0, 1, 2...)
+  - npv 0.08 -1000,300,400,500 ; -500,200,200,200
+  - irr -1000,300,400,500 ; -500,200,200,200      (alias: tri)
+  - xirr 2024-01-01:-1000,2024-06-30:300,2025-03-15:900
+  - pmt 0.05 20 200000 [fv=0] [when=end|begin]     -> taux annuel, années, capital
+  - amort 0.04 20 250000 [freq=12]                 -> tableau d'amortissement (résumé annuel)
+  - roi 1000 1300 [years=3]
 """
 import re
+from datetime import date
+from typing import List, Tuple
+
+import numpy as np
 from langchain.tools import Tool
 
+from app.tools.registry import describe
+
+MAX_ROWS = 25
+_DAYS_PER_YEAR = 365.0
+
+# ---------- Moteur (vectorisé sur les séries) ----------
+def _pad(series: List[List[float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Liste de séries de longueurs variables -> matrice (séries × périodes) + masque."""
+    width = max(len(s) for s in series)
+    flows = np.zeros((len(series), width))
+    mask = np.zeros((len(series), width), dtype=bool)
+    for i, s in enumerate(series):
+        flows[i, :len(s)] = s
+        mask[i, :len(s)] = True
+    return flows, mask
+
+def npv(rate, flows: np.ndarray, times: np.ndarray = None) -> np.ndarray:
+    """VAN de chaque ligne de `flows` (t = 0, 1, 2... ou `times` en années)."""
+    flows = np.atleast_2d(flows)
+    t = np.arange(flows.shape[1])[None, :] if times is None else np.atleast_2d(times)
+    rate = np.asarray(rate, dtype=float).reshape(-1, 1)
+    return (flows * (1.0 + rate) ** -t).sum(axis=1)
+
+def irr(flows: np.ndarray, times: np.ndarray = None, tol: float = 1e-10,
+        max_iter: int = 100) -> np.ndarray:
+    """
+    TRI de chaque ligne, toutes les séries en même temps : Newton sur la VAN,
+    repli par bissection dans [-99 %, 1000 %] quand le pas sort de l'intervalle.
+    NaN si aucun changement de signe des flux (pas de TRI).
+    """
+    flows = np.atleast_2d(flows).astype(float)
+    t = np.broadcast_to(np.arange(flows.shape[1])[None, :] if times is None else np.atleast_2d(times),
+                        flows.shape)
+    has_root = (flows.min(axis=1) < 0) & (flows.max(axis=1) > 0)
+    lo = np.full(len(flows), -0.99)
+    hi = np.full(len(flows), 10.0)
+    r = np.full(len(flows), 0.1)
+    active = has_root.copy()
+    sign_lo = np.sign((flows * (1.0 + lo[:, None]) ** -t).sum(axis=1))
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        disc = (1.0 + r[:, None]) ** -t
+        f = (flows * disc).sum(axis=1)
+        df = (-t * flows * disc / (1.0 + r[:, None])).sum(axis=1)
+        active &= np.abs(f) > tol
+        # on garde un intervalle [lo, hi] où la VAN change de signe
+        same = np.sign(f) == sign_lo
+        lo = np.where(active & same, r, lo)
+        hi = np.where(active & ~same, r, hi)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = r - f / df
+        ok = np.isfinite(step) & (step > lo) & (step < hi)
+        r = np.where(active, np.where(ok, step, 0.5 * (lo + hi)), r)
+    return np.where(has_root, r, np.nan)
+
+def pmt(rate: float, n_periods: int, pv: float, fv: float = 0.0, when: str = "end") -> float:
+    """Versement périodique constant (positif) qui rembourse `pv` (et laisse `fv`)."""
+    if rate == 0:
+        return (pv - fv) / n_periods
+    factor = (1.0 + rate) ** n_periods
+    payment = rate * (pv * factor - fv) / (factor - 1.0)
+    return payment / (1.0 + rate) if when == "begin" else payment
+
+def amortization(rate: float, n_periods: int, principal: float) -> np.ndarray:
+    """Tableau d'amortissement à échéances constantes : colonnes (versement, intérêts, capital, restant)."""
+    pay = pmt(rate, n_periods, principal)
+    k = np.arange(1, n_periods + 1)
+    growth = (1.0 + rate) ** (k - 1)
+    remaining_before = principal * growth - (pay * (growth - 1.0) / rate if rate else pay * (k - 1))
+    interest = remaining_before * rate
+    capital = pay - interest
+    remaining = remaining_before - capital
+    return np.column_stack([np.full(n_periods, pay), interest, capital, np.maximum(remaining, 0.0)])
+
+# ---------- Parsing ----------
+def _series(text: str) -> List[List[float]]:
+    """'-1000,300,400 ; -500,200' -> [[-1000, 300, 400], [-500, 200]]"""
+    out = []
+    for chunk in re.split(r"[;|]", text):
+        vals = [float(x) for x in re.split(r"[,\s]+", chunk.strip()) if x]
+        if vals:
+            out.append(vals)
+    if not out:
+        raise ValueError("aucun flux")
+    return out
+
+def _opts(parts: List[str]) -> Tuple[List[str], dict]:
+    pos = [p for p in parts if "=" not in p]
+    opts = dict(p.lower().split("=", 1) for p in parts if "=" in p)
+    return pos, opts
+
+def _fmt_rows(label: str, values: np.ndarray, fmt) -> str:
+    lines = [f"  #{i + 1}: {fmt(v)}" for i, v in enumerate(values[:MAX_ROWS])]
+    if len(values) > MAX_ROWS:
+        lines.append(f"  … +{len(values) - MAX_ROWS} séries")
+    return f"{label} ({len(values)} séries)\n" + "\n".join(lines)
+
+# ---------- Commandes ----------
+def _cmd_cagr(parts: List[str]) -> str:
+    if len(parts) != 4:
+        return "Usage: cagr <val_init> <val_fin> <années> (ex: cagr 1000 1300 3)"
+    v0 = float(parts[1]); v1 = float(parts[2]); n = float(parts[3])
+    if v0 <= 0 or v1 <= 0 or n <= 0:
+        return "Les valeurs et la durée doivent être strictement positives."
+    cagr = (v1 / v0) ** (1.0 / n) - 1.0
+    return f"CAGR = {cagr:.4%} (de {v0:g} à {v1:g} sur {n:g} ans)"
+
+def _cmd_npv(parts: List[str]) -> str:
+    if len(parts) < 3:
+        return "Usage: npv <taux> <flux0,flux1,...> [; autre série ...] (ex: npv 0.08 -1000,300,400,500)"
+    rate = float(parts[1].rstrip("%")) / (100.0 if parts[1].endswith("%") else 1.0)
+    flows, _ = _pad(_series(" ".join(parts[2:])))
+    values = npv(rate, flows)
+    if len(values) == 1:
+        return f"VAN à {rate:.2%} = {values[0]:,.2f}"
+    return _fmt_rows(f"VAN à {rate:.2%}", values, lambda v: f"{v:,.2f}")
+
+def _cmd_irr(parts: List[str]) -> str:
+    if len(parts) < 2:
+        return "Usage: irr <flux0,flux1,...> [; autre série ...] (ex: irr -1000,300,400,500)"
+    flows, _ = _pad(_series(" ".join(parts[1:])))
+    rates = irr(flows)
+    fmt = lambda r: "pas de TRI (flux sans changement de signe)" if np.isnan(r) else f"{r:.4%}"
+    if len(rates) == 1:
+        return f"TRI = {fmt(rates[0])}"
+    return _fmt_rows("TRI", rates, fmt)
+
+def _cmd_xirr(parts: List[str]) -> str:
+    usage = "Usage: xirr AAAA-MM-JJ:flux,AAAA-MM-JJ:flux,... [; autre série] (ex: xirr 2024-01-01:-1000,2025-01-01:1100)"
+    if len(parts) < 2:
+        return usage
+    series_t, series_f = [], []
+    for chunk in re.split(r"[;|]", " ".join(parts[1:])):
+        items = [x for x in re.split(r"[,\s]+", chunk.strip()) if x]
+        if not items:
+            continue
+        if any(x.count(":") != 1 for x in items):
+            return usage
+        dates = [date.fromisoformat(x.split(":")[0]) for x in items]
+        d0 = min(dates)
+        series_t.append([(d - d0).days / _DAYS_PER_YEAR for d in dates])
+        series_f.append([float(x.split(":")[1]) for x in items])
+    flows, mask = _pad(series_f)
+    times, _ = _pad(series_t)
+    rates = irr(flows, np.where(mask, times, 0.0))
+    fmt = lambda r: "pas de TRI (flux sans changement de signe)" if np.isnan(r) else f"{r:.4%}"
+    if len(rates) == 1:
+        return f"XIRR = {fmt(rates[0])}"
+    return _fmt_rows("XIRR", rates, fmt)
+
+def _periods(years: float, freq: int) -> int:
+    """Nombre de périodes (au moins une), sinon ValueError (message d'usage de l'outil)."""
+    if freq < 1:
+        raise ValueError("freq doit être >= 1")
+    n = int(round(years * freq))
+    if n < 1:
+        raise ValueError(f"durée trop courte: {years:g} an(s) × {freq}/an < 1 période")
+    return n
+
+def _cmd_pmt(parts: List[str]) -> str:
+    pos, opts = _opts(parts[1:])
+    if len(pos) != 3:
+        return "Usage: pmt <taux_annuel> <années> <capital> [fv=0] [when=end|begin] [freq=12]"
+    rate, years, pv = float(pos[0]), float(pos[1]), float(pos[2])
+    freq = int(opts.get("freq", 12))
+    n = _periods(years, freq)
+    pay = pmt(rate / freq, n, pv, float(opts.get("fv", 0)), opts.get("when", "end"))
+    return (f"Versement = {pay:,.2f} par période ({freq}/an, {n} périodes) | "
+            f"Total versé = {pay * n:,.2f} | Coût des intérêts = {pay * n - pv + float(opts.get('fv', 0)):,.2f}")
+
+def _cmd_amort(parts: List[str]) -> str:
+    pos, opts = _opts(parts[1:])
+    if len(pos) != 3:
+        return "Usage: amort <taux_annuel> <années> <capital> [freq=12]"
+    rate, years, principal = float(pos[0]), float(pos[1]), float(pos[2])
+    freq = int(opts.get("freq", 12))
+    n = _periods(years, freq)
+    table = amortization(rate / freq, n, principal)
+    # résumé par année (somme des intérêts/capital, restant dû en fin d'année)
+    year = np.arange(n) // freq
+    n_years = int(year[-1]) + 1
+    interest = np.bincount(year, weights=table[:, 1], minlength=n_years)
+    capital = np.bincount(year, weights=table[:, 2], minlength=n_years)
+    remaining = table[np.minimum((np.arange(n_years) + 1) * freq, n) - 1, 3]
+    lines = [f"Amortissement: {principal:,.2f} à {rate:.2%} sur {years:g} ans, "
+             f"versement {table[0, 0]:,.2f} ({freq}/an)",
+             "Année  Intérêts  Capital  Restant dû"]
+    for y in range(min(n_years, MAX_ROWS)):
+        lines.append(f"{y + 1}  {interest[y]:,.2f}  {capital[y]:,.2f}  {remaining[y]:,.2f}")
+    if n_years > MAX_ROWS:
+        lines.append(f"… +{n_years - MAX_ROWS} années")
+    lines.append(f"Total intérêts = {table[:, 1].sum():,.2f}")
+    return "\n".join(lines)
+
+def _cmd_roi(parts: List[str]) -> str:
+    pos, opts = _opts(parts[1:])
+    if len(pos) != 2:
+        return "Usage: roi <investi> <valeur_finale> [years=N]"
+    cost, final = float(pos[0]), float(pos[1])
+    if cost <= 0:
+        return "Le montant investi doit être strictement positif."
+    roi = final / cost - 1.0
+    out = f"ROI = {roi:.4%} (gain {final - cost:,.2f} sur {cost:,.2f})"
+    if "years" in opts and float(opts["years"]) > 0 and final > 0:
+        out += f" | annualisé = {(final / cost) ** (1.0 / float(opts['years'])) - 1.0:.4%}"
+    return out
+
+_COMMANDS = {
+    "cag": _cmd_cagr, "cagr": _cmd_cagr,
+    "npv": _cmd_npv, "van": _cmd_npv,
+    "irr": _cmd_irr, "tri": _cmd_irr,
+    "xirr": _cmd_xirr,
+    "pmt": _cmd_pmt, "annuite": _cmd_pmt, "annuité": _cmd_pmt,
+    "amort": _cmd_amort,
+    "roi": _cmd_roi,
+}
+
 def _calc_fin_fn(query: str) -> str:
     q = re.sub(r'[\"\'“”’]', "", query).strip().rstrip(".:;")
     parts = q.split()
@@ -15,22 +245,15 @@ def _calc_fin_fn(query: str) -> str:
         return "Commande vide. Ex: 'cagr 1000 1300 3'"
 
     cmd = parts[0].lower()
-    if cmd in ("cag", "cagr"):
-        if len(parts) != 4:
-            return "Usage: cagr <val_init> <val_fin> <années> (ex: cagr 1000 1300 3)"
-        try:
-            v0 = float(parts[1]); v1 = float(parts[2]); n = float(parts[3])
-            if v0 <= 0 or v1 <= 0 or n <= 0:
-                return "Les valeurs et la durée doivent être strictement positives."
-            cagr = (v1 / v0) ** (1.0 / n) - 1.0
-            return f"CAGR = {cagr:.4%} (de {v0:g} à {v1:g} sur {n:g} ans)"
-        except ValueError:
-            return "Paramètres invalides. Ex: cagr 1000 1300 3"
-    else:
-        return "Commande inconnue. Utilise: cagr <val_init> <val_fin> <années>"
+    if cmd not in _COMMANDS:
+        return "Commande inconnue. Utilise: cagr, npv, irr, xirr, pmt, amort, roi (ex: cagr 1000 1300 3)"
+    try:
+        return _COMMANDS[cmd](parts)
+    except ValueError as e:
+        return f"Paramètres invalides ({e}). Ex: cagr 1000 1300 3"
 
 calculatrice_financiere = Tool.from_function(
     func=_calc_fin_fn,
     name="calculatrice_financiere",
-    description="Calculs financiers de base. Commandes: 'cagr <v0> <v1> <années>' (alias: 'cag')."
+    description=describe("calculatrice_financiere")
 )
@@ -1,21 +1,20 @@
 # Outil pour l'envoi d'emails via SMTP
 
 # app/tools/email_tools.py
-import os
 import re
-import ssl
-import smtplib
-from email.message import EmailMessage
 from typing import Tuple, Optional
 
 from email_validator import validate_email, EmailNotValidError
 from langchain.tools import Tool
 
+from app.mail_queue import get_mail_queue, smtp_conf as _smtp_conf
+from app.tools.registry import describe
+
 # ---------- Utils ----------
 def _sanitize(s: str) -> str:
     s = s.replace("\r", " ").strip()
     s = re.sub(r"[“”’]", "'", s)
-    s = re.sub(r"\s+", " ", s)
+    s = re.sub(r"[ \t]+", " ", s)      # garde les retours à la ligne (format to:/subject:/body:)
     return s
 
 def _parse_keyvals(text: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
@@ -27,6 +26,8 @@ def _parse_keyvals(text: str) -> Tuple[Optional[str], Optional[str], Optional[st
     -> renvoie (to, subject, body)
     """
     to = subject = body = None
+    # format sur une seule ligne ("to: x subject: y body: z") -> une clé par ligne
+    text = re.sub(r"\s+(?=(?:subject|objet|body|corps)\s*:)", "\n", text, count=2, flags=re.IGNORECASE)
     lines = [l.strip() for l in text.splitlines() if l.strip()]
     buf_body = []
     in_body = False
@@ -58,17 +59,6 @@ def _validate_to(addr: str) -> str:
     except EmailNotValidError as e:
         raise ValueError(f"Adresse e-mail invalide: {e}")
 
-def _smtp_conf() -> Tuple[str, int, str, str, str, bool]:
-    host = os.getenv("SMTP_HOST", "")
-    port = int(os.getenv("SMTP_PORT", "587"))
-    user = os.getenv("SMTP_USER", "")
-    pwd  = os.getenv("SMTP_PASS", "")
-    from_addr = os.getenv("SMTP_FROM", user or "")
-    use_tls = os.getenv("SMTP_TLS", "true").lower() in {"1","true","yes","on"}
-    if not (host and port and user and pwd and from_addr):
-        raise RuntimeError("Config SMTP manquante (SMTP_HOST/PORT/USER/PASS/FROM).")
-    return host, port, user, pwd, from_addr, use_tls
-
 # ---------- Tool: Brouillon ----------
 def _draft_email_fn(query: str) -> str:
     """
@@ -104,23 +94,29 @@ def _draft_email_fn(query: str) -> str:
 draft_email = Tool.from_function(
     func=_draft_email_fn,
     name="draft_email",
-    description=(
-        "Rédige un brouillon d'e-mail FR professionnel. "
-        "Accepte du texte libre ou le format 'to:/subject:/body:'. "
-        "Renvoie le triplet to/subject/body prêt pour l'envoi."
-    ),
+    description=describe("draft_email"),
 )
 
 # ---------- Tool: Envoi SMTP ----------
 def _send_email_smtp_fn(query: str) -> str:
     """
-    Envoie un e-mail via SMTP (STARTTLS si SMTP_TLS=true).
+    Met un e-mail en file d'envoi SMTP (envoi en arrière-plan, avec retries).
     Entrée attendue AU FORMAT:
     to: destinataire@example.com
     subject: Objet
     body: Corps...
+    ou 'status <id>' pour suivre un envoi.
     """
     q = _sanitize(query)
+    parts = q.split()
+    if len(parts) == 2 and parts[0].lower() == "status" and parts[1].lstrip("#").isdigit():
+        msg_id = int(parts[1].lstrip("#"))
+        st = get_mail_queue().status([msg_id]).get(msg_id)
+        if st is None:
+            return f"❌ Aucun e-mail #{msg_id} dans la file."
+        err = f" (dernière erreur: {st['error']})" if st["error"] else ""
+        return f"E-mail #{msg_id} à {st['to']}: {st['status']} après {st['attempts']} tentative(s){err}."
+
     to, subject, body = _parse_keyvals(q)
     if not to or not subject or not body:
         return ("❌ Format manquant. Fourni:\n"
@@ -131,35 +127,14 @@ def _send_email_smtp_fn(query: str) -> str:
                 "body: Bonjour, ...")
 
     to = _validate_to(to)
-    host, port, user, pwd, from_addr, use_tls = _smtp_conf()
-
-    msg = EmailMessage()
-    msg["From"] = from_addr
-    msg["To"] = to
-    msg["Subject"] = subject
-    msg.set_content(body)
-
-    if use_tls and port == 465:
-        context = ssl.create_default_context()
-        with smtplib.SMTP_SSL(host=host, port=port, context=context) as server:
-            server.login(user, pwd)
-            server.send_message(msg)
-    else:
-        with smtplib.SMTP(host=host, port=port) as server:
-            server.ehlo()
-            if use_tls:
-                server.starttls(context=ssl.create_default_context())
-                server.ehlo()
-            server.login(user, pwd)
-            server.send_message(msg)
-
-    return f"✅ E-mail envoyé à {to} (sujet: {subject})."
+    _smtp_conf()  # config absente -> erreur immédiate plutôt qu'un échec silencieux en arrière-plan
+
+    msg_id = get_mail_queue().enqueue(to, subject, body)
+    return (f"📨 E-mail #{msg_id} pour {to} mis en file d'envoi (sujet: {subject}). "
+            f"Suivi: 'status {msg_id}'.")
 
 send_email_smtp = Tool.from_function(
     func=_send_email_smtp_fn,
     name="send_email_smtp",
-    description=(
-        "Envoie un e-mail via SMTP (config .env: SMTP_*). "
-        "Entrée OBLIGATOIRE au format lignes 'to:/subject:/body:'."
-    ),
+    description=describe("send_email_smtp"),
 )
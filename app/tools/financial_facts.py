@@ -0,0 +1,155 @@
+# app/tools/financial_facts.py
+"""
+Chiffres clés (KPI) extraits des rapports à l'ingestion (voir rag/facts.py).
+Réponse exacte et instantanée, sans LLM ni recherche sémantique.
+Commandes:
+  - kpi <EMETTEUR> <métrique> <année>          -> une valeur + sa source (fichier, page)
+  - series <EMETTEUR> <métrique>               -> toutes les années disponibles
+  - compare <EMETTEUR> <métrique> <année1> <année2>  -> valeurs + variation
+  - metrics [EMETTEUR]                          -> émetteurs / métriques indexés
+La métrique accepte les libellés FR/EN ("chiffre d'affaires", "data center", "BPA dilué"...).
+Exemples:
+  kpi NVIDIA revenue 2024
+  series NVIDIA data center
+  compare NVIDIA chiffre d'affaires 2023 2024
+"""
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from langchain.tools import Tool
+
+from app.memory import current_namespace
+from app.tools.registry import describe
+from app.tools.stock_data_api import _format_table
+from rag.facts import METRICS, Fact, FactStore, normalize_metric
+from rag.namespaces import facts_db
+
+_YEAR_RE = re.compile(r"^(?:fy)?((?:19|20)\d{2})$", re.IGNORECASE)
+_FALLBACK = "Essaie search_financial_documents pour une recherche dans le texte des rapports."
+
+_STORES: Dict[str, FactStore] = {}
+
+
+def _store() -> FactStore:
+    """Base de faits de l'espace de noms de la session en cours (voir rag/namespaces.py)."""
+    path = facts_db(current_namespace())
+    store = _STORES.get(path)
+    if store is None:
+        store = _STORES.setdefault(path, FactStore(path))
+    return store
+
+
+def _fmt_value(f: Fact) -> str:
+    if f.unit == "%":
+        return f"{f.value:,.1f} %"
+    return f"{f.value:,.2f}" if abs(f.value) < 100 else f"{f.value:,.0f}"
+
+
+def _cite(f: Fact) -> str:
+    return f"{os.path.basename(f.source) or 'source_inconnue'} p.{f.page + 1}"
+
+
+def _parse(args: List[str]) -> Tuple[str, Optional[str], List[str]]:
+    """'NVIDIA data center 2024' -> ('NVIDIA', 'data_center', ['2024'])"""
+    issuer = args[0].upper() if args else ""
+    periods, words = [], []
+    for a in args[1:]:
+        m = _YEAR_RE.match(a)
+        if m:
+            periods.append(m.group(1))
+        else:
+            words.append(a)
+    return issuer, normalize_metric(" ".join(words)) if words else None, periods
+
+
+def _missing(issuer: str, metric: Optional[str], what: str = "") -> str:
+    store = _store()
+    if issuer not in store.issuers():
+        known = ", ".join(store.issuers()) or "aucun (lancer python -m rag.ingest)"
+        return f"Émetteur inconnu: {issuer}. Émetteurs indexés: {known}. {_FALLBACK}"
+    if metric is None:
+        return f"Métrique non reconnue. Métriques connues: {', '.join(METRICS)}."
+    return f"Aucun fait {metric} {what}pour {issuer}. {_FALLBACK}".replace("  ", " ")
+
+
+def _cmd_kpi(args: List[str]) -> str:
+    issuer, metric, periods = _parse(args)
+    if not issuer or len(periods) != 1:
+        return "Format: kpi <EMETTEUR> <métrique> <année>"
+    f = _store().get(issuer, metric, periods[0]) if metric else None
+    if f is None:
+        return _missing(issuer, metric, f"{periods[0]} ")
+    return f"{issuer} {metric} {f.period}: {_fmt_value(f)} ({f.label} — {_cite(f)})"
+
+
+def _cmd_series(args: List[str]) -> str:
+    issuer, metric, _ = _parse(args)
+    if not issuer:
+        return "Format: series <EMETTEUR> <métrique>"
+    facts = _store().series(issuer, metric) if metric else []
+    if not facts:
+        return _missing(issuer, metric)
+    rows = [(f.period, _fmt_value(f), _cite(f)) for f in facts]
+    return f"{issuer} {metric}\n" + _format_table(("Période", "Valeur", "Source"), rows)
+
+
+def _cmd_compare(args: List[str]) -> str:
+    issuer, metric, periods = _parse(args)
+    if not issuer or len(periods) != 2:
+        return "Format: compare <EMETTEUR> <métrique> <année1> <année2>"
+    store = _store()
+    a, b = (store.get(issuer, metric, p) if metric else None for p in periods)
+    if a is None or b is None:
+        return _missing(issuer, metric, f"{periods[0] if a is None else periods[1]} ")
+    delta = b.value - a.value
+    unit = " pts" if a.unit == "%" else ""
+    pct = f" ({delta / abs(a.value):+.1%})" if a.value and a.unit != "%" else ""
+    return (f"{issuer} {metric}: {a.period} = {_fmt_value(a)} ; {b.period} = {_fmt_value(b)} ; "
+            f"variation {delta:+,.2f}{unit}{pct} ({_cite(b)})")
+
+
+def _cmd_metrics(args: List[str]) -> str:
+    store = _store()
+    issuers = [args[0].upper()] if args else store.issuers()
+    if not issuers:
+        return "Base de faits vide. Lance d'abord l'ingestion: python -m rag.ingest"
+    lines = []
+    for who in issuers:
+        metrics = store.metrics(who)
+        lines.append(f"{who}: {', '.join(metrics) if metrics else 'aucune métrique'}")
+    return "\n".join(lines)
+
+
+_COMMANDS = {
+    "kpi": _cmd_kpi,
+    "series": _cmd_series,
+    "compare": _cmd_compare,
+    "metrics": _cmd_metrics,
+}
+
+
+def _clean(cmd: str) -> str:
+    # comme _sanitize_cmd, mais on garde les apostrophes internes ("chiffre d'affaires")
+    s = re.sub(r'["“”]', "", cmd).replace("’", "'")
+    return re.sub(r"\s+", " ", s).strip(" '").rstrip(".:;?")
+
+
+def _financial_facts_fn(cmd: str) -> str:
+    try:
+        parts = _clean(cmd).split()
+        if not parts:
+            return "Commande vide. Exemples: 'kpi NVIDIA revenue 2024', 'series NVIDIA data center'."
+        handler = _COMMANDS.get(parts[0].lower())
+        if handler is None:
+            return f"Commande inconnue: {parts[0]}. Disponibles: {', '.join(_COMMANDS)}."
+        return handler(parts[1:])
+    except Exception as e:
+        return f"Erreur financial_facts: {e}"
+
+
+financial_facts = Tool.from_function(
+    func=_financial_facts_fn,
+    name="financial_facts",
+    description=describe("financial_facts"),
+)
@@ -0,0 +1,223 @@
+# app/tools/mail_merge.py
+"""
+Publipostage : le même point marché envoyé à une liste de clients, chacun avec ses chiffres.
+Les données sont calculées UNE fois pour tous les destinataires (un seul téléchargement
+groupé pour l'ensemble des tickers, un rapport par portefeuille distinct), puis tous les
+messages sont mis en file d'envoi d'un coup (voir app/mail_queue.py).
+
+Entrée (même format que send_email_smtp, la ligne 'to:' porte la liste) :
+    to: a@x.com=AAPL,MSFT; b@y.com=AAPL:10@150,NVDA:5 [period=1mo] [send=yes]
+    to: file=clients.csv [period=3mo] [send=yes]      (colonnes: email, name, holdings)
+    subject: Votre point marché du {date}
+    body: Bonjour {name},
+    {report}
+    Bien cordialement
+
+Holdings : tickers ('AAPL,MSFT') ou positions TICKER:quantité[@prix_revient].
+Variables du modèle : {name} {email} {tickers} {report} {period} {date}.
+Sans 'send=yes' : aperçu (premier message rendu + liste des destinataires), rien n'est envoyé.
+Avec 'send=yes' : les messages sont mis en file et leurs numéros renvoyés aussitôt ;
+'status 12-40' (ou 'status 12,13') donne l'avancement des envois.
+'file=' est lu dans USER_FILES_DIR (app/user_files.py).
+"""
+import csv
+import re
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from langchain.tools import Tool
+
+from app.mail_queue import get_mail_queue
+from app.price_store import get_price_store
+from app.tools.email_tools import _parse_keyvals, _sanitize, _validate_to
+from app.tools.portfolio_analytics import _parse_positions
+from app.tools.registry import describe
+from app.tools.stock_data_api import _format_table
+from app.user_files import resolve_user_file
+
+MAX_ROWS = 25            # lignes de statut détaillées dans l'Observation
+MAX_STATUS = 10000       # messages suivis par un 'status'
+_OPTIONS = {"file", "period", "send"}
+
+
+class _Template(dict):
+    """Variables inconnues laissées telles quelles ('{foo}') au lieu d'une KeyError."""
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def _parse_recipients(spec: str) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+    """Ligne 'to:' -> (destinataires [{email, name, holdings}], options)."""
+    opts, entries = {}, []
+    for tok in re.split(r"[;\s]+", spec.strip()):
+        if not tok:
+            continue
+        key, sep, val = tok.partition("=")
+        if sep and key.lower() in _OPTIONS:
+            opts[key.lower()] = val
+        else:
+            entries.append({"email": key, "name": "", "holdings": val})
+    if "file" in opts:
+        with open(resolve_user_file(opts["file"]), newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+                entries.append({"email": row.get("email", ""), "name": row.get("name", ""),
+                                "holdings": row.get("holdings", "")})
+    return entries, opts
+
+
+def _holdings_key(holdings: str) -> Tuple[str, ...]:
+    """'aapl, MSFT' et 'MSFT,AAPL' -> même clé : même rapport partagé."""
+    return tuple(sorted(t.upper() for t in re.split(r"[,\s]+", holdings) if t))
+
+
+def _market_data(tickers: List[str], period: str) -> Dict[str, Tuple[float, float]]:
+    """Un seul appel au store pour tous les tickers -> {ticker: (dernier cours, perf sur la période)}."""
+    if not tickers:
+        return {}
+    bars = get_price_store().get_many(tickers, period, "1d")
+    out = {}
+    for t in tickers:
+        close = bars[t].close
+        out[t] = (float(close[-1]), float(close[-1] / close[0] - 1)) if len(close) else (np.nan, np.nan)
+    return out
+
+
+def _report(key: Tuple[str, ...], data: Dict[str, Tuple[float, float]], period: str) -> str:
+    """Rapport d'un portefeuille (tickers seuls ou positions avec quantités)."""
+    if not key:
+        return ""
+    if not any(":" in tok for tok in key):
+        rows = [(t, f"{data[t][0]:.2f}", f"{data[t][1]:+.2%}") for t in key]
+        return _format_table(("Ticker", "Cours", f"Perf {period}"), rows)
+    tickers, qty, cost = _parse_positions(list(key))
+    px = np.array([data[t][0] for t in tickers])
+    value = qty * px
+    pnl = np.where(np.isnan(cost), np.nan, (px - cost) * qty)
+    rows = [(t, f"{q:g}", f"{p:.2f}", f"{v:,.2f}", "n/d" if np.isnan(g) else f"{g:+,.2f}",
+             f"{data[t][1]:+.2%}") for t, q, p, v, g in zip(tickers, qty, px, value, pnl)]
+    total = f"Valeur totale = {np.nansum(value):,.2f} | P&L latent = {np.nansum(pnl):+,.2f}"
+    return _format_table(("Ticker", "Qté", "Cours", "Valeur", "P&L", f"Perf {period}"), rows) + "\n" + total
+
+
+def _render_all(recipients: List[Dict[str, str]], subject: str, body: str,
+                period: str) -> Tuple[List[Tuple[str, str, str]], List[Tuple[str, str, str]]]:
+    """-> (messages valides [(to, subject, body)], rejets [(email, statut, détail)])."""
+    valid, rejected = [], []
+    for r in recipients:
+        try:
+            r["email"] = _validate_to(r["email"])
+            r["key"] = _holdings_key(r["holdings"])
+            if any(":" in tok for tok in r["key"]):
+                _parse_positions(list(r["key"]))            # syntaxe vérifiée avant tout calcul
+            valid.append(r)
+        except ValueError as e:
+            rejected.append((r["email"] or "?", "rejeté", str(e)))
+
+    tickers = sorted({tok.split(":", 1)[0] for r in valid for tok in r["key"]})
+    data = _market_data(tickers, period)
+    missing = {t for t, (px, _) in data.items() if np.isnan(px)}
+
+    reports: Dict[Tuple[str, ...], str] = {}
+    today = pd.Timestamp.now().strftime("%d/%m/%Y")
+    messages = []
+    for r in valid:
+        lacking = sorted({tok.split(":", 1)[0] for tok in r["key"]} & missing)
+        if lacking:
+            rejected.append((r["email"], "rejeté", f"cours indisponible: {', '.join(lacking)}"))
+            continue
+        if r["key"] not in reports:                          # un calcul par portefeuille distinct
+            reports[r["key"]] = _report(r["key"], data, period)
+        values = _Template(
+            name=r["name"] or r["email"].split("@")[0], email=r["email"], period=period, date=today,
+            tickers=", ".join(tok.split(":", 1)[0] for tok in r["key"]), report=reports[r["key"]],
+        )
+        messages.append((r["email"], subject.format_map(values), body.format_map(values)))
+    return messages, rejected
+
+
+def _status_table(rows: List[Tuple[str, str, str]]) -> str:
+    shown = rows[:MAX_ROWS]
+    more = f"\n... {len(rows) - MAX_ROWS} autres destinataires" if len(rows) > MAX_ROWS else ""
+    return _format_table(("Destinataire", "Statut", "Détail"), shown) + more
+
+
+def _parse_ids(spec: str) -> List[int]:
+    """'12-40', '12,13,20' ou '#12' -> numéros de messages."""
+    ids: List[int] = []
+    for tok in re.split(r"[,\s]+", spec.replace("#", "")):
+        if not tok:
+            continue
+        lo, sep, hi = tok.partition("-")
+        if not lo.isdigit() or (sep and not hi.isdigit()):
+            raise ValueError(f"numéro de message invalide: {tok}")
+        ids.extend(range(int(lo), int(hi) + 1) if sep else [int(lo)])
+        if len(ids) > MAX_STATUS:
+            raise ValueError(f"au plus {MAX_STATUS} messages par 'status'")
+    return ids
+
+
+def _status_fn(spec: str) -> str:
+    """Avancement d'un publipostage déjà mis en file (aucune attente)."""
+    ids = _parse_ids(spec)
+    if not ids:
+        return "Usage: status 12-40 (ou status 12,13)"
+    statuses = get_mail_queue().status(ids)
+    if not statuses:
+        return "❌ Aucun de ces e-mails dans la file."
+    rows = [(st["to"], f"{st['status']} #{i}", st["error"] or "") for i, st in sorted(statuses.items())]
+    counts = {k: sum(1 for st in statuses.values() if st["status"] == k)
+              for k in ("sent", "queued", "sending", "failed")}
+    return (f"Publipostage : {counts['sent']} envoyé(s), {counts['queued'] + counts['sending']} en cours, "
+            f"{counts['failed']} échec(s) sur {len(statuses)} message(s).\n{_status_table(rows)}")
+
+
+def _bulk_email_fn(query: str) -> str:
+    try:
+        q = _sanitize(query)
+        parts = q.split(None, 1)
+        if parts and parts[0].lower() == "status":
+            return _status_fn(parts[1] if len(parts) > 1 else "")
+        spec, subject, body = _parse_keyvals(q)
+        if not spec or not subject or not body:
+            return ("❌ Format manquant. Exemple:\n"
+                    "to: a@x.com=AAPL,MSFT; b@y.com=NVDA:5@400 send=yes\n"
+                    "subject: Votre point marché du {date}\n"
+                    "body: Bonjour {name},\n{report}\nBien cordialement")
+        recipients, opts = _parse_recipients(spec)
+        if not recipients:
+            return "❌ Aucun destinataire."
+        period = opts.get("period", "1mo")
+        t0 = time.perf_counter()
+        messages, rejected = _render_all(recipients, subject, body, period)
+        build_s = time.perf_counter() - t0
+
+        if opts.get("send", "").lower() not in {"1", "true", "yes", "oui"}:
+            preview = "Aucun message valide." if not messages else (
+                f"--- Aperçu ({messages[0][0]}) ---\nsubject: {messages[0][1]}\nbody: {messages[0][2]}")
+            rows = [(to, "prêt", "") for to, _, _ in messages] + rejected
+            return (f"Publipostage (aperçu, rien n'est envoyé) : {len(messages)} message(s) prêt(s), "
+                    f"{len(rejected)} rejet(s), rendu en {build_s:.2f}s.\n{preview}\n\n"
+                    f"{_status_table(rows)}\nAjoute 'send=yes' sur la ligne 'to:' pour envoyer.")
+
+        if not messages:
+            return "❌ Aucun message valide.\n" + _status_table(rejected)
+        queue = get_mail_queue()
+        batch = f"bulk-{int(time.time())}"
+        ids = queue.enqueue_many(messages, batch=batch)
+        # pas d'attente des accusés SMTP : la file envoie en arrière-plan (comme send_email_smtp)
+        rows = [(to, f"queued #{i}", "") for i, (to, _, _) in zip(ids, messages)] + rejected
+        ref = f"{ids[0]}-{ids[-1]}" if ids == list(range(ids[0], ids[-1] + 1)) else ",".join(map(str, ids))
+        return (f"📨 Publipostage {batch} : {len(ids)} message(s) mis en file d'envoi, "
+                f"{len(rejected)} rejet(s).\n{_status_table(rows)}\nSuivi: 'status {ref}'.")
+    except Exception as e:
+        return f"Erreur bulk_email: {e}"
+
+
+bulk_email = Tool.from_function(
+    func=_bulk_email_fn,
+    name="bulk_email",
+    description=describe("bulk_email"),
+)
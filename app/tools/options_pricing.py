@@ -0,0 +1,276 @@
+# app/tools/options_pricing.py
+"""
+Pricing d'options et Greeks (vectorisé NumPy : une chaîne entière par appel).
+Commandes:
+  - bs <call|put> <S> <K> <T> <r> <sigma> [q=0]        -> Black-Scholes (européenne)
+  - b76 <call|put> <F> <K> <T> <r> <sigma>             -> Black-76 (options sur futures)
+  - amer <call|put> <S> <K> <T> <r> <sigma> [q=0] [steps=200]
+                                                       -> américaine, arbre binomial CRR
+  - iv <call|put> <S|F> <K> <T> <r> <prix> [q=0] [model=bs|b76]
+                                                       -> volatilité implicite (Newton + bissection)
+T en années, r/q/sigma en décimal (0.05 = 5 %).
+Chaque paramètre numérique accepte une valeur, une liste '90,100,110' ou une plage
+'début:fin:pas'. Les listes de même longueur sont appariées, les listes de longueurs
+différentes forment une grille (ex: strikes × maturités).
+Une chaîne complète peut aussi venir d'un CSV : 'iv file=chaine.csv' (colonnes
+type,S,K,T,r,price[,q]) ou 'bs file=chaine.csv' (colonnes type,S,K,T,r,sigma[,q]),
+lu dans USER_FILES_DIR (app/user_files.py).
+Exemples:
+  bs call 100 105 0.5 0.03 0.2
+  bs put 100 80:120:5 0.25,0.5,1 0.03 0.2
+  amer put 100 100 1 0.05 0.25 steps=500
+  iv call 100 95,100,105 0.5 0.03 8.2,4.9,2.6
+"""
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from langchain.tools import Tool
+
+from app.quant import norm_cdf, norm_pdf
+from app.tools.registry import describe
+from app.tools.risk_analytics import _parse_opts
+from app.tools.stock_data_api import _format_table, _sanitize_cmd
+from app.user_files import resolve_user_file
+
+MAX_ROWS = 25
+IV_LOW, IV_HIGH = 1e-6, 5.0
+
+# ---------- Modèles (tous les arguments sont des tableaux diffusables) ----------
+def black_scholes(is_call, S, K, T, r, sigma, q=0.0) -> Dict[str, np.ndarray]:
+    """Prix et Greeks Black-Scholes-Merton (vega et rho pour 1 %, theta par jour)."""
+    is_call, S, K, T, r, sigma, q = np.broadcast_arrays(
+        np.asarray(is_call, dtype=bool), *(np.asarray(x, dtype=float) for x in (S, K, T, r, sigma, q)))
+    sqrt_t = np.sqrt(T)
+    vol_t = sigma * sqrt_t
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d1 = (np.log(S / K) + (r - q + 0.5 * sigma * sigma) * T) / vol_t
+    d2 = d1 - vol_t
+    sign = np.where(is_call, 1.0, -1.0)
+    df_q, df_r = np.exp(-q * T), np.exp(-r * T)
+    nd1, nd2 = norm_cdf(sign * d1), norm_cdf(sign * d2)
+    pdf1 = norm_pdf(d1)
+    price = sign * (S * df_q * nd1 - K * df_r * nd2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gamma = df_q * pdf1 / (S * vol_t)
+        theta = (-S * df_q * pdf1 * sigma / (2.0 * sqrt_t)
+                 - sign * r * K * df_r * nd2 + sign * q * S * df_q * nd1)
+    return {
+        "price": price,
+        "delta": sign * df_q * nd1,
+        "gamma": gamma,
+        "vega": S * df_q * pdf1 * sqrt_t / 100.0,
+        "theta": theta / 365.0,
+        "rho": sign * K * T * df_r * nd2 / 100.0,
+    }
+
+def black76(is_call, F, K, T, r, sigma) -> Dict[str, np.ndarray]:
+    """Black-76 = Black-Scholes avec S=F et q=r ; le rho porte sur l'actualisation seule."""
+    out = black_scholes(is_call, F, K, T, r, sigma, q=r)
+    out["rho"] = -np.asarray(T, dtype=float) * out["price"] / 100.0
+    return out
+
+def _crr_block(is_call, S, K, T, r, sigma, q, steps):
+    """Remonte l'arbre CRR pour un bloc d'options (buffers réutilisés en place)."""
+    dt = T / steps
+    u = np.exp(sigma * np.sqrt(dt))
+    d = 1.0 / u
+    p = (np.exp((r - q) * dt) - d) / (u - d)
+    disc = np.exp(-r * dt)
+    sign = np.where(is_call, 1.0, -1.0)[:, None]
+    u_col, strike = u[:, None], K[:, None]
+    a, b = (disc * p)[:, None], (disc * (1.0 - p))[:, None]
+    # sous-jacent aux nœuds du dernier pas: S·u^(steps-2j) ; au pas i, nœud j = nœud j du pas i+1 / u
+    spot = S[:, None] * np.exp((steps - 2 * np.arange(steps + 1)) * np.log(u_col))
+    values = np.maximum(sign * (spot - strike), 0.0)
+    tmp = np.empty_like(values)
+    keep = {}
+    for i in range(steps - 1, -1, -1):
+        w = i + 1
+        v, s, t = values[:, :w], spot[:, :w], tmp[:, :w]
+        np.multiply(values[:, 1:w + 1], b, out=t)
+        v *= a
+        v += t                                   # valeur de continuation
+        s /= u_col
+        np.subtract(s, strike, out=t)
+        t *= sign
+        np.maximum(v, t, out=v)                  # exercice anticipé
+        if i in (1, 2):
+            keep[i] = (v.copy(), s.copy())
+    (v1, s1), (v2, s2) = keep[1], keep[2]
+    delta = (v1[:, 0] - v1[:, 1]) / (s1[:, 0] - s1[:, 1])
+    d_up = (v2[:, 0] - v2[:, 1]) / (s2[:, 0] - s2[:, 1])
+    d_dn = (v2[:, 1] - v2[:, 2]) / (s2[:, 1] - s2[:, 2])
+    gamma = (d_up - d_dn) / (0.5 * (s2[:, 0] - s2[:, 2]))
+    return values[:, 0].copy(), delta, gamma
+
+def binomial_american(is_call, S, K, T, r, sigma, q=0.0, steps: int = 200,
+                      block: int = 256) -> Dict[str, np.ndarray]:
+    """
+    Options américaines, arbre CRR vectorisé : les options remontent l'arbre
+    ensemble (tableau options × nœuds), par blocs qui tiennent en cache.
+    Delta/gamma lus sur l'arbre.
+    """
+    arrays = [a.ravel() for a in np.broadcast_arrays(
+        np.asarray(is_call, dtype=bool), *(np.asarray(x, dtype=float) for x in (S, K, T, r, sigma, q)))]
+    steps = max(int(steps), 3)                   # delta/gamma lus aux pas 1 et 2
+    n = len(arrays[0])
+    out = {k: np.empty(n) for k in ("price", "delta", "gamma")}
+    for lo in range(0, n, block):
+        sl = slice(lo, lo + block)
+        out["price"][sl], out["delta"][sl], out["gamma"][sl] = _crr_block(*(a[sl] for a in arrays), steps)
+    return out
+
+def implied_vol(is_call, S, K, T, r, price, q=0.0, model: str = "bs",
+                tol: float = 1e-8, max_iter: int = 100) -> np.ndarray:
+    """
+    Volatilité implicite de toute une chaîne en une passe vectorisée :
+    pas de Newton (vega) tant qu'il reste dans l'intervalle [bas, haut] qui encadre
+    la solution, bissection sinon. NaN si le prix viole les bornes d'arbitrage.
+    """
+    is_call, S, K, T, r, price, q = np.broadcast_arrays(
+        np.asarray(is_call, dtype=bool), *(np.asarray(x, dtype=float) for x in (S, K, T, r, price, q)))
+    if model == "b76":
+        q = r
+    pricer = lambda sig: black_scholes(is_call, S, K, T, r, sig, q)
+    df_q, df_r = np.exp(-q * T), np.exp(-r * T)
+    lower = np.where(is_call, np.maximum(S * df_q - K * df_r, 0.0), np.maximum(K * df_r - S * df_q, 0.0))
+    upper = np.where(is_call, S * df_q, K * df_r)
+    valid = (price > lower) & (price < upper) & (T > 0)
+
+    lo = np.full(price.shape, IV_LOW)
+    hi = np.full(price.shape, IV_HIGH)
+    sig = np.full(price.shape, 0.2)
+    active = valid.copy()
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        res = pricer(sig)
+        diff = res["price"] - price
+        active &= np.abs(diff) > tol
+        # le prix croît avec sigma : on resserre l'intervalle
+        hi = np.where(active & (diff > 0), sig, hi)
+        lo = np.where(active & (diff < 0), sig, lo)
+        vega = res["vega"] * 100.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = sig - diff / vega
+        ok = np.isfinite(newton) & (newton > lo) & (newton < hi)
+        sig = np.where(active, np.where(ok, newton, 0.5 * (lo + hi)), sig)
+    return np.where(valid, sig, np.nan)
+
+# ---------- Parsing ----------
+def _parse_array(tok: str) -> np.ndarray:
+    """'100' | '90,100,110' | '80:120:5' -> tableau float."""
+    if ":" in tok:
+        a, b, *step = (float(x) for x in tok.split(":"))
+        st = step[0] if step else 1.0
+        return np.arange(a, b + st / 2.0, st)
+    return np.array([float(x) for x in tok.split(",") if x])
+
+def _grid(params: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Aplatit les paramètres: les listes de même longueur sont appariées,
+    chaque longueur distincte (> 1) devient un axe de la grille.
+    """
+    lengths = sorted({len(v) for v in params.values() if len(v) > 1})
+    axis_of = {n: i for i, n in enumerate(lengths)}
+    shape = [1] * len(lengths)
+    out = {}
+    for k, v in params.items():
+        if len(v) > 1:
+            sh = list(shape)
+            sh[axis_of[len(v)]] = len(v)
+            out[k] = v.reshape(sh)
+        else:
+            out[k] = v.reshape(shape) if shape else v
+    arrays = np.broadcast_arrays(*out.values())
+    return {k: a.ravel() for k, a in zip(out, arrays)}
+
+def _parse_kind(tok: str) -> np.ndarray:
+    kinds = [k.strip().lower() for k in tok.split(",") if k.strip()]
+    bad = [k for k in kinds if k not in ("call", "put", "c", "p")]
+    if bad or not kinds:
+        raise ValueError(f"type d'option '{tok}' (attendu call|put)")
+    return np.array([k.startswith("c") for k in kinds], dtype=float)
+
+def _load_chain(path: str, last: str) -> Dict[str, np.ndarray]:
+    df = pd.read_csv(resolve_user_file(path))
+    df.columns = [c.strip() for c in df.columns]
+    needed = ["type", "S", "K", "T", "r", last]
+    missing = [c for c in needed if c not in df.columns]
+    if missing:
+        raise ValueError(f"colonnes manquantes dans {path}: {', '.join(missing)}")
+    out = {"call": df["type"].astype(str).str.lower().str.startswith("c").to_numpy(dtype=float)}
+    for c in needed[1:]:
+        out[c] = df[c].to_numpy(dtype=float)
+    out["q"] = df["q"].to_numpy(dtype=float) if "q" in df.columns else np.zeros(len(df))
+    return out
+
+def _params(args: List[str], names: List[str], opts: Dict[str, str]) -> Dict[str, np.ndarray]:
+    """args = [type, x1, ..., x5] -> grille {'call', names..., 'q'}."""
+    if "file" in opts:
+        return _load_chain(opts["file"], names[-1])
+    if len(args) != len(names) + 1:
+        raise ValueError("nombre d'arguments (voir l'aide de la commande)")
+    params = {"call": _parse_kind(args[0])}
+    params.update({n: _parse_array(a) for n, a in zip(names, args[1:])})
+    params["q"] = _parse_array(opts.get("q", "0"))
+    return _grid(params)
+
+# ---------- Sortie ----------
+def _render(title: str, p: Dict[str, np.ndarray], res: Dict[str, np.ndarray],
+            in_cols: List[str], out_cols: List[str]) -> str:
+    n = len(next(iter(res.values())))
+    idx = np.arange(n) if n <= MAX_ROWS else np.linspace(0, n - 1, MAX_ROWS).astype(int)
+    header = ("Type", *in_cols, *out_cols)
+    rows = [
+        ("call" if p["call"][i] else "put",
+         *(f"{p[c][i]:g}" for c in in_cols),
+         *(f"{res[c][i]:.4f}" if np.isfinite(res[c][i]) else "n/d" for c in out_cols))
+        for i in idx
+    ]
+    lines = [f"{title} — {n} option(s)", _format_table(header, rows)]
+    if n > MAX_ROWS:
+        lines.append(f"({MAX_ROWS} lignes affichées sur {n}, échantillonnées régulièrement)")
+    return "\n".join(lines)
+
+GREEKS = ["price", "delta", "gamma", "vega", "theta", "rho"]
+
+def _options_fn(query: str) -> str:
+    q = _sanitize_cmd(query)
+    parts = q.split()
+    if not parts:
+        return "Commande vide. Ex: 'bs call 100 105 0.5 0.03 0.2'"
+    cmd = parts[0].lower()
+    args, opts = _parse_opts(parts[1:])
+    try:
+        if cmd == "bs":
+            p = _params(args, ["S", "K", "T", "r", "sigma"], opts)
+            res = black_scholes(p["call"], p["S"], p["K"], p["T"], p["r"], p["sigma"], p["q"])
+            return _render("Black-Scholes", p, res, ["S", "K", "T", "sigma"], GREEKS)
+        if cmd == "b76":
+            p = _params(args, ["S", "K", "T", "r", "sigma"], opts)
+            res = black76(p["call"], p["S"], p["K"], p["T"], p["r"], p["sigma"])
+            return _render("Black-76 (S = prix du future)", p, res, ["S", "K", "T", "sigma"], GREEKS)
+        if cmd == "amer":
+            p = _params(args, ["S", "K", "T", "r", "sigma"], opts)
+            steps = max(int(opts.get("steps", 200)), 3)
+            res = binomial_american(p["call"], p["S"], p["K"], p["T"], p["r"], p["sigma"], p["q"], steps)
+            return _render(f"Américaine (CRR, {steps} pas)", p, res, ["S", "K", "T", "sigma"],
+                           ["price", "delta", "gamma"])
+        if cmd == "iv":
+            p = _params(args, ["S", "K", "T", "r", "price"], opts)
+            model = opts.get("model", "bs").lower()
+            iv = implied_vol(p["call"], p["S"], p["K"], p["T"], p["r"], p["price"], p["q"], model)
+            return _render(f"Volatilité implicite ({model})", p, {"iv": iv}, ["S", "K", "T", "price"], ["iv"])
+    except ValueError as e:
+        return f"Paramètres invalides: {e}"
+    except Exception as e:
+        return f"Erreur pricing options: {e}"
+    return f"Commande inconnue: '{cmd}'. Commandes valides: 'bs', 'b76', 'amer', 'iv'."
+
+options_pricing = Tool.from_function(
+    func=_options_fn,
+    name="options_pricing",
+    description=describe("options_pricing")
+)
@@ -0,0 +1,289 @@
+# app/tools/portfolio_analytics.py
+"""
+Analyse et rééquilibrage de portefeuille (vectorisé NumPy, 1000+ lignes par appel).
+Positions au format TICKER:quantité[@prix_de_revient], poids au format TICKER:poids.
+Commandes:
+  - pnl <positions...> [cash=0]
+        -> valeur, P&L, exposition (poids) par ligne + totaux
+  - cov <TICKER> [TICKER ...] [period] [shrink=0.1]
+        -> volatilités et matrice de corrélation annualisées
+  - rebalance <positions...> target=T1:w1,T2:w2 [cash=0] [lot=1|T1:100,..]
+              [band=0.01] [turnover=1.0]
+        -> ordres minimaux: on ne traite que les écarts > band, plafond de
+           rotation (turnover, en fraction de la valeur), arrondi aux lots
+  - optimize <TICKER> [TICKER ...] [period] [gamma=3] [shrink=0.1] [long_only=1]
+        -> poids moyenne-variance (max μ'w - γ/2 w'Σw, somme des poids = 1)
+Exemples:
+  pnl AAPL:10@150 MSFT:5@300 cash=1000
+  rebalance AAPL:10 MSFT:5 NVDA:0 target=AAPL:0.5,MSFT:0.3,NVDA:0.2 lot=1 turnover=0.2
+  optimize AAPL MSFT NVDA GOOGL 2y gamma=5
+Les prix viennent du store local (app/price_store.py).
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from langchain.tools import Tool
+
+from app.price_store import get_price_store
+from app.tools.registry import describe
+from app.tools.risk_analytics import TRADING_DAYS, _parse_opts, _pct, log_returns
+from app.tools.stock_data_api import _format_table, _sanitize_cmd, _split_tickers
+
+MAX_ROWS = 25  # lignes détaillées max dans l'Observation (les totaux couvrent tout)
+
+# ---------- Calculs ----------
+def covariance(rets: pd.DataFrame, shrink: float = 0.1) -> np.ndarray:
+    """Covariance annualisée, rétrécie vers sa diagonale (reste inversible si N > T)."""
+    s = np.cov(rets.to_numpy(dtype=float), rowvar=False).reshape(rets.shape[1], rets.shape[1])
+    s = (1.0 - shrink) * s + shrink * np.diag(np.diag(s))
+    return s * TRADING_DAYS
+
+def _project_simplex(v: np.ndarray) -> np.ndarray:
+    """Projection euclidienne sur {w >= 0, sum w = 1}."""
+    u = np.sort(v)[::-1]
+    css = np.cumsum(u) - 1.0
+    k = np.nonzero(u - css / np.arange(1, len(v) + 1) > 0)[0][-1]
+    return np.maximum(v - css[k] / (k + 1.0), 0.0)
+
+def mean_variance_weights(mu: np.ndarray, cov: np.ndarray, gamma: float = 3.0,
+                          long_only: bool = True, iters: int = 500) -> np.ndarray:
+    """
+    max μ'w - γ/2 w'Σw  s.c. 1'w = 1 (et w >= 0 si long_only).
+    Sans contrainte de signe: solution fermée. Long-only: gradient projeté sur le simplexe.
+    """
+    n = len(mu)
+    if not long_only:
+        inv_mu = np.linalg.solve(cov, mu)
+        inv_1 = np.linalg.solve(cov, np.ones(n))
+        lam = (inv_mu.sum() - gamma) / inv_1.sum()
+        return (inv_mu - lam * inv_1) / gamma
+    # pas = 1/L, L = γ·λmax(Σ) estimée par quelques itérations de la puissance
+    v = np.full(n, 1.0 / np.sqrt(n))
+    for _ in range(30):
+        v = cov @ v
+        v /= np.linalg.norm(v)
+    step = 1.0 / (gamma * float(v @ cov @ v) * 1.01)
+    # gradient projeté accéléré (FISTA)
+    w = y = np.full(n, 1.0 / n)
+    t = 1.0
+    for _ in range(iters):
+        w_new = _project_simplex(y + step * (mu - gamma * cov @ y))
+        if np.abs(w_new - w).sum() < 1e-10:
+            return w_new
+        t_new = 0.5 * (1.0 + np.sqrt(1.0 + 4.0 * t * t))
+        y = w_new + (t - 1.0) / t_new * (w_new - w)
+        w, t = w_new, t_new
+    return w
+
+def rebalance_trades(qty: np.ndarray, px: np.ndarray, target: np.ndarray, cash: float = 0.0,
+                     lots: Optional[np.ndarray] = None, band: float = 0.01,
+                     max_turnover: float = 1.0) -> np.ndarray:
+    """
+    Ordres (en titres, multiples de lot) pour rapprocher le portefeuille des poids cibles.
+    - seules les lignes dont l'écart de poids dépasse `band` sont traitées ;
+    - la rotation totale (somme |ordres| / valeur) est plafonnée à `max_turnover` ;
+    - les achats sont réduits si le cash (après ventes) ne suffit pas.
+    """
+    lots = np.ones_like(px) if lots is None else lots
+    value = qty * px
+    total = value.sum() + cash
+    drift = target * total - value
+    drift[np.abs(drift) / total <= band] = 0.0
+    turnover = np.abs(drift).sum() / total
+    if turnover > max_turnover:
+        drift *= max_turnover / turnover
+    trades = np.trunc(drift / px / lots) * lots          # arrondi vers 0: jamais au-delà de la cible
+    available = cash - (trades * px)[trades < 0].sum()
+    buys = (trades * px)[trades > 0].sum()
+    if buys > available > 0:
+        buy = trades > 0
+        trades[buy] = np.floor(trades[buy] * available / buys / lots[buy]) * lots[buy]
+    elif buys > 0 and available <= 0:
+        trades[trades > 0] = 0.0
+    return trades
+
+# ---------- Parsing ----------
+def _parse_positions(tokens: List[str]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """'AAPL:10@150' -> (tickers, quantités, prix de revient (nan si absent))."""
+    tickers, qty, cost = [], [], []
+    for tok in tokens:
+        if ":" not in tok:
+            raise ValueError(f"position '{tok}' (attendu TICKER:quantité[@prix])")
+        t, rest = tok.split(":", 1)
+        q, _, c = rest.partition("@")
+        tickers.append(t.upper())
+        qty.append(float(q))
+        cost.append(float(c) if c else np.nan)
+    return tickers, np.array(qty), np.array(cost)
+
+def _parse_mapping(text: str) -> Dict[str, float]:
+    """'AAPL:0.5,MSFT:0.5' -> {'AAPL': 0.5, 'MSFT': 0.5}"""
+    out = {}
+    for item in text.split(","):
+        if item:
+            k, v = item.split(":", 1)
+            out[k.upper()] = float(v)
+    return out
+
+def _last_prices(tickers: List[str]) -> np.ndarray:
+    bars = get_price_store().get_many(tickers, "5d", "1d")
+    return np.array([float(bars[t].close[-1]) if len(bars[t]) else np.nan for t in tickers])
+
+def _truncate(rows: List[tuple]) -> List[tuple]:
+    if len(rows) <= MAX_ROWS:
+        return rows
+    return rows[:MAX_ROWS] + [("…", f"+{len(rows) - MAX_ROWS} lignes")]
+
+# ---------- Commandes ----------
+def _cmd_pnl(args: List[str]) -> str:
+    pos, opts = _parse_opts(args)
+    if not pos:
+        return "Usage: pnl TICKER:qte[@prix_revient] ... [cash=0] (ex: pnl AAPL:10@150 MSFT:5@300)"
+    tickers, qty, cost = _parse_positions(pos)
+    cash = float(opts.get("cash", 0))
+    px = _last_prices(tickers)
+    if np.isnan(px).any():
+        return "Cours indisponible pour: " + ", ".join(t for t, p in zip(tickers, px) if np.isnan(p))
+
+    value = qty * px
+    pnl = np.where(np.isnan(cost), np.nan, (px - cost) * qty)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pnl_pct = pnl / np.abs(cost * qty)               # signe correct pour les positions courtes
+    nav = value.sum() + cash
+    weight = value / nav
+    order = np.argsort(-np.abs(value))
+    rows = [
+        (tickers[i], f"{qty[i]:g}", f"{px[i]:.2f}", f"{value[i]:,.2f}",
+         "n/d" if np.isnan(pnl[i]) else f"{pnl[i]:+,.2f}", _pct(pnl_pct[i]), _pct(weight[i]))
+        for i in order
+    ]
+    total_pnl = np.nansum(pnl)
+    invested = np.nansum(np.abs(cost * qty))
+    return "\n".join([
+        f"Portefeuille ({len(tickers)} lignes)",
+        _format_table(("Ticker", "Qté", "Cours", "Valeur", "P&L", "P&L%", "Poids"), _truncate(rows)),
+        f"Valeur titres = {value.sum():,.2f} | Cash = {cash:,.2f} | Total = {nav:,.2f}",
+        f"P&L latent = {total_pnl:+,.2f}" + (f" ({total_pnl / invested:+.2%})" if invested else ""),
+        f"Exposition longue = {_pct(weight[weight > 0].sum())}, courte = {_pct(-weight[weight < 0].sum())}",
+    ])
+
+def _returns_for(tickers: List[str], period: str) -> pd.DataFrame:
+    prices = get_price_store().close_matrix(tickers, period, "1d").dropna(how="all").ffill().dropna()
+    return log_returns(prices)
+
+def _cmd_cov(args: List[str]) -> str:
+    pos, opts = _parse_opts(args)
+    tickers, rest = _split_tickers(pos)
+    if len(tickers) < 2:
+        return "Usage: cov <TICKER> <TICKER> [...] [period] [shrink=0.1]"
+    period = rest[0] if rest else "1y"
+    rets = _returns_for(tickers, period)
+    if len(rets) < 3:
+        return f"Pas assez de données pour {', '.join(tickers)} (period={period})."
+    cov = covariance(rets, float(opts.get("shrink", 0.1)))
+    vol = np.sqrt(np.diag(cov))
+    corr = cov / np.outer(vol, vol)
+    cols = list(rets.columns)[:MAX_ROWS]
+    rows = [(t, _pct(vol[i]), *(f"{corr[i, j]:.2f}" for j in range(len(cols)))) for i, t in enumerate(cols)]
+    return (f"Volatilités et corrélations annualisées ({period}, {len(rets)} jours)\n"
+            + _format_table(("Ticker", "Vol", *cols), rows))
+
+def _cmd_rebalance(args: List[str]) -> str:
+    pos, opts = _parse_opts(args)
+    if not pos or "target" not in opts:
+        return ("Usage: rebalance TICKER:qte ... target=T1:w1,T2:w2 [cash=0] [lot=1|T1:100,..] "
+                "[band=0.01] [turnover=1.0]")
+    tickers, qty, _ = _parse_positions(pos)
+    target_map = _parse_mapping(opts["target"])
+    # les tickers présents seulement dans la cible entrent avec une quantité nulle
+    extra = [t for t in target_map if t not in tickers]
+    tickers += extra
+    qty = np.concatenate([qty, np.zeros(len(extra))])
+    target = np.array([target_map.get(t, 0.0) for t in tickers])
+    if target.sum() <= 0:
+        return "target: la somme des poids doit être positive."
+    target = target / target.sum()
+
+    lot_opt = opts.get("lot", "1")
+    if ":" in lot_opt:
+        lot_map = _parse_mapping(lot_opt)
+        lots = np.array([lot_map.get(t, 1.0) for t in tickers])
+    else:
+        lots = np.full(len(tickers), float(lot_opt))
+
+    px = _last_prices(tickers)
+    if np.isnan(px).any():
+        return "Cours indisponible pour: " + ", ".join(t for t, p in zip(tickers, px) if np.isnan(p))
+    cash = float(opts.get("cash", 0))
+    trades = rebalance_trades(qty, px, target, cash, lots,
+                              band=float(opts.get("band", 0.01)),
+                              max_turnover=float(opts.get("turnover", 1.0)))
+
+    total = (qty * px).sum() + cash
+    new_qty = qty + trades
+    new_w = new_qty * px / total
+    traded = np.nonzero(trades)[0]
+    turnover = np.abs(trades * px).sum() / total
+    rows = [
+        (tickers[i], "ACHAT" if trades[i] > 0 else "VENTE", f"{abs(trades[i]):g}",
+         f"{abs(trades[i]) * px[i]:,.2f}", _pct(qty[i] * px[i] / total), _pct(new_w[i]), _pct(target[i]))
+        for i in traded[np.argsort(-np.abs(trades[traded] * px[traded]))]
+    ]
+    if not rows:
+        return "Aucun ordre: le portefeuille est déjà dans la bande de tolérance."
+    cash_after = cash - (trades * px).sum()
+    return "\n".join([
+        f"Rééquilibrage: {len(rows)} ordre(s), rotation = {_pct(turnover)}",
+        _format_table(("Ticker", "Sens", "Qté", "Montant", "Poids av.", "Poids ap.", "Cible"), _truncate(rows)),
+        f"Écart résiduel max à la cible = {_pct(np.abs(new_w - target).max())} | Cash après = {cash_after:,.2f}",
+    ])
+
+def _cmd_optimize(args: List[str]) -> str:
+    pos, opts = _parse_opts(args)
+    tickers, rest = _split_tickers(pos)
+    if len(tickers) < 2:
+        return "Usage: optimize <TICKER> <TICKER> [...] [period] [gamma=3] [shrink=0.1] [long_only=1]"
+    period = rest[0] if rest else "1y"
+    gamma = float(opts.get("gamma", 3.0))
+    long_only = opts.get("long_only", "1").lower() in {"1", "true", "yes", "oui"}
+    rets = _returns_for(tickers, period)
+    if len(rets) < 3:
+        return f"Pas assez de données pour {', '.join(tickers)} (period={period})."
+    mu = rets.mean().to_numpy() * TRADING_DAYS
+    cov = covariance(rets, float(opts.get("shrink", 0.1)))
+    w = mean_variance_weights(mu, cov, gamma, long_only)
+    exp_ret = float(mu @ w)
+    vol = float(np.sqrt(w @ cov @ w))
+    cols = list(rets.columns)
+    order = np.argsort(-np.abs(w))
+    rows = [(cols[i], _pct(w[i]), _pct(mu[i])) for i in order if abs(w[i]) > 1e-6]
+    return "\n".join([
+        f"Poids moyenne-variance ({period}, γ={gamma:g}, {'long-only' if long_only else 'long/short'})",
+        _format_table(("Ticker", "Poids", "Rdt.an"), _truncate(rows)),
+        f"Rendement attendu = {_pct(exp_ret)} | Volatilité = {_pct(vol)}"
+        + (f" | Sharpe (rf=0) = {exp_ret / vol:.2f}" if vol > 0 else ""),
+    ])
+
+def _portfolio_fn(query: str) -> str:
+    q = _sanitize_cmd(query)
+    parts = q.split()
+    if not parts:
+        return "Commande vide. Ex: 'pnl AAPL:10@150 MSFT:5@300'"
+    cmd = parts[0].lower()
+    args = [a for p in parts[1:] for a in ([p] if "=" in p else p.split(",")) if a]
+    handlers = {"pnl": _cmd_pnl, "cov": _cmd_cov, "rebalance": _cmd_rebalance, "optimize": _cmd_optimize}
+    if cmd not in handlers:
+        return f"Commande inconnue: '{cmd}'. Commandes valides: {', '.join(handlers)}."
+    try:
+        return handlers[cmd](args)
+    except ValueError as e:
+        return f"Paramètres invalides: {e}"
+    except Exception as e:
+        return f"Erreur portefeuille: {e}"
+
+portfolio_analytics = Tool.from_function(
+    func=_portfolio_fn,
+    name="portfolio_analytics",
+    description=describe("portfolio_analytics")
+)
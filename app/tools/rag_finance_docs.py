@@ -1,23 +1,72 @@
 # app/tools/rag_finance_docs.py
 """
 RAG sur tes documents financiers déjà indexés (FAISS).
-Nécessite un retriever exposé par app.retriever.get_retriever().
+Nécessite un retriever exposé par rag.retriever.get_retriever().
+L'index n'est chargé qu'à la première recherche (pas à l'import du module).
+Chaque desk / client cherche dans son propre corpus : l'espace de noms vient de la
+session en cours (app/memory.py) ; les index des espaces actifs restent en mémoire
+(RAG_MAX_NAMESPACES au plus, LRU), les autres sont rechargés à la demande.
 """
+import threading
+from typing import Any, Optional, Tuple
+
 from langchain.tools import Tool
 
-# On s'appuie sur ton module retriever existant
-try:
-    from rag.retriever import get_retriever
-    _RETRIEVER = get_retriever() 
-except Exception as e:
-    _RETRIEVER = None
-    _ERR = f"[RAG] Retriever indisponible: {e}"
+from app.config import RETRIEVER_TIMEOUT
+from app.memory import current_namespace
+from app.resilience import UpstreamError, guarded
+from app.tools.registry import describe
+from app.tracing import METRICS, span
+from rag.namespaces import index_version, resolve
+
+_RETRIEVER = None       # retriever imposé pour tous les espaces (stand-ins de bench/replay.py)
+_CACHE = None
+_LOCK = threading.Lock()
+
+
+def _cache():
+    """Cache LRU des retrievers par espace (FAISS n'est importé qu'ici, à la première recherche)."""
+    global _CACHE
+    if _CACHE is None:
+        with _LOCK:
+            if _CACHE is None:
+                # On s'appuie sur ton module retriever existant
+                from rag.retriever import RetrieverCache
+                _CACHE = RetrieverCache()
+                METRICS.register_gauge("rag_namespaces_loaded", lambda: {(): float(len(_CACHE.loaded()))})
+    return _CACHE
+
+
+def _load(namespace: Optional[str] = None) -> Tuple[Any, Optional[str]]:
+    """(retriever, None) ou (None, message d'erreur renvoyé à l'agent)."""
+    if _RETRIEVER is not None:
+        return _RETRIEVER, None
+    try:
+        namespace = resolve(namespace or current_namespace())
+    except ValueError as e:
+        return None, f"[RAG] {e}"
+    if index_version(namespace) is None:
+        return None, (f"[RAG] Aucun index pour l'espace '{namespace}'. "
+                      f"Lancez 'python -m rag.ingest --namespace {namespace}'.")
+    try:
+        return _cache().get(namespace), None
+    except Exception as e:
+        return None, f"[RAG] Retriever indisponible (espace '{namespace}'): {e}"
+
+
+def _retriever(namespace: Optional[str] = None):
+    """Retriever de l'espace (par défaut : celui de la session en cours) ; None s'il est indisponible."""
+    return _load(namespace)[0]
+
 
 def _rag_search_fn(query: str) -> str:
-    if _RETRIEVER is None:
-        return _ERR if '_ERR' in globals() else "Retriever non initialisé."
+    retriever, err = _load()
+    if retriever is None:
+        return err or "Retriever non initialisé."
     try:
-        docs = _RETRIEVER.invoke(query)  # v0.3: retriever.invoke renvoie list[Document]
+        # délai max + disjoncteur (embeddings de la requête : OpenAI par défaut)
+        with span("retriever"):
+            docs = guarded("retriever", retriever.invoke, query, timeout=RETRIEVER_TIMEOUT)  # list[Document]
         if not docs:
             return "Aucun passage pertinent trouvé dans le corpus."
         lines = []
@@ -26,11 +75,13 @@ def _rag_search_fn(query: str) -> str:
             src = meta.get("source") or meta.get("file_path") or meta.get("path") or "source_inconnue"
             lines.append(f"[{i}] {src}\n{d.page_content[:700]}{'...' if len(d.page_content)>700 else ''}")
         return "\n\n".join(lines)
+    except UpstreamError as e:
+        return f"Recherche documentaire momentanément indisponible ({e}). Réessaie plus tard."
     except Exception as e:
         return f"Erreur RAG: {e}"
 
 search_financial_documents = Tool.from_function(
     func=_rag_search_fn,
     name="search_financial_documents",
-    description="Recherche sémantique dans tes PDF/Docs financiers (RAG). Entrée: requête en français."
+    description=describe("search_financial_documents")
 )
@@ -1,24 +1,46 @@
 """
 Outil de Recherche Web (Tavily).
+Le client Tavily et le LLM de résumé sont créés au premier appel, pas à l'import.
 """
 
+import contextvars
+import hashlib
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from urllib.parse import urlsplit
+
 from langchain_core.tools import tool
 from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnableMap
 from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
 
 # Importe le nom du modèle depuis notre configuration centrale
-from app.config import MODEL_NAME, TAVILY_API_KEY
-
-# Importe le client de recherche Tavily (version LangChain)
-from langchain_community.tools.tavily_search import TavilySearchResults
+from app.config import (MODEL_NAME, STALE_TTL, TAVILY_API_KEY, TAVILY_HEDGE_AFTER, TAVILY_TIMEOUT,
+                        WEB_CACHE_MAX, WEB_CACHE_TTL)
+from app.cache import TTLCache, normalize_query
+from app.llm_scheduler import make_chat_model
+from app.resilience import guarded
+from app.tools.registry import describe
+from app.tracing import METRICS, register_cache, span
 
+_INIT_LOCK = threading.Lock()
 
 # --- 1. Définition de l'Outil de Recherche "Brut" ---
-# Cet outil renvoie déjà un STRING formaté.
-raw_tavily_tool = TavilySearchResults(max_results=3, api_key=TAVILY_API_KEY)
+# Cet outil renvoie une liste de {url, content} (ou un message d'erreur en texte).
+raw_tavily_tool = None
+
+
+def _tavily():
+    global raw_tavily_tool
+    if raw_tavily_tool is None:
+        with _INIT_LOCK:
+            if raw_tavily_tool is None:
+                # Importe le client de recherche Tavily (version LangChain)
+                from langchain_community.tools.tavily_search import TavilySearchResults
+                raw_tavily_tool = TavilySearchResults(max_results=3, api_key=TAVILY_API_KEY)
+    return raw_tavily_tool
 
 
 # --- 2. Définition d'un "Summarizer" (Synthétiseur) ---
@@ -32,42 +54,138 @@ _prompt = PromptTemplate.from_template(
     "Résumé concis:"
 )
 
-_llm = ChatOpenAI(model=MODEL_NAME, temperature=TEMP_ANALYSIS)
+# --- 3. La "Chaîne de Montage" du Résumé (LCEL) ---
+# Recherche et résumé sont séparés pour pouvoir mettre en cache les deux résultats.
+summary_chain = None
 
 
+def _summary_chain():
+    global summary_chain
+    if summary_chain is None:
+        with _INIT_LOCK:
+            if summary_chain is None:
+                llm = make_chat_model(model=MODEL_NAME, temperature=TEMP_ANALYSIS)
+                summary_chain = (
+                    _prompt  # 1. Question + résultats bruts dans le "mode d'emploi"
+                    | llm      # 2. Envoie au Cerveau pour résumer
+                    | StrOutputParser() # 3. Ne garde que le texte final
+                )
+    return summary_chain
 
-# --- 3. La "Chaîne de Montage" du Résumé (LCEL) ---
-summarize_chain = (
-    RunnableMap({
-        # 1. Prend la question, l'envoie à Tavily (qui renvoie un string)
-        "context": (lambda x: x["question"]) | raw_tavily_tool,
-        # 2. Passe la question originale
-        "question": (lambda x: x["question"])
-    })
-    | _prompt  # 3. Envoie le tout au "mode d'emploi"
-    | _llm     # 4. Envoie au Cerveau pour résumer
-    | StrOutputParser() # 5. Ne garde que le texte final
-)
+# Cache requête normalisée -> (résultats bruts, résumé), TTL court (les news vieillissent vite).
+# Deux questions identiques posées en même temps ne déclenchent qu'un seul appel Tavily + LLM.
+# Les entrées expirées restent STALE_TTL secondes pour répondre quand Tavily est en panne.
+web_cache = TTLCache(ttl=WEB_CACHE_TTL, max_entries=WEB_CACHE_MAX, name="search_web_tavily", stale_ttl=STALE_TTL)
+register_cache("web", web_cache.stats)
 
-# --- 4. Définition de l'Outil Final (ce que l'Agent verra) ---
-@tool
-def search_web_tavily(query: str) -> str:
+
+MAX_WORKERS = 8          # recherches Tavily lancées en parallèle au maximum
+_SUBQUERY_SEP = re.compile(r"\s*(?:\||\n)\s*")
+
+
+def split_subqueries(question: str) -> List[str]:
+    """'news NVDA | news AMD' -> ['news NVDA', 'news AMD'] (doublons normalisés retirés)."""
+    out, seen = [], set()
+    for q in _SUBQUERY_SEP.split(question or ""):
+        key = normalize_query(q)
+        if key and key not in seen:
+            seen.add(key)
+            out.append(q.strip())
+    return out
+
+
+def _url_key(url: str) -> str:
+    """Forme canonique d'une URL (sans schéma, 'www.', fragment ni '/' final)."""
+    u = urlsplit((url or "").strip())
+    host = u.netloc.lower().removeprefix("www.")
+    return f"{host}{u.path.rstrip('/')}" + (f"?{u.query}" if u.query else "")
+
+
+def _search(query: str) -> List[Dict[str, str]]:
+    # délai max + disjoncteur ; requête doublée si Tavily tarde (recherche idempotente)
+    with span("tavily"):
+        res = guarded("tavily", _tavily().invoke, query, timeout=TAVILY_TIMEOUT,
+                      hedge_after=TAVILY_HEDGE_AFTER or None)
+    if isinstance(res, str):              # Tavily renvoie l'erreur sous forme de texte
+        raise RuntimeError(res)
+    return [r for r in res if isinstance(r, dict)]
+
+
+def fan_out(queries: List[str]) -> List[Dict[str, str]]:
     """
-    [C'EST LE MODE D'EMPLOI POUR L'AGENT]
-    Utilise cet outil EXCLUSIVEMENT pour rechercher des informations
-    en temps réel, des actualités ("news"), ou le cours de l'action ("stock price")
-    sur Internet.
-    
-    Il est parfait pour les questions sur des événements récents,
-    des opinions de marché, ou des informations qui ne peuvent
-    pas se trouver dans les rapports financiers internes.
+    Lance les recherches en parallèle puis fusionne les résultats, dédoublonnés
+    par URL et par empreinte du contenu (même dépêche reprise par plusieurs sites).
+    """
+    if len(queries) == 1:
+        batches = [_search(queries[0])]
+    else:
+        # chaque recherche garde le contexte de la requête (trace en cours)
+        ctxs = [contextvars.copy_context() for _ in queries]
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(queries))) as ex:
+            batches = list(ex.map(lambda c, q: c.run(_search, q), ctxs, queries))
+    merged, urls, digests = [], set(), set()
+    for batch in batches:
+        for r in batch:
+            url, content = r.get("url", ""), r.get("content", "")
+            text = normalize_query(content)
+            # contenu vide : pas d'empreinte (sinon tous les résultats vides se confondraient)
+            digest = hashlib.sha1(text.encode()).hexdigest() if text else None
+            if (url and _url_key(url) in urls) or (digest and digest in digests):
+                continue
+            urls.add(_url_key(url))
+            if digest:
+                digests.add(digest)
+            merged.append({"url": url, "content": content})
+    return merged
+
+
+def _format_context(results: List[Dict[str, str]]) -> str:
+    if not results:
+        return "Aucun résultat."
+    return "\n\n".join(f"[{i}] {r['url']}\n{r['content']}" for i, r in enumerate(results, 1))
+
+
+def _search_and_summarize(queries: List[str]):
+    """Appels amont (recherches en parallèle puis UN résumé) ; renvoie (résultats fusionnés, résumé)."""
+    context = _format_context(fan_out(queries))
+    summary = _summary_chain().invoke({"question": " | ".join(queries), "context": context})
+    return context, summary
+
+
+def search_and_summarize(question: str):
+    """
+    Version en cache de `_search_and_summarize` (avec regroupement des appels simultanés).
+    `question` peut contenir plusieurs sous-requêtes séparées par '|' ou des retours à la ligne.
     """
+    queries = split_subqueries(question) or [question]
+    key = " | ".join(sorted(normalize_query(q) for q in queries))
+    try:
+        return web_cache.get_or_compute(key, lambda: _search_and_summarize(queries))
+    except Exception:
+        # amont en panne (délai, disjoncteur ouvert, erreur) : dernière réponse connue, même périmée
+        stale = web_cache.get_stale(key)
+        if stale is None:
+            raise
+        METRICS.inc("degraded_answers_total", tool="search_web_tavily")
+        context, summary = stale
+        return context, f"[Résultat en cache, recherche web momentanément indisponible] {summary}"
+
+
+def web_cache_stats() -> dict:
+    """Métriques du cache web (hits, misses, coalesced, hit_rate...)."""
+    return web_cache.stats()
+
+# --- 4. Définition de l'Outil Final (ce que l'Agent verra) ---
+# (le "mode d'emploi" lu par l'agent est dans app/tools/registry.py)
+@tool("search_web_tavily", description=describe("search_web_tavily"))
+def search_web_tavily(query: str) -> str:
+    """Recherche web Tavily (sous-requêtes en parallèle) puis résumé, via le cache."""
     print(f"\n--- 🛠️ Outil Web: Appel de search_web_tavily (v2) ---")
     print(f"--- 🛠️ Outil Web: Question reçue: {query} ---")
     
     try:
-        # On appelle notre "chaîne de résumé"
-        answer = summarize_chain.invoke({"question": query})
+        # On appelle notre "chaîne de résumé" (via le cache)
+        _, answer = search_and_summarize(query)
         print(f"--- 🛠️ Outil Web: Résumé généré: {answer} ---")
         return answer
     except Exception as e:
@@ -83,4 +201,7 @@ if __name__ == "__main__":
     test_query_fr = "Pourquoi elon musk est l'homme le plus riche au monde ?"
     results_fr = search_web_tavily.invoke(test_query_fr)
     print("\n--- Sortie Finale (Français) ---")
-    print(results_fr)
\ No newline at end of file
+    print(results_fr)
+    print("\nTest 2 (même question -> servie par le cache):")
+    search_web_tavily.invoke(test_query_fr + " ?")
+    print(f"--- Cache web: {web_cache_stats()} ---")
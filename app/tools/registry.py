@@ -0,0 +1,162 @@
+# app/tools/registry.py
+"""
+Registre paresseux des outils de l'agent.
+
+Chaque outil est déclaré ici par ses métadonnées (nom, description lue par le LLM,
+emplacement "module:attribut"). L'agent construit son prompt à partir de ce registre
+SANS importer les modules d'outils : le module n'est importé qu'au premier appel de
+l'outil, et c'est seulement là que se chargent l'index FAISS, le client Tavily,
+yfinance, pandas, la file SMTP...
+
+Les modules d'outils reprennent leur description d'ici (`describe(nom)`) : une seule
+source de vérité.
+"""
+import importlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from langchain_core.tools import BaseTool
+from pydantic import PrivateAttr
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    name: str
+    target: str            # "paquet.module:attribut" de l'outil réel
+    description: str
+
+
+TOOL_SPECS: List[ToolSpec] = [
+    ToolSpec(
+        "search_financial_documents", "app.tools.rag_finance_docs:search_financial_documents",
+        "Recherche sémantique dans tes PDF/Docs financiers (RAG). Entrée: requête en français."),
+    ToolSpec(
+        "search_web_tavily", "app.tools.recherche_web_tavily:search_web_tavily",
+        "[C'EST LE MODE D'EMPLOI POUR L'AGENT]\n"
+        "Utilise cet outil EXCLUSIVEMENT pour rechercher des informations\n"
+        "en temps réel, des actualités (\"news\"), ou le cours de l'action (\"stock price\")\n"
+        "sur Internet.\n\n"
+        "Il est parfait pour les questions sur des événements récents,\n"
+        "des opinions de marché, ou des informations qui ne peuvent\n"
+        "pas se trouver dans les rapports financiers internes.\n\n"
+        "Question comparative (plusieurs entreprises / aspects) : passe TOUTES\n"
+        "les sous-requêtes en UN SEUL appel, séparées par '|'\n"
+        "(ex: \"résultats NVIDIA T3 | résultats AMD T3\"). Elles sont cherchées\n"
+        "en parallèle et résumées ensemble."),
+    ToolSpec(
+        "stock_data_api", "app.tools.stock_data_api:get_stock_data",
+        "Infos boursières. 'pe <TICKER> [TICKER ...]' ou "
+        "'close <TICKER> [TICKER ...] [period] [interval]'. "
+        "Pour plusieurs tickers, fais UN SEUL appel avec la liste (ex: 'close AAPL,MSFT,NVDA 1mo 1d')."),
+    ToolSpec(
+        "calculatrice_financiere", "app.tools.calculatrice_financiere:calculatrice_financiere",
+        "Calculs financiers. Commandes: 'cagr <v0> <v1> <années>' (alias: 'cag') ; "
+        "'npv <taux> <f0,f1,...>' (alias 'van') ; 'irr <f0,f1,...>' (alias 'tri') ; "
+        "'xirr AAAA-MM-JJ:flux,...' ; 'pmt <taux> <années> <capital>' ; "
+        "'amort <taux> <années> <capital>' ; 'roi <investi> <final> [years=N]'. "
+        "Plusieurs séries de flux en UN appel: séparer par ';'."),
+    ToolSpec(
+        "draft_email", "app.tools.email_tools:draft_email",
+        "Rédige un brouillon d'e-mail FR professionnel. "
+        "Accepte du texte libre ou le format 'to:/subject:/body:'. "
+        "Renvoie le triplet to/subject/body prêt pour l'envoi."),
+    ToolSpec(
+        "send_email_smtp", "app.tools.email_tools:send_email_smtp",
+        "Met un e-mail en file d'envoi SMTP (config .env: SMTP_*), envoyé en arrière-plan. "
+        "Entrée OBLIGATOIRE au format lignes 'to:/subject:/body:'. "
+        "'status <id>' donne l'état d'un envoi (queued/sending/sent/failed)."),
+    ToolSpec(
+        "bulk_email", "app.tools.mail_merge:bulk_email",
+        "Publipostage : même modèle d'e-mail personnalisé pour une liste de destinataires "
+        "(chiffres marché/portefeuille calculés une seule fois). Entrée lignes 'to:/subject:/body:' ; "
+        "to: 'a@x.com=AAPL,MSFT; b@y.com=NVDA:5@400' ou 'file=clients.csv', options period=1mo send=yes. "
+        "Variables: {name} {email} {tickers} {report} {period} {date}. Sans send=yes: aperçu seulement. "
+        "Avec send=yes, les messages partent en file ; 'status 12-40' donne l'avancement."),
+    ToolSpec(
+        "risk_analytics", "app.tools.risk_analytics:risk_analytics",
+        "Analyse de risque sur un ou plusieurs tickers en UN appel: "
+        "'risk <TICKERS> [period] [conf=0.95] [bench=SPY]' (volatilité, max drawdown, bêta, VaR/CVaR) ; "
+        "'mcvar <TICKERS> [period] [weights=..] [paths=100000] [horizon=1] [conf=0.99]' (VaR Monte Carlo)."),
+    ToolSpec(
+        "portfolio_analytics", "app.tools.portfolio_analytics:portfolio_analytics",
+        "Portefeuille (toutes les lignes en UN appel). Positions 'TICKER:qte[@prix_revient]'. "
+        "'pnl <positions> [cash=..]' (valeur, P&L, poids) ; 'cov <TICKERS> [period]' ; "
+        "'rebalance <positions> target=T1:w1,T2:w2 [lot=..] [band=0.01] [turnover=..]' (ordres minimaux) ; "
+        "'optimize <TICKERS> [period] [gamma=3]' (poids moyenne-variance)."),
+    ToolSpec(
+        "options_pricing", "app.tools.options_pricing:options_pricing",
+        "Pricing d'options et Greeks pour une chaîne entière en UN appel. "
+        "'bs|b76|amer <call|put> <S> <K> <T> <r> <sigma> [q=..] [steps=..]' ; "
+        "'iv <call|put> <S> <K> <T> <r> <prix>'. Listes '90,100,110' ou plages '80:120:5' acceptées."),
+    ToolSpec(
+        "bond_analytics", "app.tools.bond_analytics:bond_analytics",
+        "Obligations (coupon/rendement en %, maturité en années, listes et plages acceptées). "
+        "'price <cpn> <mat> <rdt>' (prix, couru, durations, convexité, DV01) ; "
+        "'ytm <cpn> <mat> <prix>' ; 'book file=book.csv' (book entier) ; "
+        "'bootstrap 1:4.1,2:4.3,5:4.6' (courbe zéro)."),
+    ToolSpec(
+        "financial_facts", "app.tools.financial_facts:financial_facts",
+        "Chiffres clés exacts extraits des rapports (CA, segments, BPA, marges...). "
+        "Entrée: 'kpi NVIDIA revenue 2024' | 'series NVIDIA data center' | "
+        "'compare NVIDIA revenue 2023 2024' | 'metrics [NVIDIA]'. "
+        "Si le chiffre est absent, utiliser search_financial_documents."),
+]
+
+SPECS: Dict[str, ToolSpec] = {s.name: s for s in TOOL_SPECS}
+
+
+def describe(name: str) -> str:
+    """Description d'un outil telle que le LLM la voit."""
+    return SPECS[name].description
+
+
+_LOAD_LOCK = threading.Lock()
+
+
+class LazyTool(BaseTool):
+    """Façade d'un outil du registre : importe le module réel au premier appel."""
+
+    spec: ToolSpec
+    _tool: Optional[BaseTool] = PrivateAttr(default=None)
+
+    def __init__(self, spec: ToolSpec, **kwargs):
+        super().__init__(name=spec.name, description=spec.description, spec=spec, **kwargs)
+
+    @property
+    def loaded(self) -> bool:
+        return self._tool is not None
+
+    def load(self) -> BaseTool:
+        if self._tool is None:
+            with _LOAD_LOCK:
+                if self._tool is None:
+                    from app.tracing import METRICS, span
+                    module, attr = self.spec.target.split(":")
+                    t0 = time.perf_counter()
+                    with span("tool_load", tool=self.name):
+                        self._tool = getattr(importlib.import_module(module), attr)
+                    METRICS.observe("tool_load_seconds", time.perf_counter() - t0, tool=self.name)
+        return self._tool
+
+    def _run(self, tool_input: str, run_manager=None) -> str:
+        try:
+            tool = self.load()
+        except Exception as e:
+            return f"Outil {self.name} indisponible: {e}"
+        # run() et non invoke() : invoke() hériterait des callbacks de l'agent (contexte),
+        # et chaque appel serait tracé / diffusé deux fois (façade + outil réel).
+        return tool.run(tool_input)
+
+
+def get_tools(names: Optional[List[str]] = None) -> List[LazyTool]:
+    """Outils paresseux, dans l'ordre du registre (ou de `names`)."""
+    specs = TOOL_SPECS if names is None else [SPECS[n] for n in names]
+    return [LazyTool(s) for s in specs]
+
+
+def loaded_tools() -> List[str]:
+    """Noms des outils dont le module est déjà importé (toutes instances confondues)."""
+    import sys
+    return [s.name for s in TOOL_SPECS if s.target.split(":")[0] in sys.modules]
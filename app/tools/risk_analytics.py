@@ -0,0 +1,225 @@
+# app/tools/risk_analytics.py
+"""
+Analyse de risque multi-tickers (NumPy/pandas vectorisés sur la matrice des prix).
+Commandes:
+  - risk <TICKER> [TICKER ...] [period] [conf=0.95] [bench=SPY] [window=21]
+        -> volatilité annualisée, volatilité glissante, max drawdown, bêta,
+           VaR/CVaR 1 jour historiques et paramétriques (en % de perte)
+  - mcvar <TICKER> [TICKER ...] [period] [weights=0.5,0.5] [paths=100000]
+          [horizon=1] [conf=0.99] [method=normal|boot] [budget=2]
+        -> VaR/CVaR Monte Carlo du portefeuille (budget de temps en secondes)
+Exemples:
+  risk AAPL MSFT NVDA 1y
+  risk AAPL 2y conf=0.99 bench=QQQ
+  mcvar AAPL MSFT 1y weights=0.6,0.4 paths=200000 horizon=10
+Les prix viennent du store local (app/price_store.py).
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from langchain.tools import Tool
+
+from app.price_store import get_price_store
+from app.quant import norm_pdf, norm_ppf
+from app.tools.registry import describe
+from app.tools.stock_data_api import _format_table, _sanitize_cmd, _split_tickers
+
+TRADING_DAYS = 252
+MC_CHUNK = 25_000  # nombre de trajectoires simulées par bloc
+
+# ---------- Calculs (vectorisés, colonnes = tickers) ----------
+def log_returns(prices: pd.DataFrame) -> pd.DataFrame:
+    """Rendements logarithmiques journaliers."""
+    return np.log(prices).diff().iloc[1:]
+
+def annual_vol(rets: pd.DataFrame) -> pd.Series:
+    return rets.std(ddof=1) * np.sqrt(TRADING_DAYS)
+
+def rolling_vol(rets: pd.DataFrame, window: int = 21) -> pd.DataFrame:
+    return rets.rolling(window).std(ddof=1) * np.sqrt(TRADING_DAYS)
+
+def max_drawdown(prices: pd.DataFrame) -> pd.Series:
+    """Plus forte baisse depuis un plus haut (valeur négative)."""
+    p = prices.to_numpy(dtype=float)
+    peak = np.fmax.accumulate(p, axis=0)
+    dd = np.nanmin(p / peak - 1.0, axis=0)
+    return pd.Series(dd, index=prices.columns)
+
+def beta(rets: pd.DataFrame, bench: pd.Series) -> pd.Series:
+    """Bêta de chaque colonne contre `bench` (dates communes)."""
+    aligned = rets.join(bench.rename("__bench__"), how="inner").dropna()
+    b = aligned.pop("__bench__").to_numpy()
+    x = aligned.to_numpy()
+    b_c = b - b.mean()
+    cov = (x - x.mean(axis=0)).T @ b_c / (len(b) - 1)
+    return pd.Series(cov / b_c.var(ddof=1), index=aligned.columns)
+
+def historical_var_cvar(rets: pd.DataFrame, conf: float = 0.95) -> Tuple[pd.Series, pd.Series]:
+    """VaR/CVaR historiques 1 jour, exprimées en pertes positives (rendements simples)."""
+    losses = -np.expm1(rets.to_numpy(dtype=float))
+    var = np.nanquantile(losses, conf, axis=0)
+    tail = np.where(losses >= var, losses, np.nan)
+    cvar = np.nanmean(tail, axis=0)
+    return pd.Series(var, index=rets.columns), pd.Series(cvar, index=rets.columns)
+
+def parametric_var_cvar(rets: pd.DataFrame, conf: float = 0.95) -> Tuple[pd.Series, pd.Series]:
+    """VaR/CVaR gaussiennes 1 jour (pertes positives)."""
+    mu, sd = rets.mean(), rets.std(ddof=1)
+    z = float(norm_ppf(conf))
+    var = -(mu - z * sd)
+    cvar = -(mu - sd * float(norm_pdf(z)) / (1.0 - conf))
+    return var, cvar
+
+def monte_carlo_var(rets: pd.DataFrame, weights: np.ndarray, paths: int = 100_000,
+                    horizon: int = 1, conf: float = 0.99, method: str = "normal",
+                    budget: float = 2.0, seed: Optional[int] = None) -> Dict[str, float]:
+    """
+    VaR/CVaR Monte Carlo d'un portefeuille sur `horizon` jours.
+    - normal : rendements multivariés gaussiens (Cholesky de la covariance)
+    - boot   : bootstrap des jours historiques (préserve les queues et corrélations)
+    Simule par blocs de MC_CHUNK trajectoires et s'arrête au budget de temps.
+    """
+    rng = np.random.default_rng(seed)
+    x = rets.to_numpy(dtype=float)
+    mu = x.mean(axis=0)
+    chol = np.linalg.cholesky(np.cov(x, rowvar=False).reshape(len(mu), len(mu)) + 1e-12 * np.eye(len(mu)))
+    t0 = time.perf_counter()
+    results: List[np.ndarray] = []
+    done = 0
+    while done < paths:
+        n = min(MC_CHUNK, paths - done)
+        if method == "boot":
+            idx = rng.integers(0, len(x), size=(n, horizon))
+            scen = x[idx].sum(axis=1)                            # (n, actifs)
+        else:
+            z = rng.standard_normal((n, len(mu)))
+            scen = horizon * mu + np.sqrt(horizon) * z @ chol.T
+        results.append(-(np.expm1(scen) @ weights))            # pertes du portefeuille
+        done += n
+        if time.perf_counter() - t0 > budget:
+            break
+    losses = np.concatenate(results)
+    var = float(np.quantile(losses, conf))
+    cvar = float(losses[losses >= var].mean())
+    return {"var": var, "cvar": cvar, "paths": float(done), "seconds": time.perf_counter() - t0}
+
+# ---------- Parsing ----------
+def _parse_opts(parts: List[str]) -> Tuple[List[str], Dict[str, str]]:
+    """Sépare les arguments positionnels des options 'cle=valeur'."""
+    pos, opts = [], {}
+    for p in parts:
+        if "=" in p:
+            k, v = p.split("=", 1)
+            opts[k.lower()] = v
+        else:
+            pos.append(p)
+    return pos, opts
+
+def _prices(tickers: List[str], period: str) -> pd.DataFrame:
+    prices = get_price_store().close_matrix(tickers, period, "1d")
+    return prices.dropna(how="all").ffill().dropna()
+
+def _pct(x: float) -> str:
+    return "n/d" if x is None or not np.isfinite(x) else f"{x:.2%}"
+
+# ---------- Commandes ----------
+def _cmd_risk(args: List[str]) -> str:
+    pos, opts = _parse_opts(args)
+    tickers, rest = _split_tickers(pos)
+    if not tickers:
+        return "Usage: risk <TICKER> [TICKER ...] [period] [conf=0.95] [bench=SPY] [window=21]"
+    period = rest[0] if rest else "1y"
+    conf = float(opts.get("conf", 0.95))
+    window = int(opts.get("window", 21))
+    bench_t = opts.get("bench", "SPY").upper()
+
+    prices = _prices(tickers + ([bench_t] if bench_t not in tickers else []), period)
+    missing = [t for t in tickers if t not in prices.columns]
+    tickers = [t for t in tickers if t in prices.columns]
+    if len(prices) < 3 or not tickers:
+        return f"Pas assez de données pour {', '.join(tickers + missing)} (period={period})."
+
+    rets = log_returns(prices)
+    r = rets[tickers]
+    vol = annual_vol(r)
+    rvol = rolling_vol(r, window).iloc[-1]
+    mdd = max_drawdown(prices[tickers])
+    betas = beta(r, rets[bench_t]) if bench_t in rets.columns else pd.Series(np.nan, index=tickers)
+    hv, hcv = historical_var_cvar(r, conf)
+    pv, pcv = parametric_var_cvar(r, conf)
+
+    header = ("Ticker", "Vol.an", f"Vol{window}j", "MaxDD", f"Bêta/{bench_t}",
+              "VaRh", "CVaRh", "VaRp", "CVaRp")
+    rows = [
+        (t, _pct(vol[t]), _pct(rvol[t]), _pct(mdd[t]), f"{betas.get(t, np.nan):.2f}",
+         _pct(hv[t]), _pct(hcv[t]), _pct(pv[t]), _pct(pcv[t]))
+        for t in tickers
+    ]
+    lines = [f"Risque ({period}, {len(r)} jours, conf={conf:g}, VaR 1 jour)", _format_table(header, rows)]
+    if missing:
+        lines.append(f"Sans données: {', '.join(missing)}")
+    return "\n".join(lines)
+
+def _cmd_mcvar(args: List[str]) -> str:
+    pos, opts = _parse_opts(args)
+    tickers, rest = _split_tickers(pos)
+    if not tickers:
+        return ("Usage: mcvar <TICKER> [TICKER ...] [period] [weights=w1,w2,...] "
+                "[paths=100000] [horizon=1] [conf=0.99] [method=normal|boot] [budget=2]")
+    period = rest[0] if rest else "1y"
+    method = opts.get("method", "normal").lower()
+    if method not in ("normal", "boot"):
+        return "method doit valoir 'normal' ou 'boot'."
+
+    if "weights" in opts:
+        w = np.array([float(x) for x in opts["weights"].split(",") if x], dtype=float)
+        if len(w) != len(tickers):
+            return f"weights: {len(w)} poids pour {len(tickers)} tickers."
+    else:
+        w = np.full(len(tickers), 1.0 / len(tickers))
+    w = w / w.sum()
+
+    prices = _prices(tickers, period)
+    if len(prices) < 3 or any(t not in prices.columns for t in tickers):
+        return f"Pas assez de données pour {', '.join(tickers)} (period={period})."
+
+    res = monte_carlo_var(
+        log_returns(prices[tickers]), w,
+        paths=int(float(opts.get("paths", 100_000))),
+        horizon=int(opts.get("horizon", 1)),
+        conf=float(opts.get("conf", 0.99)),
+        method=method,
+        budget=float(opts.get("budget", 2.0)),
+    )
+    alloc = ", ".join(f"{t} {wi:.0%}" for t, wi in zip(tickers, w))
+    return (f"VaR Monte Carlo ({method}, {int(res['paths'])} trajectoires en {res['seconds']:.2f}s)\n"
+            f"Portefeuille: {alloc}\n"
+            f"Horizon {opts.get('horizon', 1)} j, conf={float(opts.get('conf', 0.99)):g}: "
+            f"VaR = {_pct(res['var'])}, CVaR = {_pct(res['cvar'])}")
+
+def _risk_fn(query: str) -> str:
+    q = _sanitize_cmd(query)
+    parts = q.replace(", ", " ").split()
+    if not parts:
+        return "Commande vide. Ex: 'risk AAPL MSFT 1y' ou 'mcvar AAPL MSFT 1y paths=100000'"
+    cmd = parts[0].lower()
+    # les tickers peuvent être séparés par des virgules (hors options cle=v1,v2)
+    args = [a for p in parts[1:] for a in ([p] if "=" in p else p.split(",")) if a]
+    try:
+        if cmd == "risk":
+            return _cmd_risk(args)
+        if cmd == "mcvar":
+            return _cmd_mcvar(args)
+    except ValueError as e:
+        return f"Paramètres invalides: {e}"
+    except Exception as e:
+        return f"Erreur analyse de risque: {e}"
+    return f"Commande inconnue: '{cmd}'. Commandes valides: 'risk', 'mcvar'."
+
+risk_analytics = Tool.from_function(
+    func=_risk_fn,
+    name="risk_analytics",
+    description=describe("risk_analytics")
+)
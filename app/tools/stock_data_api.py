@@ -2,29 +2,77 @@
 """
 Données boursières via yfinance.
 Commandes:
-  - pe <TICKER>              -> renvoie le P/E (TTM si dispo)
-  - close <TICKER> [period] [interval] -> dernier cours de clôture
+  - pe <TICKER> [TICKER ...]                  -> renvoie le P/E (TTM si dispo)
+  - close <TICKER> [TICKER ...] [period] [interval] -> dernier cours de clôture
+Les tickers peuvent être séparés par des espaces ou des virgules : une liste
+de tickers est traitée en UN SEUL appel d'outil (téléchargement groupé pour
+'close', pool de threads borné pour 'pe').
+Les cours passent par le store local (app/price_store.py) : un historique
+déjà téléchargé n'est jamais redemandé au réseau.
 Exemples:
   pe AAPL
+  pe AAPL MSFT
   close AAPL 1mo 1d
+  close AAPL,MSFT,NVDA 1mo 1d
 """
 import re
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 import yfinance as yf
 from langchain.tools import Tool
 
+from app.cache import TTLCache
+from app.config import STALE_TTL, YFINANCE_HEDGE_AFTER, YFINANCE_TIMEOUT
+from app.price_store import get_price_store
+from app.resilience import UpstreamError, guarded
+from app.tools.registry import describe
+from app.tracing import METRICS
+
+# Nombre max de requêtes yfinance simultanées pour les appels par ticker (P/E)
+MAX_WORKERS = 8
+
+_PERIOD_RE = re.compile(r"^(\d+(d|wk|mo|y)|ytd|max)$", re.IGNORECASE)
+_INTERVAL_RE = re.compile(r"^\d+(m|h|d|wk|mo)$", re.IGNORECASE)
+
 def _sanitize_cmd(s: str) -> str:
     s = re.sub(r'[\"\'“”’]', "", s)     # enlève guillemets
     s = re.sub(r"\s+", " ", s).strip()  # espaces multiples
     return s.rstrip(".:;")              # ponctuation finale
 
+def _split_tickers(args: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Sépare les tickers (en tête) des options positionnelles (period, interval).
+    Les tickers s'arrêtent au premier argument qui ressemble à une période.
+    Doublons supprimés, ordre conservé.
+    """
+    tickers: List[str] = []
+    i = 0
+    while i < len(args) and not _PERIOD_RE.match(args[i]):
+        t = args[i].upper()
+        if t not in tickers:
+            tickers.append(t)
+        i += 1
+    return tickers, args[i:]
+
+# Dernier P/E connu par ticker : resservi (même périmé) si yfinance est en panne.
+_PE_CACHE = TTLCache(ttl=3600, max_entries=2048, name="pe", stale_ttl=STALE_TTL)
+
+
 def _safe_pe(ticker: str) -> Optional[float]:
     try:
         tk = yf.Ticker(ticker)
-        # Essai 1: info (traillingPE)
-        info = tk.info or {}
+        # Essai 1: info (traillingPE), sous délai max + disjoncteur "yfinance"
+        try:
+            info = guarded("yfinance", lambda: tk.info, timeout=YFINANCE_TIMEOUT,
+                           hedge_after=YFINANCE_HEDGE_AFTER or None) or {}
+        except UpstreamError:
+            stale = _PE_CACHE.get_stale(ticker)
+            if stale is not None:
+                METRICS.inc("degraded_answers_total", tool="stock_data_api")
+            return stale
         pe = info.get("trailingPE", None)
         if pe is not None:
+            _PE_CACHE.set(ticker, float(pe))
             return float(pe)
         # Essai 2: fundamentals TTM (si dispo dans certaines versions)
         try:
@@ -36,29 +84,62 @@ def _safe_pe(ticker: str) -> Optional[float]:
     except Exception:
         return None
 
+def _format_table(header: Tuple[str, ...], rows: List[Tuple[str, ...]]) -> str:
+    """Petit tableau texte aligné (compact pour l'Observation de l'agent)."""
+    widths = [max(len(str(c)) for c in col) for col in zip(header, *rows)]
+    fmt = lambda r: "  ".join(f"{str(c):<{w}}" for c, w in zip(r, widths)).rstrip()
+    return "\n".join([fmt(header)] + [fmt(r) for r in rows])
+
 def _cmd_pe(parts):
-    if len(parts) < 2:
-        return "Usage: pe <TICKER> (ex: pe AAPL)"
-    ticker = parts[1].upper()
-    pe = _safe_pe(ticker)
-    if pe is None:
-        return f"P/E indisponible pour {ticker}."
-    return f"P/E (TTM) {ticker} ≈ {pe:.2f}"
+    tickers, _ = _split_tickers(parts[1:])
+    if not tickers:
+        return "Usage: pe <TICKER> [TICKER ...] (ex: pe AAPL MSFT)"
+    if len(tickers) == 1:
+        ticker = tickers[0]
+        pe = _safe_pe(ticker)
+        if pe is None:
+            return f"P/E indisponible pour {ticker}."
+        return f"P/E (TTM) {ticker} ≈ {pe:.2f}"
+
+    # Plusieurs tickers: yfinance n'a pas d'API groupée pour .info -> pool borné
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(tickers))) as pool:
+        pes = list(pool.map(_safe_pe, tickers))
+    rows = [(t, f"{pe:.2f}" if pe is not None else "n/d") for t, pe in zip(tickers, pes)]
+    return "P/E (TTM)\n" + _format_table(("Ticker", "P/E"), rows)
 
 def _cmd_close(parts):
-    if len(parts) < 2:
-        return "Usage: close <TICKER> [period] [interval] (ex: close AAPL 1mo 1d)"
-    ticker = parts[1].upper()
-    period = parts[2] if len(parts) >= 3 else "1mo"
-    interval = parts[3] if len(parts) >= 4 else "1d"
+    tickers, rest = _split_tickers(parts[1:])
+    if not tickers:
+        return "Usage: close <TICKER> [TICKER ...] [period] [interval] (ex: close AAPL,MSFT 1mo 1d)"
+    period = rest[0] if len(rest) >= 1 else "1mo"
+    interval = rest[1] if len(rest) >= 2 else "1d"
+    if not _INTERVAL_RE.match(interval):
+        return f"Intervalle invalide: '{interval}' (ex: 1d, 1wk, 1h)."
+    label = ", ".join(tickers)
+    note = ""
     try:
-        hist = yf.download(ticker, period=period, interval=interval, progress=False, auto_adjust=True, threads=False)
-        if hist is None or hist.empty:
-            return f"Aucune donnée pour {ticker} (period={period}, interval={interval})."
-        last_close = float(hist["Close"].dropna().iloc[-1])
-        return f"Close {ticker} ({period}/{interval}) = {last_close:.2f}"
+        # Store local : seule la fin manquante des séries est téléchargée (un appel groupé)
+        bars = get_price_store().get_many(tickers, period, interval)
+    except UpstreamError as e:
+        # yfinance lent ou en panne : derniers cours déjà stockés, signalés comme tels
+        bars = get_price_store().get_many(tickers, period, interval, refresh=False)
+        if not any(len(b) for b in bars.values()):
+            return f"Erreur récupération cours pour {label}: {e}"
+        METRICS.inc("degraded_answers_total", tool="stock_data_api")
+        note = "[Cours stockés, yfinance momentanément indisponible] "
     except Exception as e:
-        return f"Erreur récupération cours pour {ticker}: {e}"
+        return f"Erreur récupération cours pour {label}: {e}"
+
+    last = {t: float(b.close[-1]) if len(b) else None for t, b in bars.items()}
+    if all(v is None for v in last.values()):
+        return f"Aucune donnée pour {label} (period={period}, interval={interval})."
+
+    if len(tickers) == 1:
+        t = tickers[0]
+        return f"{note}Close {t} ({period}/{interval}) = {last[t]:.2f}"
+
+    rows = [(t, f"{v:.2f}" if v is not None else "n/d") for t, v in last.items()]
+    return f"{note}Close ({period}/{interval})\n" + _format_table(("Ticker", "Close"), rows)
 
 def _stock_api_fn(query: str) -> str:
     q = _sanitize_cmd(query)
@@ -75,5 +156,5 @@ def _stock_api_fn(query: str) -> str:
 get_stock_data = Tool.from_function(
     func=_stock_api_fn,
     name="stock_data_api",
-    description="Infos boursières. 'pe <TICKER>' ou 'close <TICKER> [period] [interval]'."
+    description=describe("stock_data_api")
 )
@@ -0,0 +1,355 @@
+# app/tracing.py
+"""
+Traces par requête et métriques "chemin chaud" (routeur, agent, outils, LLM, yfinance, Tavily).
+
+- `trace(name, **attrs)` ouvre la trace d'une requête utilisateur (contextvar) ;
+  `span(name, **attrs)` mesure une étape à l'intérieur. Coût de l'ordre de la
+  microseconde (perf_counter + un verrou) : on peut laisser l'instrumentation en production.
+- `TracingCallback` (callback LangChain) ajoute un span par appel LLM (tokens)
+  et par appel d'outil (latence, erreurs).
+- `METRICS` : compteurs et histogrammes agrégés (latence par étape / outil, erreurs,
+  tokens), plus des jauges lues à la demande (taux de hit des caches).
+- Exportateurs (TRACING_EXPORTER) : 'json' (une ligne JSON par trace, TRACE_LOG ou
+  stderr), 'prometheus' (endpoint texte local /metrics sur METRICS_PORT), 'none'.
+  Un seul processus peut ouvrir METRICS_PORT : les suivants continuent sans endpoint
+  (avertissement sur stderr). Pour un serveur multi-processus (uvicorn --workers N),
+  scraper la route /metrics de chaque worker (app/server.py) plutôt que ce port.
+"""
+import bisect
+import contextvars
+import json
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.config import METRICS_PORT, TRACE_LOG, TRACING_EXPORTER
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+# ---------- Métriques ----------
+class _Histogram:
+    __slots__ = ("counts", "sum", "n")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.n = 0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, v)] += 1
+        self.sum += v
+        self.n += 1
+
+    def quantile(self, q: float) -> float:
+        """Approximation par la borne haute du bucket (suffisant pour repérer un p99 qui dérive)."""
+        if not self.n:
+            return 0.0
+        rank, acc = q * self.n, 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else float("inf")
+        return float("inf")
+
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """Registre thread-safe : compteurs, histogrammes de latence, jauges calculées à la lecture."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], _Histogram] = {}
+        self.gauges: Dict[str, Callable[[], Dict[Labels, float]]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = _Histogram()
+            h.observe(value)
+
+    def register_gauge(self, name: str, fn: Callable[[], Dict[Labels, float]]) -> None:
+        self.gauges[name] = fn
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {
+                "counters": {_fmt_key(k): v for k, v in self.counters.items()},
+                "latency": {_fmt_key(k): {"count": h.n, "avg": h.sum / h.n if h.n else 0.0,
+                                          "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99)}
+                            for k, h in self.histograms.items()},
+            }
+        out["gauges"] = {_fmt_key((name, labels)): v for name, fn in self.gauges.items()
+                         for labels, v in _safe(fn).items()}
+        return out
+
+    def prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for (name, labels), v in sorted(self.counters.items()):
+                lines.append(f"{name}{_prom_labels(labels)} {v:g}")
+            for (name, labels), h in sorted(self.histograms.items()):
+                acc = 0
+                for bound, c in zip(LATENCY_BUCKETS + (float("inf"),), h.counts):
+                    acc += c
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{name}_bucket{_prom_labels(labels + (('le', le),))} {acc}")
+                lines.append(f"{name}_sum{_prom_labels(labels)} {h.sum:.6f}")
+                lines.append(f"{name}_count{_prom_labels(labels)} {h.n}")
+        for name, fn in self.gauges.items():
+            for labels, v in _safe(fn).items():
+                lines.append(f"{name}{_prom_labels(labels)} {v:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _safe(fn) -> Dict[Labels, float]:
+    try:
+        return fn()
+    except Exception:
+        return {}
+
+
+def _fmt_key(key) -> str:
+    name, labels = key
+    return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+
+def _prom_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels) + "}"
+
+
+METRICS = Metrics()
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, Any]]) -> None:
+    """Expose le taux de hit d'un cache (objet avec stats() façon app.cache.TTLCache)."""
+    METRICS.register_gauge(
+        f"cache_hit_rate_{name}", lambda: {(): float(stats().get("hit_rate", 0.0))})
+
+
+# ---------- Traces ----------
+class Trace:
+    __slots__ = ("trace_id", "name", "attrs", "start", "spans", "_lock")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self, duration: float) -> Dict[str, Any]:
+        return {"trace_id": self.trace_id, "name": self.name, "duration_s": round(duration, 6),
+                "attrs": self.attrs, "spans": self.spans}
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def _record(t: Optional[Trace], name: str, t0: float, dur: float, attrs: Dict[str, Any], error: Optional[str]) -> None:
+    kind = name.split(":", 1)[0]
+    METRICS.observe("stage_latency_seconds", dur, stage=kind)
+    if error:
+        METRICS.inc("stage_errors_total", stage=kind)
+    if t is not None:
+        t.add({"name": name, "offset_s": round(t0 - t.start, 6), "duration_s": round(dur, 6),
+               **attrs, **({"error": error} if error else {})})
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Mesure une étape ; le dict `attrs` reste modifiable dans le bloc (ex: nombre de lignes)."""
+    t = _current.get()
+    t0 = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        _record(t, name, t0, time.perf_counter() - t0, attrs, type(e).__name__)
+        raise
+    _record(t, name, t0, time.perf_counter() - t0, attrs, None)
+
+
+@contextmanager
+def trace(name: str, **attrs):
+    """Trace d'une requête : les spans ouverts dans ce contexte y sont rattachés, puis exportés."""
+    t = Trace(name, attrs)
+    token = _current.set(t)
+    error = None
+    try:
+        yield t
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        dur = time.perf_counter() - t.start
+        METRICS.observe("request_latency_seconds", dur, request=name)
+        METRICS.inc("requests_total", request=name, status="error" if error else "ok")
+        if error:
+            t.attrs["error"] = error
+        export(t.to_dict(dur))
+
+
+# ---------- Callback LangChain (LLM + outils) ----------
+class TracingCallback(BaseCallbackHandler):
+    """Un span par appel LLM (tokens) et par appel d'outil (latence, erreurs)."""
+
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[Any, Tuple[str, float, Dict[str, Any], Optional[Trace]]] = {}
+        self._lock = threading.Lock()
+
+    def _open(self, run_id, name: str, attrs: Dict[str, Any]) -> None:
+        with self._lock:
+            self._runs[run_id] = (name, time.perf_counter(), attrs, _current.get())
+
+    def _close(self, run_id, error: Optional[str] = None, **extra) -> Optional[Tuple[str, float, Dict[str, Any]]]:
+        with self._lock:
+            item = self._runs.pop(run_id, None)
+        if item is None:
+            return None
+        name, t0, attrs, t = item
+        attrs.update(extra)
+        _record(t, name, t0, time.perf_counter() - t0, attrs, error)
+        return name, t0, attrs
+
+    @staticmethod
+    def _model(kwargs) -> str:
+        params = kwargs.get("invocation_params") or {}
+        return params.get("model_name") or params.get("model") or "llm"
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._open(run_id, "llm", {"model": self._model(kwargs)})
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._open(run_id, "llm", {"model": self._model(kwargs)})
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        closed = self._close(run_id, prompt_tokens=usage.get("prompt_tokens", 0),
+                             completion_tokens=usage.get("completion_tokens", 0))
+        if closed:
+            model = closed[2].get("model", "llm")
+            METRICS.inc("llm_calls_total", model=model)
+            METRICS.inc("llm_tokens_total", usage.get("prompt_tokens", 0), model=model, kind="prompt")
+            METRICS.inc("llm_tokens_total", usage.get("completion_tokens", 0), model=model, kind="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._close(run_id, type(error).__name__)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._open(run_id, f"tool:{(serialized or {}).get('name', 'tool')}", {})
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        closed = self._close(run_id)
+        if closed:
+            tool = closed[0].split(":", 1)[1]
+            METRICS.inc("tool_calls_total", tool=tool)
+            METRICS.observe("tool_latency_seconds", time.perf_counter() - closed[1], tool=tool)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        closed = self._close(run_id, type(error).__name__)
+        if closed:
+            METRICS.inc("tool_errors_total", tool=closed[0].split(":", 1)[1])
+
+
+# ---------- Exportateurs ----------
+class JsonLogExporter:
+    """Une ligne JSON par trace terminée (fichier en ajout ou stderr)."""
+
+    def __init__(self, path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._out = open(path, "a", encoding="utf-8") if path else sys.stderr
+
+    def __call__(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._out.write(line + "\n")
+            self._out.flush()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = METRICS.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):   # pas de log par requête de scraping
+        pass
+
+
+def serve_metrics(port: int = METRICS_PORT) -> ThreadingHTTPServer:
+    """Endpoint Prometheus local (http://127.0.0.1:<port>/metrics) dans un thread démon."""
+    srv = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+    threading.Thread(target=srv.serve_forever, name="metrics-http", daemon=True).start()
+    return srv
+
+
+_exporters: List[Callable[[Dict[str, Any]], None]] = []
+_setup_lock = threading.Lock()
+_configured = False
+
+
+def add_exporter(fn: Callable[[Dict[str, Any]], None]) -> None:
+    _exporters.append(fn)
+
+
+def export(record: Dict[str, Any]) -> None:
+    for fn in _exporters:
+        try:
+            fn(record)
+        except Exception:
+            pass            # un exportateur en panne ne doit jamais casser une requête
+
+
+def setup_tracing(exporter: str = TRACING_EXPORTER) -> None:
+    """Installe l'exportateur configuré (une seule fois par processus)."""
+    global _configured
+    with _setup_lock:
+        if _configured:
+            return
+        if exporter == "json":
+            add_exporter(JsonLogExporter(TRACE_LOG or None))
+        elif exporter == "prometheus":
+            try:
+                serve_metrics(METRICS_PORT)
+            except OSError as e:        # port déjà pris (autre worker du même serveur...)
+                print(f"[tracing] endpoint /metrics non ouvert sur le port {METRICS_PORT} ({e}) ;"
+                      " métriques disponibles via la route /metrics du serveur", file=sys.stderr)
+                return                  # pas d'endpoint ; nouvel essai au prochain appel
+        _configured = True
@@ -41,7 +41,9 @@ with st.sidebar:
     st.subheader("Forçage d'outil (optionnel)")
     force_tool = st.selectbox(
         "Choisir un outil à forcer :",
-        options=["", "search_financial_documents", "search_web_tavily", "stock_data_api", "calculatrice_financiere"],
+        options=["", "search_financial_documents", "search_web_tavily", "stock_data_api", "calculatrice_financiere",
+                 "risk_analytics", "portfolio_analytics",
+                 "options_pricing", "bond_analytics", "financial_facts"],
         index=0
     )
     st.caption("Laisse vide pour laisser le routeur décider.")
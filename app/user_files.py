@@ -0,0 +1,30 @@
+# app/user_files.py
+"""
+Fichiers lus par les outils (`file=chaine.csv`, `file=book.csv`, `file=clients.csv`...).
+
+Le nom vient du texte produit par le LLM : il est résolu sous USER_FILES_DIR, et tout
+ce qui en sort (chemin absolu, '..', lien symbolique) est refusé, de même que les URL
+(pandas les téléchargerait : requêtes vers le réseau interne).
+"""
+import os
+import re
+
+from app.config import USER_FILES_DIR
+
+_SCHEME = re.compile(r"^[A-Za-z][A-Za-z0-9+.-]*:")     # http:, file:, s3:, C:...
+
+
+def resolve_user_file(name: str) -> str:
+    """Chemin réel de `name` sous USER_FILES_DIR ; ValueError s'il en sort, est une URL ou n'existe pas."""
+    name = (name or "").strip().strip("'\"")
+    if not name:
+        raise ValueError("nom de fichier vide")
+    if _SCHEME.match(name):
+        raise ValueError(f"URL refusée: {name} (fichier attendu dans {USER_FILES_DIR}/)")
+    root = os.path.realpath(USER_FILES_DIR)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"fichier hors de {USER_FILES_DIR}/ refusé: {name}")
+    if not os.path.isfile(path):
+        raise ValueError(f"fichier introuvable dans {USER_FILES_DIR}/: {name}")
+    return path
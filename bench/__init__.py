@@ -0,0 +1 @@
+"""Banc de mesure hors ligne (stand-ins record/replay, voir bench/run.py)."""
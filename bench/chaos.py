@@ -0,0 +1,328 @@
+# bench/chaos.py
+"""
+Tests de chaos de la couche de résilience (app/resilience.py), hors ligne.
+
+Des serveurs bouchons LOCAUX (HTTP et SMTP, sur 127.0.0.1) simulent des amonts
+lents, bloqués, en erreur ou intermittents ; les vrais chemins de code des outils
+(cache web, store de cours, pool SMTP) sont branchés dessus :
+
+  deadline      amont bloqué            -> l'appelant est libéré à l'échéance
+  breaker       amont en erreur         -> disjoncteur ouvert, échec immédiat sans appel,
+                                           appel d'essai puis refermeture après guérison
+  hedging       10 % de réponses lentes -> p99 borné par la requête doublée
+  web_stale     Tavily bloqué           -> résumé périmé servi depuis le cache, sous délai
+  close_stale   yfinance bloqué         -> derniers cours stockés servis, sous délai
+  smtp          serveur SMTP muet       -> délai socket, puis disjoncteur (report sans tentative)
+  bulkhead      un amont bloqué         -> ses appels sont refusés une fois sa cloison pleine,
+                                           un autre amont répond toujours
+
+    python -m bench.chaos
+    python -m bench.chaos --json chaos.json
+
+Code de sortie 1 si un scénario échoue (utilisable en CI).
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+os.environ.setdefault("TRACING_EXPORTER", "none")
+
+from app import resilience                                    # noqa: E402
+from app.resilience import BulkheadFull, CircuitOpen, DeadlineExceeded, guarded  # noqa: E402
+
+
+# ---------- Bouchons locaux ----------
+class HttpStub:
+    """Serveur HTTP local : mode 'ok' | 'hang' | 'error' | 'flaky' (une réponse lente sur 10)."""
+
+    def __init__(self, fast: float = 0.02, slow: float = 1.0):
+        self.mode = "ok"
+        self.fast, self.slow = fast, slow
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    mode, n = stub.mode, stub.requests
+                if mode == "hang":
+                    time.sleep(30)
+                elif mode == "error":
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                time.sleep(stub.slow if mode == "flaky" and n % 10 == 0 else stub.fast)
+                body = json.dumps({"path": self.path, "ok": True}).encode()
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.end_headers()
+                    self.wfile.write(body)
+                except OSError:
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def get(self, path: str = "/") -> Dict[str, Any]:
+        with urllib.request.urlopen(self.url + path, timeout=60) as r:
+            return json.loads(r.read())
+
+    def close(self) -> None:
+        self.server.shutdown()
+
+
+class MuteSmtpStub:
+    """Accepte les connexions TCP mais n'envoie jamais la bannière SMTP (serveur figé)."""
+
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(64)
+        self.port = self.sock.getsockname()[1]
+        self.accepted = 0
+        self._conns: List[socket.socket] = []
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.accepted += 1
+            self._conns.append(conn)
+
+    def close(self) -> None:
+        self.sock.close()
+        for c in self._conns:
+            c.close()
+
+
+def _fresh_breaker(name: str, failures: int = 3, reset_after: float = 0.5):
+    b = resilience.breaker(name)
+    b.failures, b.reset_after = failures, reset_after
+    b.reset()
+    return b
+
+
+# ---------- Scénarios ----------
+def scenario_deadline(stub: HttpStub) -> Dict[str, Any]:
+    _fresh_breaker("chaos_deadline", failures=100)
+    stub.mode = "hang"
+    t0 = time.perf_counter()
+    try:
+        guarded("chaos_deadline", stub.get, "/hang", timeout=0.3)
+        raised = False
+    except DeadlineExceeded:
+        raised = True
+    elapsed = time.perf_counter() - t0
+    return {"ok": raised and elapsed < 0.45, "elapsed_s": round(elapsed, 3)}
+
+
+def scenario_breaker(stub: HttpStub) -> Dict[str, Any]:
+    b = _fresh_breaker("chaos_breaker", failures=3, reset_after=0.5)
+    stub.mode = "error"
+    for _ in range(3):
+        try:
+            guarded("chaos_breaker", stub.get, "/", timeout=1.0)
+        except Exception:
+            pass
+    opened = b.state == "open"
+    before = stub.requests
+    t0 = time.perf_counter()
+    short = 0
+    for _ in range(100):
+        try:
+            guarded("chaos_breaker", stub.get, "/", timeout=1.0)
+        except CircuitOpen:
+            short += 1
+    fast_fail_ms = (time.perf_counter() - t0) * 1000 / 100
+    untouched = stub.requests == before
+    stub.mode = "ok"
+    time.sleep(0.55)                                  # semi-ouvert : un appel d'essai passe
+    probe_ok = guarded("chaos_breaker", stub.get, "/", timeout=1.0)["ok"]
+    return {"ok": opened and short == 100 and untouched and probe_ok and b.state == "closed",
+            "opened": opened, "short_circuited": short, "fast_fail_ms": round(fast_fail_ms, 4),
+            "upstream_untouched": untouched, "closed_after_probe": b.state == "closed"}
+
+
+def _latencies(fn: Callable[[], Any], n: int) -> np.ndarray:
+    out = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return np.array(out)
+
+
+def scenario_hedging(stub: HttpStub, n: int = 150) -> Dict[str, Any]:
+    _fresh_breaker("chaos_hedge", failures=1000)
+    stub.mode = "flaky"
+    plain = _latencies(lambda: guarded("chaos_hedge", stub.get, "/", timeout=5.0), n)
+    hedged = _latencies(lambda: guarded("chaos_hedge", stub.get, "/", timeout=5.0, hedge_after=0.1), n)
+    stub.mode = "ok"
+    p99 = lambda a: float(np.percentile(a, 99))
+    return {"ok": p99(hedged) < 0.4 < p99(plain), "p99_plain_s": round(p99(plain), 3),
+            "p99_hedged_s": round(p99(hedged), 3), "p50_hedged_s": round(float(np.median(hedged)), 3)}
+
+
+def scenario_web_stale(stub: HttpStub) -> Dict[str, Any]:
+    from langchain_core.runnables import RunnableLambda
+    import app.tools.recherche_web_tavily as web
+
+    class StubTavily:
+        def invoke(self, query, *a, **kw):
+            stub.get("/search")
+            return [{"url": "https://example.com/nvda", "content": f"Résultat pour {query}."}]
+
+    _fresh_breaker("tavily", failures=3)
+    web.raw_tavily_tool = StubTavily()
+    web.summary_chain = RunnableLambda(lambda x: "NVIDIA progresse sur la demande IA.")
+    web.TAVILY_TIMEOUT, web.TAVILY_HEDGE_AFTER = 0.3, 0
+    web.web_cache.clear()
+    web.web_cache.ttl = 0.05
+    stub.mode = "ok"
+    fresh = web.search_web_tavily.invoke("actualités NVIDIA")
+    time.sleep(0.1)                                   # l'entrée expire (mais reste en réserve)
+    stub.mode = "hang"
+    t0 = time.perf_counter()
+    degraded = web.search_web_tavily.invoke("actualités NVIDIA")
+    elapsed = time.perf_counter() - t0
+    stub.mode = "ok"
+    return {"ok": "cache" in degraded and "NVIDIA" in degraded and elapsed < 0.5,
+            "fresh": fresh, "degraded": degraded, "elapsed_s": round(elapsed, 3)}
+
+
+def scenario_close_stale(stub: HttpStub) -> Dict[str, Any]:
+    import app.price_store as ps
+    import app.tools.stock_data_api as stock
+
+    class StubYF:
+        @staticmethod
+        def download(tickers, start=None, period=None, interval="1d", **kw):
+            stub.get("/download")
+            tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+            idx = pd.date_range(end=pd.Timestamp.now(tz="UTC").normalize(), periods=20, freq="D")
+            cols = pd.MultiIndex.from_product([["Open", "High", "Low", "Close", "Volume"], tickers])
+            data = np.tile(np.linspace(100, 119, 20)[:, None], (1, len(cols)))
+            return pd.DataFrame(data, index=idx, columns=cols)
+
+    _fresh_breaker("yfinance", failures=3)
+    ps.yf = StubYF
+    ps.YFINANCE_TIMEOUT = 0.3
+    ps._STORE = ps.PriceStore(root=tempfile.mkdtemp(prefix="chaos-prices-"), ttl=0.0)
+    stub.mode = "ok"
+    fresh = stock.get_stock_data.invoke("close AAPL 1mo 1d")
+    stub.mode = "hang"
+    t0 = time.perf_counter()
+    degraded = stock.get_stock_data.invoke("close AAPL 1mo 1d")
+    elapsed = time.perf_counter() - t0
+    stub.mode = "ok"
+    return {"ok": degraded.startswith("[Cours stockés") and "119.00" in degraded and elapsed < 0.5,
+            "fresh": fresh, "degraded": degraded, "elapsed_s": round(elapsed, 3)}
+
+
+def scenario_smtp() -> Dict[str, Any]:
+    import app.mail_queue as mq
+
+    smtp = MuteSmtpStub()
+    b = _fresh_breaker("smtp", failures=2, reset_after=30)
+    mq.SMTP_TIMEOUT = 0.3
+    pool = mq.SMTPPool(size=1, conf=lambda: ("127.0.0.1", smtp.port, "u", "p", "bot@example.com", False))
+    msg = mq.build_message("bot@example.com", "client@example.com", "Test", "Corps")
+    timings, errors = [], []
+    for _ in range(3):
+        t0 = time.perf_counter()
+        try:
+            pool.send(msg)
+        except Exception as e:
+            errors.append(type(e).__name__)
+        timings.append(round(time.perf_counter() - t0, 3))
+    smtp.close()
+    return {"ok": errors[:2] != ["CircuitOpen"] * 2 and errors[-1] == "CircuitOpen"
+                  and max(timings) < 0.8 and timings[-1] < 0.01 and b.state == "open",
+            "errors": errors, "elapsed_s": timings, "connections": smtp.accepted}
+
+
+def scenario_bulkhead(stub: HttpStub) -> Dict[str, Any]:
+    _fresh_breaker("chaos_bulkhead", failures=10_000)
+    release = threading.Event()
+    size = resilience._bulkhead("chaos_bulkhead").size
+    for _ in range(size):                             # remplit la cloison d'appels bloqués
+        try:
+            guarded("chaos_bulkhead", release.wait, 30, timeout=0.01)
+        except DeadlineExceeded:
+            pass
+    t0 = time.perf_counter()
+    try:
+        guarded("chaos_bulkhead", release.wait, 30, timeout=1.0)
+        rejected = False
+    except BulkheadFull:
+        rejected = True
+    reject_ms = (time.perf_counter() - t0) * 1000
+    stub.mode = "ok"
+    t0 = time.perf_counter()
+    other_ok = all(guarded("chaos_other", stub.get, "/", timeout=1.0)["ok"] for _ in range(2 * size))
+    other_s = time.perf_counter() - t0
+    release.set()                                     # l'amont guérit : la cloison se vide
+    time.sleep(0.05)
+    recovered = guarded("chaos_bulkhead", lambda: True, timeout=1.0)
+    return {"ok": rejected and reject_ms < 50 and other_ok and recovered,
+            "size": size, "rejected": rejected, "reject_ms": round(reject_ms, 3),
+            "other_upstream_s": round(other_s, 3), "recovered": recovered}
+
+
+def run() -> Dict[str, Dict[str, Any]]:
+    stub = HttpStub()
+    try:
+        return {
+            "deadline": scenario_deadline(stub),
+            "breaker": scenario_breaker(stub),
+            "hedging": scenario_hedging(stub),
+            "web_stale": scenario_web_stale(stub),
+            "close_stale": scenario_close_stale(stub),
+            "smtp": scenario_smtp(),
+            "bulkhead": scenario_bulkhead(stub),
+        }
+    finally:
+        stub.close()
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Tests de chaos de la couche de résilience (bouchons locaux).")
+    p.add_argument("--json", help="écrit les résultats dans ce fichier")
+    args = p.parse_args(argv)
+
+    results = run()
+    for name, r in results.items():
+        details = ", ".join(f"{k}={v}" for k, v in r.items() if k not in ("ok", "fresh", "degraded"))
+        print(f"{'✅' if r['ok'] else '❌'} {name:<12} {details}")
+        if "degraded" in r:
+            print(f"   ↳ {r['degraded'][:110]!r}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1, ensure_ascii=False)
+    return 0 if all(r["ok"] for r in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
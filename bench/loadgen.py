@@ -0,0 +1,203 @@
+# bench/loadgen.py
+"""
+Générateur de charge HTTP pour le service app/server.py.
+
+Par défaut, démarre le VRAI serveur ASGI dans le processus (uvicorn, port local libre)
+avec l'agent branché sur les stand-ins hors ligne de bench/replay.py (LLM, Tavily,
+yfinance, embeddings rejoués avec latence synthétique) : aucun réseau ni crédit.
+`--url` vise à la place un serveur déjà lancé.
+
+Deux modes :
+- boucle fermée (--concurrency N) : N clients qui renvoient une requête dès la réponse ;
+- boucle ouverte (--rate R) : R arrivées/s quelle que soit la vitesse du serveur
+  (montre la contre-pression : 429 quand la file d'admission est pleine).
+
+Rapport : requêtes envoyées, OK, 429, erreurs, débit soutenu (OK/s), latences
+p50/p95/p99 ; avec --stream, délai du premier événement SSE et de la réponse finale.
+
+    python -m bench.loadgen --concurrency 16 --duration 20
+    python -m bench.loadgen --rate 40 --duration 15 --workers 4 --queue 8
+    python -m bench.loadgen --stream --concurrency 8 --llm-ms 300
+    python -m bench.loadgen --url http://127.0.0.1:8000 --concurrency 32
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from bench.replay import install, load_fixtures
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "scenarios.json")
+
+
+class Stats:
+    def __init__(self):
+        self.sent = self.ok = self.rejected = self.errors = 0
+        self.latencies: List[float] = []
+        self.first_event: List[float] = []
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        pct = lambda a, q: round(float(np.percentile(a, q)), 4) if a else None
+        out = {"sent": self.sent, "ok": self.ok, "rejected_429": self.rejected, "errors": self.errors,
+               "elapsed_s": round(elapsed, 3), "sustained_qps": round(self.ok / elapsed, 3) if elapsed else 0.0,
+               "p50_s": pct(self.latencies, 50), "p95_s": pct(self.latencies, 95), "p99_s": pct(self.latencies, 99)}
+        if self.first_event:
+            out["first_event_p50_s"] = pct(self.first_event, 50)
+            out["first_event_p95_s"] = pct(self.first_event, 95)
+        return out
+
+
+async def _one(client: httpx.AsyncClient, question: str, session_id: str, stream: bool, stats: Stats) -> None:
+    stats.sent += 1
+    body = {"input": question, "session_id": session_id}
+    t0 = time.perf_counter()
+    try:
+        if not stream:
+            r = await client.post("/v1/query", json=body)
+            if r.status_code == 429:
+                stats.rejected += 1
+            elif r.status_code == 200 and r.json().get("output"):
+                stats.ok += 1
+                stats.latencies.append(time.perf_counter() - t0)
+            else:
+                stats.errors += 1
+            return
+        async with client.stream("POST", "/v1/query/stream", json=body) as r:
+            if r.status_code == 429:
+                stats.rejected += 1
+                return
+            first, final = None, False
+            async for line in r.aiter_lines():
+                if line.startswith("event:"):
+                    first = first or time.perf_counter() - t0
+                    final = final or line.split(":", 1)[1].strip() == "final"
+            if final:
+                stats.ok += 1
+                stats.latencies.append(time.perf_counter() - t0)
+                stats.first_event.append(first)
+            else:
+                stats.errors += 1
+    except httpx.HTTPError:
+        stats.errors += 1
+
+
+async def drive(url: str, questions: List[str], concurrency: int, rate: Optional[float], duration: float,
+                stream: bool, sessions: int) -> Dict[str, Any]:
+    stats = Stats()
+    qs = itertools.cycle(questions)
+    # sessions=0 : une session neuve par requête (le LLM rejoué reconnaît la question dans le prompt,
+    # un historique partagé le tromperait) ; sessions=K : K sessions réutilisées en tourniquet
+    sids = itertools.cycle([f"load-{i}" for i in range(sessions)]) if sessions else None
+    next_sid = (lambda: next(sids)) if sids else (lambda: f"load-{uuid.uuid4().hex[:10]}")
+    limits = httpx.Limits(max_connections=max(concurrency, 256), max_keepalive_connections=max(concurrency, 64))
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        t0 = time.perf_counter()
+        stop_at = t0 + duration
+        if rate:
+            tasks = []
+            n = 0
+            while time.perf_counter() < stop_at:
+                tasks.append(asyncio.create_task(_one(client, next(qs), next_sid(), stream, stats)))
+                n += 1
+                await asyncio.sleep(max(0.0, t0 + n / rate - time.perf_counter()))
+            await asyncio.gather(*tasks)
+        else:
+            async def worker():
+                while time.perf_counter() < stop_at:
+                    await _one(client, next(qs), next_sid(), stream, stats)
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+        ready = (await client.get("/readyz")).json()
+    out = stats.report(elapsed)
+    out["server"] = {k: ready.get(k) for k in ("capacity", "rejected", "sessions")}
+    return out
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def local_server(fixtures: Dict[str, Any], workers: int, queue: int, llm_ms: float, tool_ms: float,
+                 jitter: float, seed: int):
+    """Serveur ASGI réel + agent sur stand-ins rejoués, dans un thread ; renvoie son URL."""
+    import uvicorn
+
+    from app.agent import build_agent
+    from app.server import create_app
+
+    with install(fixtures, llm_ms=llm_ms, tool_ms=tool_ms, jitter=jitter, seed=seed) as llm:
+        app = create_app(agent=build_agent(llm=llm, verbose=False), router_llm=llm, workers=workers, queue=queue)
+        port = _free_port()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.02)
+        try:
+            yield f"http://127.0.0.1:{port}"
+        finally:
+            server.should_exit = True
+            thread.join(10)
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Charge HTTP sur app/server.py (LLM rejoué hors ligne par défaut).")
+    p.add_argument("--url", help="serveur existant (sinon serveur local sur stand-ins)")
+    p.add_argument("--fixtures", default=FIXTURES)
+    p.add_argument("--concurrency", type=int, default=16, help="clients en boucle fermée")
+    p.add_argument("--rate", type=float, help="boucle ouverte : arrivées par seconde")
+    p.add_argument("--duration", type=float, default=15.0, help="durée de la charge (s)")
+    p.add_argument("--stream", action="store_true", help="utilise /v1/query/stream (SSE)")
+    p.add_argument("--sessions", type=int, default=0, help="sessions réutilisées (0 = une par requête)")
+    p.add_argument("--workers", type=int, default=8, help="serveur local : exécutions simultanées")
+    p.add_argument("--queue", type=int, default=32, help="serveur local : file d'admission")
+    p.add_argument("--llm-ms", type=float, default=150.0)
+    p.add_argument("--tool-ms", type=float, default=40.0)
+    p.add_argument("--jitter", type=float, default=0.3)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--json", help="écrit le rapport dans ce fichier")
+    args = p.parse_args(argv)
+
+    fixtures = load_fixtures(args.fixtures)
+    questions = [sc["question"] for sc in fixtures["scenarios"]]
+
+    def go(url: str) -> Dict[str, Any]:
+        return asyncio.run(drive(url, questions, args.concurrency, args.rate, args.duration,
+                                 args.stream, args.sessions))
+
+    if args.url:
+        report = go(args.url)
+    else:
+        with local_server(fixtures, args.workers, args.queue, args.llm_ms, args.tool_ms,
+                          args.jitter, args.seed) as url:
+            report = go(url)
+
+    mode = f"rate={args.rate}/s" if args.rate else f"concurrency={args.concurrency}"
+    print(f"🚦 {mode} {'SSE' if args.stream else 'JSON'} pendant {report['elapsed_s']} s")
+    print(f"   envoyées {report['sent']}  OK {report['ok']}  429 {report['rejected_429']}  erreurs {report['errors']}")
+    print(f"   débit soutenu {report['sustained_qps']:.2f} req/s   p50 {report['p50_s']}  p95 {report['p95_s']}  "
+          f"p99 {report['p99_s']}")
+    if "first_event_p50_s" in report:
+        print(f"   1er événement SSE p50 {report['first_event_p50_s']}  p95 {report['first_event_p95_s']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    return 0 if report["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,399 @@
+# bench/replay.py
+"""
+Stand-ins "record/replay" pour faire tourner le VRAI pipeline routeur -> agent -> outils
+sans réseau ni crédits API : OpenAI (chat + embeddings), Tavily, yfinance.
+
+Les réponses viennent d'un fichier de fixtures JSON (voir bench/fixtures/scenarios.json) :
+    scenarios  : question, route attendue, réponses successives de l'agent (une par
+                 itération ReAct), résumé web éventuel
+    tavily     : requête normalisée -> résultats [{url, content}]
+    prices     : ticker -> {"last", "vol"} (série synthétique) ou {"start", "close": [...]}
+    pe         : ticker -> P/E
+    documents  : passages du corpus RAG [{content, source}]
+
+Chaque appel amont subit une latence synthétique (moyenne ± gigue, graine fixe).
+Les tokens de prompt sont mesurés sur le prompt réellement envoyé (tiktoken) :
+toute modification du prompt ou du scratchpad se voit dans les résultats.
+
+`Recorder` fait l'inverse : il enveloppe les vrais clients et écrit un fichier de fixtures.
+"""
+import hashlib
+import json
+import random
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from app.cache import normalize_query
+from app.llm_scheduler import estimate_tokens
+
+
+class Latency:
+    """Latence synthétique : moyenne `ms` ± `jitter` (fraction), tirages reproductibles."""
+
+    def __init__(self, ms: float = 0.0, jitter: float = 0.3, seed: int = 0):
+        self.ms = ms
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sleep(self) -> None:
+        if self.ms <= 0:
+            return
+        with self._lock:
+            f = 1.0 + self._rng.uniform(-self.jitter, self.jitter)
+        time.sleep(self.ms * f / 1000.0)
+
+
+class Counters:
+    """Compteurs partagés (appels LLM, tokens, réponses absentes des fixtures)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.llm_calls = self.prompt_tokens = self.completion_tokens = 0
+            self.upstream = {"tavily": 0, "yfinance": 0, "embeddings": 0}
+            self.misses = 0
+
+    def add_llm(self, prompt: int, completion: int) -> None:
+        with self._lock:
+            self.llm_calls += 1
+            self.prompt_tokens += prompt
+            self.completion_tokens += completion
+
+    def hit(self, upstream: str) -> None:
+        with self._lock:
+            self.upstream[upstream] += 1
+
+    def miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+
+COUNTERS = Counters()
+
+
+def _text(messages) -> str:
+    return "\n".join(str(m.content) for m in messages)
+
+
+class ReplayChatModel(BaseChatModel):
+    """Modèle de chat rejoué : routeur (sortie structurée), itérations ReAct et résumés web."""
+
+    fixtures: Dict[str, Any]
+    latency: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _scenario(self, text: str) -> Optional[Dict[str, Any]]:
+        # la question la plus longue contenue dans le prompt (évite les préfixes communs)
+        best = None
+        for sc in self.fixtures["scenarios"]:
+            if sc["question"] in text and (best is None or len(sc["question"]) > len(best["question"])):
+                best = sc
+        return best
+
+    def _summary(self, text: str) -> str:
+        # le prompt de résumé contient l'Action Input de l'agent, pas la question d'origine
+        question = text.split("Question:", 1)[-1].split("\n", 1)[0].strip()
+        for sc in self.fixtures["scenarios"]:
+            if "summary" in sc and (sc["question"] in text or any(
+                    f'Action Input: "{question}"' in turn for turn in sc.get("agent", []))):
+                return sc["summary"]
+        COUNTERS.miss()
+        return "(replay) résumé indisponible."
+
+    def _reply(self, messages) -> str:
+        text = _text(messages)
+        if "Résumé concis" in text:                       # chaîne de résumé du web
+            return self._summary(text)
+        sc = self._scenario(text)
+        if sc is None:
+            COUNTERS.miss()
+            return "Thought: pas de fixture.\nFinal Answer: (replay) réponse indisponible."
+        turns = sc.get("agent") or ["Thought: fin.\nFinal Answer: (replay)"]
+        # itération ReAct = nombre d'observations déjà dans le scratchpad (dernier message)
+        turn = str(messages[-1].content).count("Observation:")
+        return turns[min(turn, len(turns) - 1)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            self.latency.sleep()
+        reply = self._reply(messages)
+        prompt_t, completion_t = estimate_tokens(_text(messages)), estimate_tokens(reply)
+        COUNTERS.add_llm(prompt_t, completion_t)
+        usage = {"prompt_tokens": prompt_t, "completion_tokens": completion_t,
+                 "total_tokens": prompt_t + completion_t}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))],
+                          llm_output={"token_usage": usage, "model_name": "replay"})
+
+    def with_structured_output(self, schema, **kwargs):
+        """Routeur : renvoie la route enregistrée du scénario (un appel LLM simulé)."""
+        def _route(prompt):
+            text = prompt if isinstance(prompt, str) else _text(prompt.to_messages())
+            if self.latency:
+                self.latency.sleep()
+            sc = self._scenario(text)
+            if sc is None:
+                COUNTERS.miss()
+            action = sc["route"] if sc else "auto"
+            COUNTERS.add_llm(estimate_tokens(text), estimate_tokens(action) + 10)
+            query = text.rsplit("Texte:", 1)[-1].strip()
+            return schema(action=action, query=query)
+        return RunnableLambda(_route)
+
+
+class ReplayTavily:
+    """Remplace raw_tavily_tool : mêmes résultats [{url, content}] que l'API."""
+
+    def __init__(self, fixtures: Dict[str, Any], latency: Optional[Latency] = None):
+        self.results = {normalize_query(k): v for k, v in fixtures.get("tavily", {}).items()}
+        self.latency = latency
+
+    def invoke(self, query: str, *args, **kwargs):
+        if self.latency:
+            self.latency.sleep()
+        COUNTERS.hit("tavily")
+        res = self.results.get(normalize_query(query))
+        if res is None:
+            COUNTERS.miss()
+            return []
+        return res
+
+
+def _series(spec: Dict[str, Any], ticker: str) -> pd.Series:
+    if "close" in spec:
+        idx = pd.bdate_range(spec["start"], periods=len(spec["close"]))
+        return pd.Series(spec["close"], index=idx, dtype=float)
+    # série synthétique reproductible (graine = ticker) finissant à `last`
+    rng = np.random.default_rng(int(hashlib.sha1(ticker.encode()).hexdigest()[:8], 16))
+    n = int(spec.get("days", 520))
+    rets = rng.normal(0.0003, spec.get("vol", 0.25) / np.sqrt(252), n)
+    close = np.exp(np.cumsum(rets))
+    close *= spec.get("last", 100.0) / close[-1]
+    idx = pd.bdate_range(end=pd.Timestamp.now(tz="UTC").normalize().tz_localize(None), periods=n)
+    return pd.Series(close, index=idx)
+
+
+class ReplayYFinance:
+    """Remplace yf.download / yf.Ticker (données de fixtures, format multi-index de yfinance)."""
+
+    def __init__(self, fixtures: Dict[str, Any], latency: Optional[Latency] = None):
+        self.fixtures = fixtures
+        self.latency = latency
+        self._series = {t.upper(): _series(s, t.upper()) for t, s in fixtures.get("prices", {}).items()}
+
+    def download(self, tickers, start=None, period=None, interval="1d", **kwargs) -> pd.DataFrame:
+        if self.latency:
+            self.latency.sleep()
+        COUNTERS.hit("yfinance")
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        frames = {}
+        for t in tickers:
+            s = self._series.get(t.upper())
+            if s is None:
+                continue
+            if start is not None:
+                s = s[s.index >= pd.Timestamp(start)]
+            frames[t] = pd.DataFrame({"Open": s, "High": s * 1.01, "Low": s * 0.99, "Close": s,
+                                      "Volume": 1e6})
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, axis=1)                  # colonnes (ticker, champ)
+        df = df.swaplevel(0, 1, axis=1).sort_index(axis=1)   # -> (champ, ticker) comme yfinance
+        df.index = df.index.tz_localize("UTC")
+        return df
+
+    def Ticker(self, ticker: str):
+        if self.latency:
+            self.latency.sleep()
+        COUNTERS.hit("yfinance")
+        pe = self.fixtures.get("pe", {}).get(ticker.upper())
+        return type("ReplayTicker", (), {"info": {"trailingPE": pe} if pe is not None else {}})()
+
+
+class ReplayEmbeddings(Embeddings):
+    """Embeddings déterministes (hachage de mots) avec latence d'un appel réseau."""
+
+    def __init__(self, dim: int = 256, latency: Optional[Latency] = None):
+        self.dim = dim
+        self.latency = latency
+
+    def _vec(self, text: str) -> List[float]:
+        v = np.zeros(self.dim)
+        for w in re.findall(r"\w+", text.lower()):
+            h = int(hashlib.md5(w.encode()).hexdigest()[:8], 16)
+            v[h % self.dim] += 1.0 if (h >> 20) & 1 else -1.0
+        n = np.linalg.norm(v)
+        return (v / n if n else v).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.latency:
+            self.latency.sleep()
+        COUNTERS.hit("embeddings")
+        return self._vec(text)
+
+
+def load_fixtures(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@contextmanager
+def install(fixtures: Dict[str, Any], llm_ms: float = 0.0, tool_ms: float = 0.0,
+            jitter: float = 0.3, seed: int = 0):
+    """
+    Branche les stand-ins dans les modules de l'application (le temps du bloc) et
+    renvoie le modèle de chat rejoué à passer à build_agent(llm=...) / handle_query.
+    """
+    import yfinance
+    from langchain_community.vectorstores import FAISS
+
+    import app.price_store as price_store
+    import app.tools.rag_finance_docs as rag_tool
+    import app.tools.recherche_web_tavily as web
+
+    llm_lat, tool_lat = Latency(llm_ms, jitter, seed), Latency(tool_ms, jitter, seed + 1)
+    llm = ReplayChatModel(fixtures=fixtures, latency=llm_lat)
+    yf_stub = ReplayYFinance(fixtures, tool_lat)
+    docs = [Document(page_content=d["content"], metadata={"source": d.get("source", "fixture")})
+            for d in fixtures.get("documents", [])]
+    retriever = (FAISS.from_documents(docs, ReplayEmbeddings(latency=tool_lat)).as_retriever(search_kwargs={"k": 4})
+                 if docs else None)
+
+    saved = {
+        "download": yfinance.download, "Ticker": yfinance.Ticker,
+        "store": price_store._STORE, "tavily": web.raw_tavily_tool, "summary": web.summary_chain,
+        "retriever": rag_tool._RETRIEVER,
+    }
+    tmp = tempfile.TemporaryDirectory(prefix="bench-prices-")
+    try:
+        yfinance.download, yfinance.Ticker = yf_stub.download, yf_stub.Ticker
+        price_store._STORE = price_store.PriceStore(root=tmp.name)
+        web.raw_tavily_tool = ReplayTavily(fixtures, tool_lat)
+        web.summary_chain = web._prompt | llm | web.StrOutputParser()
+        rag_tool._RETRIEVER = retriever
+        yield llm
+    finally:
+        yfinance.download, yfinance.Ticker = saved["download"], saved["Ticker"]
+        price_store._STORE = saved["store"]
+        web.raw_tavily_tool, web.summary_chain = saved["tavily"], saved["summary"]
+        rag_tool._RETRIEVER = saved["retriever"]
+        tmp.cleanup()
+
+
+class Recorder:
+    """
+    Enregistre des fixtures en faisant tourner le pipeline réel (clés API requises) :
+    réponses LLM par itération, résultats Tavily, clôtures yfinance, P/E et passages RAG.
+    """
+
+    def __init__(self):
+        self.fixtures: Dict[str, Any] = {"scenarios": [], "tavily": {}, "prices": {}, "pe": {}, "documents": []}
+        self._turns: List[str] = []
+        self._summary: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def wrap(self):
+        import yfinance
+
+        import app.tools.rag_finance_docs as rag_tool
+        import app.tools.recherche_web_tavily as web
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        rec = self
+        orig_dl, orig_ticker = yfinance.download, yfinance.Ticker
+        orig_tavily, orig_retriever = web._tavily(), rag_tool._retriever()
+
+        def download(tickers, *a, **kw):
+            df = orig_dl(tickers, *a, **kw)
+            if not df.empty and isinstance(df.columns, pd.MultiIndex):
+                for t in df.columns.get_level_values(-1).unique():
+                    s = df["Close"][t].dropna()
+                    if len(s):
+                        rec.fixtures["prices"][t] = {"start": s.index[0].strftime("%Y-%m-%d"),
+                                                     "close": [round(float(x), 4) for x in s]}
+            return df
+
+        def ticker(sym):
+            tk = orig_ticker(sym)
+            pe = (tk.info or {}).get("trailingPE")
+            if pe is not None:
+                rec.fixtures["pe"][sym.upper()] = pe
+            return tk
+
+        class _Tavily:
+            def invoke(self, query, *a, **kw):
+                res = orig_tavily.invoke(query, *a, **kw)
+                if isinstance(res, list):
+                    rec.fixtures["tavily"][normalize_query(query)] = [
+                        {"url": r.get("url", ""), "content": r.get("content", "")} for r in res]
+                return res
+
+        class _Retriever:
+            def invoke(self, query, *a, **kw):
+                docs = orig_retriever.invoke(query, *a, **kw)
+                known = {d["content"] for d in rec.fixtures["documents"]}
+                for d in docs:
+                    if d.page_content not in known:
+                        rec.fixtures["documents"].append(
+                            {"content": d.page_content, "source": (d.metadata or {}).get("source", "")})
+                return docs
+
+        class _LLMCapture(BaseCallbackHandler):
+            # attaché à l'agent seulement : le routeur et le résumé web ne passent pas ici
+            def on_llm_end(self, response, **kw):
+                with rec._lock:
+                    rec._turns.append(response.generations[0][0].text)
+
+        yfinance.download, yfinance.Ticker, web.raw_tavily_tool = download, ticker, _Tavily()
+        if orig_retriever is not None:
+            rag_tool._RETRIEVER = _Retriever()
+        orig_summary = web._summary_chain()
+        web.summary_chain = RunnableLambda(lambda x: self._summarize(orig_summary, x))
+        try:
+            yield _LLMCapture()
+        finally:
+            yfinance.download, yfinance.Ticker, web.raw_tavily_tool = orig_dl, orig_ticker, orig_tavily
+            rag_tool._RETRIEVER = orig_retriever
+            web.summary_chain = orig_summary
+
+    def _summarize(self, chain, x):
+        out = chain.invoke(x)
+        self._summary = out
+        return out
+
+    def record(self, agent, router_llm, question: str, scenario_id: str, capture) -> None:
+        from app.agent import handle_query
+        self._turns, self._summary = [], None
+        agent.callbacks = [capture]
+        res = handle_query(agent, router_llm, question, session_id=f"record-{scenario_id}")
+        sc = {"id": scenario_id, "question": question, "route": res.get("route", "auto"), "agent": self._turns}
+        if self._summary:
+            sc["summary"] = self._summary
+        self.fixtures["scenarios"].append(sc)
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.fixtures, f, ensure_ascii=False, indent=1)
@@ -0,0 +1,179 @@
+# bench/run.py
+"""
+Benchmark de bout en bout, hors ligne : le VRAI pipeline handle_query
+(routeur -> agent ReAct -> outils) tourne sur les stand-ins de bench/replay.py.
+
+Exemples :
+    python -m bench.run                                   # niveaux 1,4,16 ; latences par défaut
+    python -m bench.run --concurrency 1,8 --queries 200 --llm-ms 300 --tool-ms 80
+    python -m bench.run --json out.json --write-baseline bench/baseline.json
+    python -m bench.run --baseline bench/baseline.json --tolerance 0.2   # CI : code 1 si régression
+    python -m bench.run --record bench/fixtures/recorded.json            # vrais appels (clés API)
+
+Rapport par niveau de concurrence : débit (req/s), latences p50/p95/p99,
+appels LLM et tokens par requête, appels amont (Tavily, yfinance, embeddings),
+erreurs et réponses absentes des fixtures.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
+
+from bench.replay import COUNTERS, Recorder, install, load_fixtures
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "scenarios.json")
+
+# métriques comparées à la référence : (clé, sens) ; "lower" = plus petit est meilleur
+GATED = [("p50_s", "lower"), ("p95_s", "lower"), ("throughput_qps", "higher"),
+         ("llm_calls_per_query", "lower"), ("tokens_per_query", "lower")]
+
+
+def _run_level(agent, llm, questions: List[str], concurrency: int) -> Dict[str, Any]:
+    from app.agent import handle_query
+    from app.tools.recherche_web_tavily import web_cache
+
+    web_cache.clear()                       # chaque niveau part d'un cache froid
+    COUNTERS.reset()
+    latencies: List[float] = []
+    errors = 0
+
+    def one(q: str):
+        t0 = time.perf_counter()
+        try:
+            res = handle_query(agent, llm, q, session_id=f"bench-{uuid.uuid4().hex[:8]}")
+            ok = bool(res.get("output"))
+        except Exception:
+            ok = False
+        return time.perf_counter() - t0, ok
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for elapsed, ok in pool.map(one, questions):
+            latencies.append(elapsed)
+            errors += 0 if ok else 1
+    wall = time.perf_counter() - t0
+
+    n = len(questions)
+    lat = np.array(latencies)
+    return {
+        "concurrency": concurrency,
+        "queries": n,
+        "wall_s": round(wall, 3),
+        "throughput_qps": round(n / wall, 3) if wall else 0.0,
+        "p50_s": round(float(np.percentile(lat, 50)), 4),
+        "p95_s": round(float(np.percentile(lat, 95)), 4),
+        "p99_s": round(float(np.percentile(lat, 99)), 4),
+        "llm_calls_per_query": round(COUNTERS.llm_calls / n, 3),
+        "tokens_per_query": round((COUNTERS.prompt_tokens + COUNTERS.completion_tokens) / n, 1),
+        "prompt_tokens_per_query": round(COUNTERS.prompt_tokens / n, 1),
+        "upstream": dict(COUNTERS.upstream),
+        "errors": errors,
+        "fixture_misses": COUNTERS.misses,
+    }
+
+
+def run(fixtures: Dict[str, Any], levels: List[int], queries: int, llm_ms: float, tool_ms: float,
+        jitter: float, seed: int) -> List[Dict[str, Any]]:
+    from app.agent import build_agent
+
+    base = [sc["question"] for sc in fixtures["scenarios"]]
+    questions = [base[i % len(base)] for i in range(queries)]
+    results = []
+    with install(fixtures, llm_ms=llm_ms, tool_ms=tool_ms, jitter=jitter, seed=seed) as llm:
+        agent = build_agent(llm=llm, verbose=False)
+        for c in levels:
+            results.append(_run_level(agent, llm, questions, c))
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    """Liste des régressions au-delà de `tolerance` (fraction) par rapport à la référence."""
+    ref = {r["concurrency"]: r for r in baseline}
+    out = []
+    for r in results:
+        b = ref.get(r["concurrency"])
+        if b is None:
+            continue
+        for key, sense in GATED:
+            old, new = b.get(key), r.get(key)
+            if not old or new is None:
+                continue
+            worse = (new - old) / old if sense == "lower" else (old - new) / old
+            if worse > tolerance:
+                out.append(f"c={r['concurrency']} {key}: {old} -> {new} ({worse:+.0%})")
+        if r["errors"] > b.get("errors", 0):
+            out.append(f"c={r['concurrency']} errors: {b.get('errors', 0)} -> {r['errors']}")
+    return out
+
+
+def _print(results: List[Dict[str, Any]]) -> None:
+    print(f"{'conc':>4} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'llm/q':>6} {'tok/q':>8} "
+          f"{'tavily':>6} {'yf':>4} {'emb':>4} {'err':>4} {'miss':>4}")
+    for r in results:
+        u = r["upstream"]
+        print(f"{r['concurrency']:>4} {r['throughput_qps']:>8.2f} {r['p50_s']:>8.3f} {r['p95_s']:>8.3f} "
+              f"{r['p99_s']:>8.3f} {r['llm_calls_per_query']:>6.2f} {r['tokens_per_query']:>8.0f} "
+              f"{u['tavily']:>6} {u['yfinance']:>4} {u['embeddings']:>4} {r['errors']:>4} {r['fixture_misses']:>4}")
+
+
+def record(fixtures_in: Dict[str, Any], path: str) -> None:
+    """Rejoue les questions des fixtures contre les vraies API et enregistre les réponses."""
+    from app.agent import build_agent, build_router_llm
+
+    rec = Recorder()
+    agent, router_llm = build_agent(verbose=False), build_router_llm()
+    with rec.wrap() as capture:
+        for sc in fixtures_in["scenarios"]:
+            rec.record(agent, router_llm, sc["question"], sc["id"], capture)
+            print(f"✅ {sc['id']}: {len(rec.fixtures['scenarios'][-1]['agent'])} itération(s)")
+    rec.save(path)
+    print(f"💾 Fixtures écrites dans {path}")
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark hors ligne du pipeline routeur -> agent -> outils.")
+    p.add_argument("--fixtures", default=FIXTURES)
+    p.add_argument("--concurrency", default="1,4,16", help="niveaux séparés par des virgules")
+    p.add_argument("--queries", type=int, default=64, help="requêtes par niveau")
+    p.add_argument("--llm-ms", type=float, default=150.0, help="latence synthétique par appel LLM")
+    p.add_argument("--tool-ms", type=float, default=40.0, help="latence synthétique par appel Tavily/yfinance/embeddings")
+    p.add_argument("--jitter", type=float, default=0.3, help="gigue relative des latences (0.3 = ±30%%)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--json", help="écrit les résultats dans ce fichier")
+    p.add_argument("--baseline", help="référence JSON à comparer (code de sortie 1 si régression)")
+    p.add_argument("--tolerance", type=float, default=0.2, help="dégradation tolérée (fraction)")
+    p.add_argument("--write-baseline", help="écrit les résultats comme nouvelle référence")
+    p.add_argument("--record", help="mode enregistrement : vrais appels API -> fichier de fixtures")
+    args = p.parse_args(argv)
+
+    fixtures = load_fixtures(args.fixtures)
+    if args.record:
+        record(fixtures, args.record)
+        return 0
+
+    levels = [int(x) for x in args.concurrency.split(",") if x.strip()]
+    results = run(fixtures, levels, args.queries, args.llm_ms, args.tool_ms, args.jitter, args.seed)
+    _print(results)
+
+    for path in (args.json, args.write_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("❌ Régressions :\n  " + "\n  ".join(regressions))
+            return 1
+        print(f"✅ Pas de régression (tolérance {args.tolerance:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""
+Backends d'embeddings du RAG, choisis par EMBEDDINGS_BACKEND (app/config.py).
+
+- 'openai' : OpenAIEmbeddings via l'ordonnanceur partagé (app/llm_scheduler.py).
+- 'local'  : `LocalEmbeddings`, 100 % CPU et sans réseau :
+    1. chaque texte devient un vecteur creux de n-grammes hachés (mots, bigrammes de
+       mots, trigrammes/4-grammes de caractères) pondéré TF-IDF ;
+    2. une projection SVD (LSA) apprise sur les chunks à l'ingestion le ramène à
+       LOCAL_EMBED_DIM dimensions denses.
+  Tout est vectorisé NumPy par lots ; une requête s'embarque en bien moins d'une
+  milliseconde. Le modèle appris est sauvegardé à côté de l'index FAISS.
+- 'onnx'   : `OnnxEmbeddings`, un modèle de phrase exporté en ONNX (ex: MiniLM)
+  lu depuis ONNX_MODEL_DIR, exécuté par onnxruntime sur CPU.
+
+`get_embeddings()` renvoie le backend configuré ; `write_manifest()` / `check_manifest()`
+vérifient que l'index sur disque a été construit avec le même backend.
+"""
+
+import json
+import os
+import re
+import zlib
+from typing import List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.config import EMBEDDINGS_BACKEND, LOCAL_EMBED_DIM, ONNX_MODEL_DIR, PERSIST_DIR
+
+BACKENDS = ("openai", "local", "onnx")
+LOCAL_MODEL_FILE = "local_embeddings.npz"
+MANIFEST_FILE = "embeddings.json"
+
+_TOKEN = re.compile(r"\w+")
+_FNV_PRIME = np.uint32(16777619)
+_GOLDEN = np.uint32(0x9E3779B1)
+_MIX = np.uint32(0x85EBCA6B)
+_SALT = {2: np.uint32(0x27D4EB2F), 3: np.uint32(0x165667B1), 4: np.uint32(0xD3A2646C)}
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    Embeddings locaux "hachage + SVD". Avant `fit()`, la projection est aléatoire
+    (graine fixe) : utilisable, déterministe, mais moins pertinente.
+    """
+
+    def __init__(self, dim: int = LOCAL_EMBED_DIM, n_features: int = 4096, batch_size: int = 256, seed: int = 0):
+        self.dim = min(dim, n_features)
+        self.n_features = n_features
+        self.batch_size = batch_size
+        rng = np.random.default_rng(seed)
+        self.idf = np.ones(n_features, dtype=np.float32)
+        self.proj = (rng.standard_normal((n_features, self.dim)) / np.sqrt(self.dim)).astype(np.float32)
+        self.fitted = False
+
+    # --- vectorisation creuse ---
+
+    def _hashes(self, text: str) -> np.ndarray:
+        """Indices hachés de toutes les caractéristiques du texte (une entrée par occurrence)."""
+        words = _TOKEN.findall(text.lower())
+        if not words:
+            return np.zeros(0, dtype=np.int64)
+        wh = np.fromiter((zlib.crc32(w.encode()) for w in words), dtype=np.uint32, count=len(words))
+        parts = [wh, (wh[:-1] * _GOLDEN) ^ wh[1:] ^ _SALT[2]]              # mots, bigrammes de mots
+        # n-grammes d'octets sur "#mot1# #mot2# ..." calculés d'un bloc (FNV-1a vectorisé) ;
+        # ceux qui chevauchent deux mots contiennent l'espace et sont écartés
+        b = np.frombuffer(("#" + "# #".join(words) + "#").encode(), dtype=np.uint8).astype(np.uint32)
+        for n in (3, 4):
+            if len(b) < n:
+                continue
+            h = np.full(len(b) - n + 1, 2166136261, dtype=np.uint32)
+            ok = np.ones(len(h), dtype=bool)
+            for j in range(n):
+                c = b[j:len(b) - n + 1 + j]
+                h = (h ^ c) * _FNV_PRIME
+                ok &= c != 32
+            parts.append(h[ok] ^ _SALT[n])
+        h = np.concatenate(parts)
+        h ^= h >> 15                                   # mélange final : les bits bas servent au modulo
+        h *= _MIX
+        h ^= h >> 13
+        return (h % self.n_features).astype(np.int64)
+
+    def _counts(self, texts: Sequence[str]) -> np.ndarray:
+        """Matrice (lots x n_features) de TF sous-linéaire log(1 + n)."""
+        hashes = [self._hashes(t) for t in texts]
+        rows = np.repeat(np.arange(len(texts)), [len(h) for h in hashes])
+        flat = rows * self.n_features + (np.concatenate(hashes) if hashes else rows)
+        m = np.bincount(flat, minlength=len(texts) * self.n_features).astype(np.float32)
+        m = m.reshape(len(texts), self.n_features)
+        return np.log1p(m, out=m)
+
+    def _tfidf(self, texts: Sequence[str]) -> np.ndarray:
+        m = self._counts(texts) * self.idf
+        return m / np.maximum(np.linalg.norm(m, axis=1, keepdims=True), 1e-12)
+
+    # --- apprentissage ---
+
+    def fit(self, texts: Sequence[str], power_iters: int = 3, max_fit_docs: int = 20000) -> "LocalEmbeddings":
+        """Apprend l'IDF puis la projection SVD (SVD randomisée sur la matrice de Gram X^T X)."""
+        texts = list(texts)
+        if not texts:
+            return self
+        df = np.zeros(self.n_features, dtype=np.float64)
+        for i in range(0, len(texts), self.batch_size):
+            df += (self._counts(texts[i:i + self.batch_size]) > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + df)) + 1.0).astype(np.float32)
+
+        # la projection n'a besoin que d'un échantillon représentatif (coût O(n · features²))
+        sample = texts
+        if len(texts) > max_fit_docs:
+            keep = np.random.default_rng(0).choice(len(texts), max_fit_docs, replace=False)
+            sample = [texts[i] for i in sorted(keep)]
+        gram = np.zeros((self.n_features, self.n_features), dtype=np.float32)
+        for i in range(0, len(sample), self.batch_size):
+            x = self._tfidf(sample[i:i + self.batch_size])
+            gram += x.T @ x
+        rng = np.random.default_rng(0)
+        q = rng.standard_normal((self.n_features, min(self.dim + 16, self.n_features))).astype(np.float32)
+        for _ in range(power_iters):
+            q, _ = np.linalg.qr(gram @ q)
+        vals, vecs = np.linalg.eigh(q.T @ gram @ q)
+        top = np.argsort(vals)[::-1][:self.dim]
+        self.proj = (q @ vecs[:, top]).astype(np.float32)
+        self.fitted = True
+        return self
+
+    # --- embeddings ---
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Embeddings normalisés L2, par lots (tableau NumPy float32)."""
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i in range(0, len(texts), self.batch_size):
+            out[i:i + self.batch_size] = self._tfidf(texts[i:i + self.batch_size]) @ self.proj
+        return out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        # une seule ligne très creuse : on ne projette que les colonnes non nulles
+        cols, counts = np.unique(self._hashes(text), return_counts=True)
+        x = np.log1p(counts.astype(np.float32)) * self.idf[cols]
+        v = (x / max(float(np.linalg.norm(x)), 1e-12)) @ self.proj[cols]
+        return (v / max(float(np.linalg.norm(v)), 1e-12)).tolist()
+
+    # --- persistance ---
+
+    def save(self, path: str) -> None:
+        np.savez(path, idf=self.idf, proj=self.proj, fitted=np.array(self.fitted))
+
+    @classmethod
+    def load(cls, path: str) -> "LocalEmbeddings":
+        data = np.load(path)
+        emb = cls(dim=data["proj"].shape[1], n_features=data["proj"].shape[0])
+        emb.idf, emb.proj, emb.fitted = data["idf"], data["proj"], bool(data["fitted"])
+        return emb
+
+
+class OnnxEmbeddings(Embeddings):
+    """Modèle de phrase ONNX local (mean pooling + normalisation L2), exécuté sur CPU."""
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, batch_size: int = 32, max_length: int = 256):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError("Backend 'onnx' : installez onnxruntime (pip install onnxruntime).") from e
+        model = os.path.join(model_dir, "model.onnx")
+        if not os.path.exists(model):
+            raise RuntimeError(f"Backend 'onnx' : {model} introuvable (ONNX_MODEL_DIR).")
+        self.session = ort.InferenceSession(model, providers=["CPUExecutionProvider"])
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        self.batch_size = batch_size
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = []
+        for i in range(0, len(texts), self.batch_size):
+            enc = self.tokenizer.encode_batch(list(texts[i:i + self.batch_size]))
+            ids = np.array([e.ids for e in enc], dtype=np.int64)
+            mask = np.array([e.attention_mask for e in enc], dtype=np.int64)
+            feeds = {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+            hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self._inputs})[0]
+            if hidden.ndim == 3:                              # (lot, tokens, dim) -> mean pooling
+                m = mask[..., None].astype(np.float32)
+                hidden = (hidden * m).sum(axis=1) / np.maximum(m.sum(axis=1), 1e-9)
+            out.append(hidden.astype(np.float32))
+        vecs = np.vstack(out) if out else np.zeros((0, 0), dtype=np.float32)
+        return vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed([text])[0].tolist()
+
+
+def get_embeddings(backend: Optional[str] = None, persist_dir: str = PERSIST_DIR) -> Embeddings:
+    """
+    Backend d'embeddings configuré. Pour 'local', recharge le modèle appris à
+    l'ingestion s'il existe (sinon projection aléatoire, à apprendre avec `fit`).
+    """
+    backend = (backend or EMBEDDINGS_BACKEND).lower()
+    if backend == "openai":
+        from app.llm_scheduler import make_embeddings
+        return make_embeddings()
+    if backend == "local":
+        path = os.path.join(persist_dir, LOCAL_MODEL_FILE)
+        return LocalEmbeddings.load(path) if os.path.exists(path) else LocalEmbeddings()
+    if backend == "onnx":
+        return OnnxEmbeddings()
+    raise ValueError(f"EMBEDDINGS_BACKEND inconnu: {backend} (attendu: {', '.join(BACKENDS)})")
+
+
+def write_manifest(embeddings: Embeddings, persist_dir: str = PERSIST_DIR, backend: Optional[str] = None) -> None:
+    """Note le backend utilisé à l'ingestion (et sauvegarde le modèle local appris)."""
+    os.makedirs(persist_dir, exist_ok=True)
+    if isinstance(embeddings, LocalEmbeddings):
+        embeddings.save(os.path.join(persist_dir, LOCAL_MODEL_FILE))
+    with open(os.path.join(persist_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump({"backend": (backend or EMBEDDINGS_BACKEND).lower()}, f)
+
+
+def check_manifest(persist_dir: str = PERSIST_DIR, backend: Optional[str] = None) -> None:
+    """Erreur claire si l'index a été construit avec un autre backend (dimensions incompatibles)."""
+    path = os.path.join(persist_dir, MANIFEST_FILE)
+    built = "openai"                # index antérieur au manifeste : construit avec OpenAI
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            built = json.load(f).get("backend", "openai")
+    wanted = (backend or EMBEDDINGS_BACKEND).lower()
+    if built != wanted:
+        raise RuntimeError(f"Index construit avec les embeddings '{built}' mais EMBEDDINGS_BACKEND='{wanted}'. "
+                           "Relancez 'python -m rag.ingest'.")
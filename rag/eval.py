@@ -0,0 +1,345 @@
+"""
+Évaluation du RAG : qualité de recherche ET latence, hors ligne.
+
+Jusqu'ici `chunk_size=1000`, `chunk_overlap=150`, `k=4` et l'index FAISS "plat"
+ont été choisis au jugé. Ce module permet de les choisir sur des mesures :
+
+1.  Il génère un corpus financier synthétique (rapports annuels d'émetteurs fictifs,
+    avec du texte générique commun à tous les rapports pour rendre la recherche difficile)
+    et des paires question -> passage étiquetées (le passage est identifié par sa valeur
+    chiffrée unique et son document source, indépendamment du découpage).
+2.  Il vectorise avec une fonction d'embedding locale et déterministe (hachage de mots
+    et de n-grammes de caractères) : aucun appel réseau, résultats reproductibles.
+3.  Pour chaque combinaison (chunk_size, chunk_overlap, type d'index, k), il mesure
+    recall@k, MRR, taille de l'index, temps de construction et latence des requêtes.
+
+Pour l'exécuter :
+    python -m rag.eval
+    python -m rag.eval --chunk-sizes 500,1000,1500 --overlaps 0,150,300 --k 2,4,8 --index flat,hnsw,ivf
+    python -m rag.eval --embeddings local      # backend local de rag/embeddings.py (hachage + SVD)
+    python -m rag.eval --json rag_eval.json
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+import zlib
+from dataclasses import asdict, dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# --- Corpus synthétique ---
+
+ISSUERS = ["Novatek", "Helios Énergie", "Banque Ardent", "Axiom Santé", "Lumen Télécom",
+           "Ferrovia", "Orbis Logistique", "Vermeil Luxe", "Cobalt Mines", "Aquila Assurances"]
+YEARS = [2022, 2023, 2024]
+SEGMENTS = ["Services", "Industrie", "Grand public", "International", "Numérique"]
+DRIVERS = ["la hausse des volumes", "un effet prix favorable", "les acquisitions de l'année",
+           "la reprise en Asie", "la montée en puissance des abonnements"]
+RISKS = ["la concentration de la clientèle", "la volatilité des matières premières",
+         "l'évolution de la réglementation européenne", "le risque de change sur le dollar",
+         "la cybersécurité des systèmes d'information"]
+
+# Phrases génériques présentes dans tous les rapports (bruit commun)
+BOILERPLATE = [
+    "Le groupe poursuit la mise en œuvre de son plan stratégique à moyen terme.",
+    "Les comptes consolidés sont établis conformément aux normes IFRS adoptées dans l'Union européenne.",
+    "La direction reste attentive à l'évolution de l'environnement macroéconomique.",
+    "Les chiffres présentés ci-dessous sont issus des états financiers audités.",
+    "La politique de gestion des risques est revue chaque année par le comité d'audit.",
+    "Le groupe entend maintenir une structure financière solide et une notation de qualité.",
+    "Les perspectives tiennent compte des informations disponibles à la date du présent rapport.",
+    "Les variations à périmètre et taux de change constants sont détaillées en annexe.",
+    "La gouvernance du groupe s'appuie sur un conseil d'administration majoritairement indépendant.",
+    "Les engagements hors bilan sont décrits dans les notes annexes aux comptes consolidés.",
+    "Le groupe a poursuivi ses efforts de réduction des coûts et d'amélioration de la productivité.",
+    "La performance extra-financière fait l'objet d'une déclaration distincte.",
+]
+
+# métrique -> (titre de section, phrase du rapport, questions possibles)
+# {v} est la valeur chiffrée unique qui sert d'étiquette au passage.
+FACT_TEMPLATES = {
+    "ca": ("Activité",
+           "Le chiffre d'affaires consolidé atteint {v} en {year}, porté par {driver}.",
+           ["Quel est le chiffre d'affaires de {issuer} en {year} ?",
+            "Combien {issuer} a-t-il réalisé de revenus sur l'exercice {year} ?"]),
+    "marge": ("Rentabilité",
+              "La marge opérationnelle ressort à {v} sur l'exercice {year}.",
+              ["Quelle est la marge opérationnelle de {issuer} en {year} ?",
+               "Quel taux de rentabilité opérationnelle pour {issuer} en {year} ?"]),
+    "dette": ("Structure financière",
+              "L'endettement net s'élève à {v} au 31 décembre {year}.",
+              ["Quelle est la dette nette de {issuer} fin {year} ?",
+               "À combien s'élève l'endettement net de {issuer} au 31 décembre {year} ?"]),
+    "dividende": ("Actionnaires",
+                  "Le conseil proposera un dividende de {v} par action au titre de {year}.",
+                  ["Quel dividende {issuer} verse-t-il au titre de {year} ?",
+                   "Combien {issuer} distribue-t-il par action pour {year} ?"]),
+    "effectifs": ("Ressources humaines",
+                  "Le groupe employait {v} collaborateurs à la fin de {year}.",
+                  ["Combien de salariés compte {issuer} fin {year} ?",
+                   "Quel est l'effectif de {issuer} en {year} ?"]),
+    "capex": ("Investissements",
+              "Les investissements industriels ont totalisé {v} en {year}.",
+              ["Quel est le montant des capex de {issuer} en {year} ?",
+               "Combien {issuer} a-t-il investi en {year} ?"]),
+    "segment": ("Segments",
+                "Le segment {segment} représente {v} du chiffre d'affaires en {year}.",
+                ["Quel poids pour le segment {segment} chez {issuer} en {year} ?",
+                 "Quelle part du chiffre d'affaires de {issuer} vient du segment {segment} en {year} ?"]),
+    "risque": ("Facteurs de risque",
+               "Principal facteur de risque identifié pour {year} : {v}.",
+               ["Quel est le principal risque de {issuer} en {year} ?",
+                "Quel facteur de risque {issuer} met-il en avant pour {year} ?"]),
+}
+
+
+@dataclass
+class QA:
+    question: str
+    source: str        # document attendu
+    key: str           # valeur chiffrée unique contenue dans le passage attendu
+    metric: str
+
+
+def _value(metric: str, rng: random.Random, used: set) -> str:
+    while True:
+        if metric in ("ca", "dette", "capex"):
+            v = f"{rng.randint(150, 48000):,} M€".replace(",", " ")
+        elif metric in ("marge", "segment"):
+            v = f"{rng.uniform(3, 45):.1f} %".replace(".", ",")
+        elif metric == "dividende":
+            v = f"{rng.uniform(0.2, 9.5):.2f} €".replace(".", ",")
+        elif metric == "effectifs":
+            v = f"{rng.randint(800, 190000):,}".replace(",", " ")
+        else:
+            v = rng.choice(RISKS) + f" (exposition {rng.randint(2, 40)} %)"
+        if v not in used:
+            used.add(v)
+            return v
+
+
+def make_corpus(n_issuers: int = len(ISSUERS), years: Sequence[int] = YEARS, filler: int = 4,
+                seed: int = 0) -> Tuple[List[Document], List[QA]]:
+    """
+    Un rapport annuel par (émetteur, année) : une section par métrique, chaque section
+    noyée dans `filler` phrases génériques. Renvoie (documents, questions étiquetées).
+    Le nom de l'émetteur n'apparaît qu'en tête de rapport et dans les pieds de page :
+    un découpage trop fin perd ce contexte, ce que l'évaluation doit pouvoir montrer.
+    """
+    rng = random.Random(seed)
+    docs, qa = [], []
+    for issuer in ISSUERS[:n_issuers]:
+        for year in years:
+            source = f"data/{issuer.replace(' ', '_')}_rapport_{year}.pdf"
+            used: set = set()
+            parts = [f"Rapport annuel {year} — {issuer}\n\n"
+                     f"{issuer} présente ses résultats de l'exercice {year}."]
+            metrics = list(FACT_TEMPLATES)
+            rng.shuffle(metrics)
+            for metric in metrics:
+                title, sentence, questions = FACT_TEMPLATES[metric]
+                v = _value(metric, rng, used)
+                segment = rng.choice(SEGMENTS)
+                fact = sentence.format(v=v, year=year, driver=rng.choice(DRIVERS), segment=segment)
+                body = rng.sample(BOILERPLATE, filler)
+                body.insert(rng.randint(0, filler), fact)
+                parts.append(f"{title}\n" + " ".join(body))
+                if len(parts) % 3 == 0:                  # pied de page, comme dans un PDF
+                    parts.append(f"{issuer} — Rapport annuel {year} — page {len(parts) // 3}")
+                q = rng.choice(questions).format(issuer=issuer, year=year, segment=segment)
+                qa.append(QA(question=q, source=source, key=v, metric=metric))
+            docs.append(Document(page_content="\n\n".join(parts), metadata={"source": source}))
+    return docs, qa
+
+
+# --- Embedding local déterministe ---
+
+class HashingEmbedder:
+    """
+    Embedding par hachage (mots + n-grammes de caractères), signé et normalisé L2.
+    Sans modèle ni réseau : sert de référence stable pour comparer des paramètres.
+    """
+
+    def __init__(self, dim: int = 512, ngram: int = 4):
+        self.dim = dim
+        self.ngram = ngram
+
+    def _features(self, text: str) -> List[str]:
+        words = re.findall(r"\w+", text.lower())
+        feats = list(words)
+        for w in words:
+            padded = f"#{w}#"
+            feats += [padded[i:i + self.ngram] for i in range(max(1, len(padded) - self.ngram + 1))]
+        return feats
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            h = np.fromiter((zlib.crc32(f.encode()) for f in self._features(text)), dtype=np.uint32)
+            sign = np.where(h & 1, 1.0, -1.0).astype(np.float32)
+            np.add.at(out[row], (h >> 1) % self.dim, sign)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+
+# --- Index FAISS ---
+
+def build_index(kind: str, vecs: np.ndarray):
+    """'flat' (exact, celui de rag/ingest.py), 'hnsw' (graphe) ou 'ivf' (listes inversées)."""
+    dim = vecs.shape[1]
+    if kind == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = 64
+    elif kind == "ivf":
+        nlist = max(1, min(int(np.sqrt(len(vecs))), len(vecs) // 39))   # FAISS veut ~39 points par centroïde
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.quantizer_ref = quantizer         # garde le quantizer en vie côté Python
+        index.train(vecs)
+        index.nprobe = max(1, nlist // 4)
+    else:
+        raise ValueError(f"Type d'index inconnu: {kind} (attendu: flat, hnsw, ivf)")
+    index.add(vecs)
+    return index
+
+
+# --- Évaluation ---
+
+@dataclass
+class EvalRow:
+    chunk_size: int
+    chunk_overlap: int
+    index: str
+    k: int
+    chunks: int
+    recall: float          # recall@k : part des questions dont un passage attendu est dans le top k
+    mrr: float             # MRR@k : moyenne de 1/rang du premier passage attendu (0 au-delà de k)
+    index_bytes: int
+    build_s: float         # découpage + embeddings + construction de l'index
+    query_p50_ms: float    # embedding de la question + recherche
+    query_p95_ms: float
+
+
+def _first_hit(ids: np.ndarray, chunks: List[Document], qa: QA) -> Optional[int]:
+    for rank, i in enumerate(ids, 1):
+        if i < 0:
+            break
+        d = chunks[i]
+        if d.metadata.get("source") == qa.source and qa.key in d.page_content:
+            return rank
+    return None
+
+
+def _embed_query(embedder, text: str) -> np.ndarray:
+    if hasattr(embedder, "embed_query"):      # chemin "requête" réel du backend
+        return np.asarray([embedder.embed_query(text)], dtype=np.float32)
+    return embedder.embed([text])
+
+
+def evaluate(docs: List[Document], qa: List[QA], chunk_size: int, chunk_overlap: int,
+             ks: Sequence[int], kinds: Sequence[str], embedder=None) -> List[EvalRow]:
+    embedder = embedder or HashingEmbedder()
+    t0 = time.perf_counter()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = splitter.split_documents(docs)
+    if hasattr(embedder, "fit"):             # backend 'local' : projection apprise sur les chunks
+        embedder.fit([c.page_content for c in chunks])
+    vecs = embedder.embed([c.page_content for c in chunks])
+    embed_s = time.perf_counter() - t0
+    max_k = max(ks)
+
+    rows = []
+    for kind in kinds:
+        t1 = time.perf_counter()
+        index = build_index(kind, vecs)
+        build_s = embed_s + time.perf_counter() - t1
+        size = int(faiss.serialize_index(index).nbytes)
+
+        ranks, lat = [], []
+        for item in qa:
+            t2 = time.perf_counter()
+            qv = _embed_query(embedder, item.question)
+            _, ids = index.search(qv, max_k)
+            lat.append((time.perf_counter() - t2) * 1000.0)
+            ranks.append(_first_hit(ids[0], chunks, item))
+
+        p50, p95 = np.percentile(lat, [50, 95])
+        for k in ks:
+            hits = [1.0 / r if r is not None and r <= k else 0.0 for r in ranks]
+            rows.append(EvalRow(
+                chunk_size=chunk_size, chunk_overlap=chunk_overlap, index=kind, k=k, chunks=len(chunks),
+                recall=round(sum(h > 0 for h in hits) / len(qa), 4), mrr=round(float(np.mean(hits)), 4),
+                index_bytes=size, build_s=round(build_s, 4),
+                query_p50_ms=round(float(p50), 3), query_p95_ms=round(float(p95), 3)))
+    return rows
+
+
+def sweep(chunk_sizes: Sequence[int], overlaps: Sequence[int], ks: Sequence[int], kinds: Sequence[str],
+          n_issuers: int = len(ISSUERS), seed: int = 0, embedder=None) -> List[EvalRow]:
+    docs, qa = make_corpus(n_issuers=n_issuers, seed=seed)
+    rows = []
+    for size in chunk_sizes:
+        for overlap in overlaps:
+            if overlap >= size:
+                continue
+            rows += evaluate(docs, qa, size, overlap, ks, kinds, embedder)
+    return rows
+
+
+def print_report(rows: List[EvalRow]) -> None:
+    print(f"{'chunk':>6} {'overl':>5} {'index':>5} {'k':>3} {'chunks':>6} {'recall':>7} {'MRR':>6} "
+          f"{'taille':>9} {'build(s)':>9} {'p50(ms)':>8} {'p95(ms)':>8}")
+    for r in rows:
+        print(f"{r.chunk_size:>6} {r.chunk_overlap:>5} {r.index:>5} {r.k:>3} {r.chunks:>6} {r.recall:>7.3f} "
+              f"{r.mrr:>6.3f} {r.index_bytes / 1024:>7.0f}Ko {r.build_s:>9.3f} {r.query_p50_ms:>8.3f} "
+              f"{r.query_p95_ms:>8.3f}")
+    # meilleur réglage : recall, puis MRR, puis latence
+    best = max(rows, key=lambda r: (r.recall, r.mrr, -r.query_p50_ms))
+    print(f"\n🏆 Meilleur réglage : chunk_size={best.chunk_size}, chunk_overlap={best.chunk_overlap}, "
+          f"index={best.index}, k={best.k} (recall@k={best.recall:.3f}, MRR={best.mrr:.3f})")
+
+
+def _embedder(name: str):
+    if name == "local":
+        from rag.embeddings import LocalEmbeddings
+        return LocalEmbeddings()
+    return HashingEmbedder()
+
+
+def _ints(s: str) -> List[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def main(argv=None) -> None:
+    p = argparse.ArgumentParser(description="Évaluation hors ligne du RAG (recall@k, MRR, taille, latence).")
+    p.add_argument("--chunk-sizes", default="500,1000,1500")
+    p.add_argument("--overlaps", default="0,150,300")
+    p.add_argument("--k", default="2,4,8")
+    p.add_argument("--index", default="flat,hnsw,ivf")
+    p.add_argument("--issuers", type=int, default=len(ISSUERS), help="nombre d'émetteurs du corpus (3 rapports chacun)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--embeddings", default="hash", choices=["hash", "local"],
+                   help="hash : référence par hachage ; local : backend 'local' de rag/embeddings.py")
+    p.add_argument("--json", help="écrit les résultats dans ce fichier")
+    args = p.parse_args(argv)
+
+    rows = sweep(_ints(args.chunk_sizes), _ints(args.overlaps), _ints(args.k),
+                 [x.strip() for x in args.index.split(",") if x.strip()], args.issuers, args.seed,
+                 _embedder(args.embeddings))
+    print_report(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([asdict(r) for r in rows], f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Index de "faits" financiers structurés (KPI) extraits à l'ingestion.
+
+Plutôt que de demander à un LLM de relire des extraits de 700 caractères pour
+trouver UN chiffre, on extrait au moment de l'ingestion les lignes de tableaux
+des rapports (chiffre d'affaires, revenus par segment, BPA, marges...) et on
+les range dans une base SQLite locale, indexée par (émetteur, métrique, période).
+
+Ce module fournit :
+1.  `extract_facts(docs)` : parcourt les pages (objets `Document` LangChain) et
+    repère les tableaux "libellé + montants par année".
+2.  `FactStore` : la base SQLite (insertion idempotente, recherche exacte,
+    séries temporelles).
+3.  `normalize_metric` : associe les libellés FR/EN à un nom canonique
+    (ex: "Data Center", "centre de données" -> "data_center").
+
+La base est (re)construite par `python -m rag.ingest` et lue par l'outil
+`app/tools/financial_facts.py`.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from app.config import FACTS_DB
+
+# --- Dictionnaire des métriques ---
+# nom canonique -> libellés reconnus (minuscules). Les plus spécifiques d'abord :
+# "total revenue" doit gagner sur "revenue", "diluted" sur "net income".
+METRICS: Dict[str, List[str]] = {
+    "eps_diluted": ["diluted net income per share", "net income per share diluted", "diluted eps",
+                    "diluted", "bpa dilué", "résultat dilué par action"],
+    "eps_basic": ["basic net income per share", "net income per share basic", "basic eps",
+                  "basic", "bpa de base", "résultat de base par action"],
+    "gross_margin": ["gross margin", "marge brute"],
+    "gross_profit": ["gross profit", "bénéfice brut"],
+    "operating_income": ["operating income", "income from operations", "résultat opérationnel",
+                         "résultat d'exploitation"],
+    "net_income": ["net income", "résultat net", "bénéfice net"],
+    "operating_expenses": ["total operating expenses", "operating expenses", "charges opérationnelles"],
+    "cost_of_revenue": ["cost of revenue", "cost of sales", "coût des ventes"],
+    "research_development": ["research and development", "recherche et développement"],
+    "data_center": ["data center", "datacenter", "centre de données", "centres de données"],
+    "gaming": ["gaming", "jeux vidéo", "jeu vidéo"],
+    "professional_visualization": ["professional visualization", "visualisation professionnelle"],
+    "automotive": ["automotive", "automobile"],
+    "oem_other": ["oem and other", "oem & other", "oem et autres"],
+    "free_cash_flow": ["free cash flow", "flux de trésorerie disponible"],
+    "revenue": ["total revenue", "revenue", "revenues", "net sales", "total net sales",
+                "chiffre d'affaires", "revenus", "ventes"],
+}
+
+_LABEL_TO_METRIC = sorted(
+    ((label, metric) for metric, labels in METRICS.items() for label in labels),
+    key=lambda x: -len(x[0]),
+)
+
+_YEAR_RE = re.compile(r"\b(?:fy\s?|fiscal\s+(?:year\s+)?|exercice\s+)?((?:19|20)\d{2})\b", re.IGNORECASE)
+_NUM_RE = re.compile(r"\(?-?[$€]?\s?\d[\d,]*(?:\.\d+)?\s?%?\)?")
+
+
+class Fact(NamedTuple):
+    issuer: str
+    metric: str
+    period: str
+    value: float
+    unit: str
+    label: str
+    source: str
+    page: int
+
+
+def normalize_metric(text: str) -> Optional[str]:
+    """
+    Libellé libre (FR/EN) ou nom canonique -> nom canonique de métrique, ou None.
+    Si plusieurs métriques apparaissent ("revenus data center"), la plus
+    spécifique gagne : un segment l'emporte sur le chiffre d'affaires total.
+    """
+    t = re.sub(r"\s+", " ", text.strip().lower().replace("_", " "))
+    if t.replace(" ", "_") in METRICS:
+        return t.replace(" ", "_")
+    found = []
+    for label, metric in _LABEL_TO_METRIC:       # libellés les plus longs d'abord
+        if re.search(rf"(?<!\w){re.escape(label)}(?!\w)", t) and metric not in found:
+            found.append(metric)
+    if len(found) > 1 and "revenue" in found:
+        found.remove("revenue")
+    return found[0] if found else None
+
+
+def issuer_from_source(source: str) -> str:
+    """'data/NVIDIA_10K_2024.pdf' -> 'NVIDIA' (premier mot du nom de fichier)."""
+    stem = os.path.splitext(os.path.basename(source or ""))[0]
+    first = re.split(r"[\s_\-.]+", stem)[0] if stem else ""
+    return first.upper() or "INCONNU"
+
+
+def _parse_number(tok: str) -> Optional[float]:
+    neg = tok.strip().startswith("(") and tok.strip().endswith(")")
+    digits = re.sub(r"[^\d.\-]", "", tok)
+    if not digits or digits in {"-", ".", "-."}:
+        return None
+    try:
+        val = float(digits)
+    except ValueError:
+        return None
+    return -abs(val) if neg else val
+
+
+def _header_years(line: str) -> List[str]:
+    """Ligne d'en-tête de tableau : au moins deux années distinctes (ex: 'Fiscal 2024 2023 Change')."""
+    years = [m.group(1) for m in _YEAR_RE.finditer(line)]
+    return years if len(years) >= 2 and len(set(years)) == len(years) else []
+
+
+def _row(line: str):
+    """'Data Center $ 47,525 $ 15,005 217 %' -> ('Data Center', [(47525.0, ''), (15005.0, ''), (217.0, '%')])"""
+    m = re.match(r"^\s*([A-Za-zÀ-ÿ&'’][A-Za-zÀ-ÿ&'’ ,/()\-]*?)\s*[:$€]?\s*(\(?-?[$€]?\s?\d.*)$", line)
+    if not m:
+        return None, []
+    label, rest = m.group(1).strip(" ,:-"), m.group(2)
+    values = []
+    for tok in _NUM_RE.findall(rest):
+        v = _parse_number(tok)
+        if v is not None:
+            values.append((v, "%" if "%" in tok else ""))
+    return label, values
+
+
+def extract_facts(docs: Iterable, issuer: Optional[str] = None) -> List[Fact]:
+    """
+    Extrait les faits des pages. Heuristique "tableau" :
+    une ligne d'en-tête avec ≥ 2 années fixe l'ordre des colonnes ; chaque ligne
+    suivante "libellé montant montant ..." dont le libellé est une métrique connue
+    donne un fait par année (les colonnes en plus, ex: variation %, sont ignorées).
+    """
+    facts: Dict[tuple, Fact] = {}
+    for doc in docs:
+        meta = getattr(doc, "metadata", {}) or {}
+        source = meta.get("source") or meta.get("file_path") or ""
+        page = int(meta.get("page", 0) or 0)
+        who = issuer or issuer_from_source(source)
+        years: List[str] = []
+        for line in (doc.page_content or "").splitlines():
+            line = line.replace("\xa0", " ").strip()
+            if not line:
+                continue
+            hdr = _header_years(line)
+            label, values = _row(line) if not hdr else (None, [])
+            if hdr and not values:
+                years = hdr
+                continue
+            if not years or not label or len(values) < len(years):
+                continue
+            metric = normalize_metric(label)
+            if metric is None:
+                continue
+            for year, (val, unit) in zip(years, values):
+                key = (who, metric, year)
+                # la première occurrence (tableau de synthèse) gagne
+                facts.setdefault(key, Fact(who, metric, year, val, unit, label, source, page))
+    return list(facts.values())
+
+
+class FactStore:
+    """Base SQLite des faits, indexée par (issuer, metric, period)."""
+
+    def __init__(self, path: str = FACTS_DB):
+        self.path = path
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as c:
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS facts ("
+                " issuer TEXT NOT NULL, metric TEXT NOT NULL, period TEXT NOT NULL,"
+                " value REAL NOT NULL, unit TEXT, label TEXT, source TEXT, page INTEGER,"
+                " PRIMARY KEY (issuer, metric, period))"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        # une connexion par thread (sqlite3 n'aime pas le partage entre threads)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def upsert(self, facts: Iterable[Fact]) -> int:
+        rows = [tuple(f) for f in facts]
+        with self._conn() as c:
+            c.executemany("INSERT OR REPLACE INTO facts VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def clear(self, issuer: Optional[str] = None) -> None:
+        with self._conn() as c:
+            if issuer:
+                c.execute("DELETE FROM facts WHERE issuer = ?", (issuer.upper(),))
+            else:
+                c.execute("DELETE FROM facts")
+
+    def get(self, issuer: str, metric: str, period: str) -> Optional[Fact]:
+        row = self._conn().execute(
+            "SELECT * FROM facts WHERE issuer = ? AND metric = ? AND period = ?",
+            (issuer.upper(), metric, str(period)),
+        ).fetchone()
+        return Fact(*row) if row else None
+
+    def series(self, issuer: str, metric: str) -> List[Fact]:
+        rows = self._conn().execute(
+            "SELECT * FROM facts WHERE issuer = ? AND metric = ? ORDER BY period",
+            (issuer.upper(), metric),
+        ).fetchall()
+        return [Fact(*r) for r in rows]
+
+    def issuers(self) -> List[str]:
+        return [r[0] for r in self._conn().execute("SELECT DISTINCT issuer FROM facts ORDER BY issuer")]
+
+    def metrics(self, issuer: str) -> List[str]:
+        return [r[0] for r in self._conn().execute(
+            "SELECT DISTINCT metric FROM facts WHERE issuer = ? ORDER BY metric", (issuer.upper(),))]
+
+
+if __name__ == "__main__":
+    # Petit test : résumé du contenu de la base
+    store = FactStore()
+    for who in store.issuers():
+        print(f"{who}: {', '.join(store.metrics(who))}")
@@ -4,22 +4,34 @@ Script d'Ingestion pour le RAG (Retrieval-Augmented Generation)
 Ce script est responsable de la "mémoire" de l'assistant. Il fait les opérations suivantes :
 1.  Il lit les documents (PDF, DOCX) depuis le dossier `data/` (défini dans config.py).
 2.  Il les découpe en petits morceaux ("chunks") pour qu'ils soient digestes.
-3.  Il les transforme en "vecteurs" (embeddings) via l'API OpenAI.
+3.  Il les transforme en "vecteurs" (embeddings) via le backend configuré
+    (EMBEDDINGS_BACKEND : API OpenAI, ou modèle local sans réseau, voir `rag/embeddings.py`).
 4.  Il stocke ces vecteurs dans une base de données locale (FAISS ou Chroma)
     dans le dossier `vectorstore/`.
+5.  Il extrait les chiffres clés des tableaux (chiffre d'affaires, segments, BPA...)
+    dans la base de faits SQLite (voir `rag/facts.py`).
 
 Pour l'exécuter :
 1.  Placez vos fichiers PDF/DOCX dans le dossier `data/`.
 2.  Assurez-vous que votre .env est configuré (OPENAI_API_KEY).
 3.  Exécutez `python rag/ingest.py` depuis la racine du projet.
+
+Espaces de noms (un corpus par desk / client, voir `rag/namespaces.py`) :
+    python -m rag.ingest --namespace desk-taux                  # documents de data/desk-taux/
+    python -m rag.ingest --namespace client-42 --docs-dir /srv/client-42
+L'index et la base de faits de l'espace sont écrits dans leur propre dossier ;
+les autres espaces (et l'index par défaut) ne sont pas touchés.
 """
 
-import os, glob
-from app.config import DOCS_DIR, PERSIST_DIR, VS_BACKEND     # <= pas app.config
+import argparse, os, glob
+from app.config import DOCS_DIR, EMBEDDINGS_BACKEND, VS_BACKEND     # <= pas app.config
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader
-from langchain_openai import OpenAIEmbeddings
+from app.llm_scheduler import priority
 from langchain_community.vectorstores import FAISS  
+from rag.embeddings import LocalEmbeddings, get_embeddings, write_manifest
+from rag.facts import FactStore, extract_facts
+from rag.namespaces import docs_dir, facts_db, new_generation, publish, resolve
 # --- Fonctions ---
 
 def load_docs(data_dir=DOCS_DIR):
@@ -51,25 +63,42 @@ def load_docs(data_dir=DOCS_DIR):
         
     return docs
 
-def build_index():
+def build_index(namespace=None, data_dir=None):
     """
     Fonction principale qui construit l'index vectoriel.
     - Charge les documents
     - Les découpe (chunking)
     - Crée les embeddings
     - Sauvegarde l'index sur le disque.
+
+    Args:
+        namespace (str): L'espace de noms (desk, client) à (re)construire.
+                         None = espace par défaut (PERSIST_DIR, DOCS_DIR).
+        data_dir (str): Dossier des documents ; par défaut celui de l'espace
+                        (DOCS_DIR/<namespace>/).
     """
-    
+    namespace = resolve(namespace)
+    data_dir = data_dir or docs_dir(namespace)
+
     # --- 1. Chargement ---
-    docs = load_docs()
+    docs = load_docs(data_dir)
     
     # Vérification de sécurité : si data/ est vide, on arrête.
     if not docs:
-        raise SystemExit(f"ERREUR: Aucun document .pdf ou .docx trouvé dans {DOCS_DIR}/. "
+        raise SystemExit(f"ERREUR: Aucun document .pdf ou .docx trouvé dans {data_dir}/. "
                          "Veuillez ajouter des fichiers avant de lancer l'ingestion.")
     
     print(f"Chargé {len(docs)} pages/documents.")
 
+    # --- 1bis. Faits structurés (KPI) ---
+    # On repart d'une base vide : les faits reflètent exactement le contenu de data/.
+    # Chaque espace a sa propre base (vider celle d'un desk n'efface pas les autres).
+    facts = extract_facts(docs)
+    store = FactStore(facts_db(namespace))
+    store.clear()
+    store.upsert(facts)
+    print(f"{len(facts)} faits financiers extraits ({', '.join(store.issuers()) or 'aucun émetteur'}).")
+
     # --- 2. Découpage (Chunking) ---
     # 
     # Nous découpons les longs documents en morceaux plus petits.
@@ -83,32 +112,49 @@ def build_index():
     print(f"Documents découpés en {len(splits)} morceaux (chunks).")
 
     # --- 3. Embeddings (Vectorisation) ---
-    # Initialise le modèle d'embedding d'OpenAI.
+    # Initialise le modèle d'embedding choisi par EMBEDDINGS_BACKEND.
     # C'est lui qui va lire chaque "chunk" et le transformer en
     # une liste de chiffres (vecteur) qui représente son "sens".
-    # Il utilise OPENAI_API_KEY automatiquement.
-    embeddings = OpenAIEmbeddings()
-    
-    print("Modèle d'embeddings OpenAI initialisé.")
+    # - 'openai' : utilise OPENAI_API_KEY ; les requêtes passent par l'ordonnanceur
+    #   partagé, en priorité "ingest" (une ingestion lancée à côté du chat ne lui
+    #   vole pas le débit OpenAI).
+    # - 'local' : la projection SVD est apprise ici, sur les chunks eux-mêmes.
+    embeddings = get_embeddings()
+    if isinstance(embeddings, LocalEmbeddings):
+        embeddings = LocalEmbeddings().fit([s.page_content for s in splits])
+
+    print(f"Modèle d'embeddings initialisé (backend: {EMBEDDINGS_BACKEND}).")
 
     # --- 4. Stockage (Vector Store) ---
     # Lit la variable VS_BACKEND de notre config pour décider
     # quelle base de données utiliser.
     
     print("Construction de l'index FAISS...")
-    vectordb = FAISS.from_documents(splits, embeddings)
-    print(f"Sauvegarde de l'index FAISS dans {PERSIST_DIR}...")
-    vectordb.save_local(PERSIST_DIR)
+    with priority("ingest"):
+        vectordb = FAISS.from_documents(splits, embeddings)
+    # Index, manifeste et modèle local sont écrits ensemble dans une génération neuve,
+    # publiée d'un coup (rag/namespaces.py) : un worker qui charge pendant l'ingestion
+    # lit l'ancienne génération complète, jamais un index avec le modèle d'une autre.
+    persist_dir = new_generation(namespace)
+    print(f"Sauvegarde de l'index FAISS dans {persist_dir}...")
+    write_manifest(embeddings, persist_dir=persist_dir)
+    vectordb.save_local(persist_dir)
+    publish(namespace, persist_dir)
 
 
     print("\n--- Ingestion Terminée ---")
-    print(f"✅ Index construit et sauvegardé dans {PERSIST_DIR}")
+    print(f"✅ Index de l'espace '{namespace}' construit et sauvegardé dans {persist_dir}")
     print(f"   (Backend utilisé: {VS_BACKEND})")
     print(f"   Total chunks indexés: {len(splits)}")
+    print(f"   Faits KPI indexés: {len(facts)} -> {store.path}")
 
 # --- Point d'Entrée du Script ---
 # Cette convention Python signifie:
 # "Si j'exécute ce fichier directement (python rag/ingest.py),
 #  alors exécute la fonction build_index()."
 if __name__ == "__main__":
-    build_index()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Indexation des documents pour le RAG (+ faits KPI).")
+    parser.add_argument("--namespace", help="espace de noms à construire (desk, client) ; défaut : index principal")
+    parser.add_argument("--docs-dir", help="dossier des documents (défaut : DOCS_DIR ou DOCS_DIR/<namespace>)")
+    args = parser.parse_args()
+    build_index(namespace=args.namespace, data_dir=args.docs_dir)
\ No newline at end of file
@@ -0,0 +1,113 @@
+# rag/namespaces.py
+"""
+Espaces de noms du RAG : un corpus (index vectoriel + base de faits) par desk ou client.
+
+- L'espace par défaut (RAG_DEFAULT_NAMESPACE) est l'index historique : PERSIST_DIR,
+  FACTS_DB et les documents de DOCS_DIR. Rien ne change pour une installation existante.
+- Un autre espace `desk-taux` a son propre dossier RAG_NAMESPACES_DIR/desk-taux/
+  (index FAISS, manifeste d'embeddings, facts.sqlite), alimenté depuis DOCS_DIR/desk-taux/ :
+      python -m rag.ingest --namespace desk-taux
+- Chaque ingestion écrit index + manifeste + modèle local dans une nouvelle génération
+  (<dossier de l'espace>/gen-<horodatage>/) puis bascule le fichier CURRENT par
+  os.replace : un worker charge toujours un index et SON modèle d'embeddings, jamais
+  un mélange. Sans CURRENT (index antérieur), les fichiers sont lus à la racine.
+
+Module léger (ni FAISS ni LangChain) : importable par l'agent, le serveur et les outils.
+"""
+import os
+import re
+import shutil
+import time
+from typing import List, Optional
+
+from app.config import DOCS_DIR, FACTS_DB, PERSIST_DIR, RAG_DEFAULT_NAMESPACE, RAG_NAMESPACES_DIR
+
+# Le nom devient un nom de dossier : pas de '/', '..', espaces...
+NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+INDEX_FILES = ("index.faiss", "index.pkl")          # FAISS.save_local écrit le .pkl en dernier
+CURRENT_FILE = "CURRENT"                            # nom de la génération active
+GEN_PREFIX = "gen-"
+KEEP_GENERATIONS = 2        # la précédente reste lisible pour un worker en train de la charger
+
+
+def resolve(namespace: Optional[str] = None) -> str:
+    """Nom validé (None ou vide -> espace par défaut) ; ValueError si le nom est invalide."""
+    namespace = namespace or RAG_DEFAULT_NAMESPACE
+    if not NAME_RE.match(namespace):
+        raise ValueError(f"Espace de noms RAG invalide: {namespace!r} "
+                         "(lettres, chiffres, '-' et '_', 64 caractères au plus)")
+    return namespace
+
+
+def is_default(namespace: Optional[str]) -> bool:
+    return resolve(namespace) == RAG_DEFAULT_NAMESPACE
+
+
+def root_dir(namespace: Optional[str] = None) -> str:
+    """Dossier de l'espace (générations d'index, base de faits)."""
+    return PERSIST_DIR if is_default(namespace) else os.path.join(RAG_NAMESPACES_DIR, resolve(namespace))
+
+
+def _current(namespace: Optional[str]) -> Optional[str]:
+    try:
+        with open(os.path.join(root_dir(namespace), CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def index_dir(namespace: Optional[str] = None) -> str:
+    """Dossier de l'index vectoriel actif (et du manifeste / modèle d'embeddings) de l'espace."""
+    gen = _current(namespace)
+    return os.path.join(root_dir(namespace), gen) if gen else root_dir(namespace)
+
+
+def docs_dir(namespace: Optional[str] = None) -> str:
+    """Dossier des documents sources de l'espace."""
+    return DOCS_DIR if is_default(namespace) else os.path.join(DOCS_DIR, resolve(namespace))
+
+
+def facts_db(namespace: Optional[str] = None) -> str:
+    """Base SQLite des faits KPI de l'espace."""
+    return FACTS_DB if is_default(namespace) else os.path.join(root_dir(namespace), "facts.sqlite")
+
+
+def index_version(namespace: Optional[str] = None) -> Optional[str]:
+    """Génération active de l'index (None s'il n'existe pas) : change à chaque réingestion."""
+    gen = _current(namespace)
+    if gen:
+        return gen
+    try:                                            # ancienne disposition : date des fichiers
+        return "mtime-%r" % max(os.path.getmtime(os.path.join(root_dir(namespace), f)) for f in INDEX_FILES)
+    except OSError:
+        return None
+
+
+def new_generation(namespace: Optional[str] = None) -> str:
+    """Dossier neuf où écrire la prochaine génération (invisible tant qu'elle n'est pas publiée)."""
+    path = os.path.join(root_dir(namespace), f"{GEN_PREFIX}{time.time_ns()}")
+    os.makedirs(path)
+    return path
+
+
+def publish(namespace: Optional[str], gen_dir: str) -> None:
+    """Bascule atomiquement CURRENT sur `gen_dir`, puis supprime les générations trop anciennes."""
+    root = root_dir(namespace)
+    tmp = os.path.join(root, CURRENT_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(gen_dir))
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))
+    gens = sorted((g for g in os.listdir(root) if g.startswith(GEN_PREFIX)),
+                  key=lambda g: int(g[len(GEN_PREFIX):]) if g[len(GEN_PREFIX):].isdigit() else 0)
+    for old in gens[:-KEEP_GENERATIONS]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+
+
+def list_namespaces() -> List[str]:
+    """Espaces dont l'index existe sur disque (le défaut en premier)."""
+    names = [RAG_DEFAULT_NAMESPACE] if index_version(None) is not None else []
+    if os.path.isdir(RAG_NAMESPACES_DIR):
+        for name in sorted(os.listdir(RAG_NAMESPACES_DIR)):
+            if NAME_RE.match(name) and name != RAG_DEFAULT_NAMESPACE and index_version(name) is not None:
+                names.append(name)
+    return names
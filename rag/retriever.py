@@ -9,50 +9,144 @@ Son rôle est de :
 1.  Charger l'index vectoriel (Chroma ou FAISS) depuis le disque.
 2.  Le transformer en un objet "Retriever" que LangChain peut interroger.
 3.  Spécifier *comment* chercher (par exemple, ramener les "K" meilleurs résultats).
+
+Chaque espace de noms (desk, client : voir rag/namespaces.py) a son propre index.
+`RetrieverCache` les charge à la demande et ne garde en mémoire que les
+RAG_MAX_NAMESPACES plus récemment interrogés.
 """
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
 
-from app.config import PERSIST_DIR, VS_BACKEND
-from langchain_openai import OpenAIEmbeddings
+from app.config import RAG_MAX_NAMESPACES, VS_BACKEND
+from app.tracing import METRICS, span
+from rag.embeddings import check_manifest, get_embeddings
+from rag.namespaces import index_dir, index_version, resolve
 from langchain_community.vectorstores import FAISS
 
 
-
-def get_retriever(k=4):
+def get_retriever(k=4, namespace=None):
     """
     Initialise et retourne un objet Retriever configuré.
 
     Cette fonction lit la configuration (VS_BACKEND) pour savoir
     quelle base de données (Chroma ou FAISS) charger depuis le
-    dossier `PERSIST_DIR`.
+    dossier de l'espace de noms (`PERSIST_DIR` pour l'espace par défaut).
 
     Args:
         k (int): Le "TOP_K". C'est le nombre de chunks
                  les plus pertinents à ramener pour une question donnée.
                  Par défaut, 4.
+        namespace (str): L'espace de noms (desk, client) dont on charge
+                 l'index. None = espace par défaut.
 
     Returns:
         langchain.schema.vectorstore.VectorStoreRetriever:
             Un objet retriever prêt à être utilisé par un outil ou un agent.
     """
-    print(f"Initialisation du retriever (backend: {VS_BACKEND}, k={k})...")
+    path = index_dir(namespace)
+    print(f"Initialisation du retriever (backend: {VS_BACKEND}, espace: {resolve(namespace)}, k={k})...")
 
     # Initialise le *même* modèle d'embeddings que celui utilisé
-    # lors de l'ingestion (ingest.py).
-    embeddings = OpenAIEmbeddings()
-
-    embeddings = OpenAIEmbeddings()
+    # lors de l'ingestion (ingest.py) : même backend, et pour 'local'
+    # la projection apprise sauvegardée à côté de l'index de l'espace.
+    check_manifest(persist_dir=path)
+    embeddings = get_embeddings(persist_dir=path)
     db = FAISS.load_local(
-    PERSIST_DIR,
-    embeddings,
-    allow_dangerous_deserialization=True
-     )
+        path,
+        embeddings,
+        allow_dangerous_deserialization=True
+    )
     return db.as_retriever(search_kwargs={"k": k})
 
+
+class RetrieverCache:
+    """
+    Retrievers par espace de noms, chargés au premier usage et gardés en LRU.
+
+    - Au-delà de `max_namespaces` index en mémoire, le moins récemment interrogé
+      est déchargé (il sera rechargé depuis le disque s'il redevient actif).
+    - Un seul chargement à la fois par espace (les requêtes concurrentes l'attendent),
+      sans bloquer les requêtes des autres espaces.
+    - Un index réingéré (nouvelle génération publiée, voir rag/namespaces.py) est rechargé.
+    """
+
+    def __init__(self, max_namespaces: int = RAG_MAX_NAMESPACES, k: int = 4,
+                 loader: Optional[Callable[..., Any]] = None):
+        self.max_namespaces = max(1, max_namespaces)
+        self.k = k
+        self._loader = loader or get_retriever
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()   # espace -> (retriever, version)
+        self._loading: Dict[str, threading.Lock] = {}   # seulement espaces en mémoire ou en chargement
+        self._lock = threading.Lock()
+
+    def _drop_gate(self, namespace: str) -> None:
+        # appelé sous self._lock : un verrou libre d'un espace absent du cache ne sert plus
+        gate = self._loading.get(namespace)
+        if gate is not None and not gate.locked() and namespace not in self._entries:
+            del self._loading[namespace]
+
+    def _fresh(self, namespace: str, version: Optional[str]) -> Optional[Any]:
+        # appelé sous self._lock
+        entry = self._entries.get(namespace)
+        if entry is None or entry[1] != version:
+            return None
+        self._entries.move_to_end(namespace)
+        return entry[0]
+
+    def get(self, namespace: Optional[str] = None) -> Any:
+        """Retriever de l'espace (chargé si besoin) ; propage l'erreur de chargement."""
+        namespace = resolve(namespace)
+        version = index_version(namespace)
+        with self._lock:
+            retriever = self._fresh(namespace, version)
+            if retriever is not None:
+                METRICS.inc("rag_namespace_requests_total", outcome="hit")
+                return retriever
+            reload = namespace in self._entries
+            gate = self._loading.setdefault(namespace, threading.Lock())
+        try:
+            with gate:
+                with self._lock:
+                    retriever = self._fresh(namespace, version)
+                if retriever is not None:             # chargé pendant qu'on attendait
+                    METRICS.inc("rag_namespace_requests_total", outcome="hit")
+                    return retriever
+                with span("rag_load", namespace=namespace):
+                    retriever = self._loader(k=self.k, namespace=namespace)
+                with self._lock:
+                    self._entries[namespace] = (retriever, version)
+                    self._entries.move_to_end(namespace)
+                    while len(self._entries) > self.max_namespaces:
+                        evicted, _ = self._entries.popitem(last=False)
+                        self._drop_gate(evicted)
+                        METRICS.inc("rag_namespace_evictions_total")
+        finally:
+            with self._lock:                          # échec de chargement : pas de verrou orphelin
+                self._drop_gate(namespace)
+        METRICS.inc("rag_namespace_requests_total", outcome="reload" if reload else "load")
+        return retriever
+
+    def evict(self, namespace: Optional[str] = None) -> bool:
+        namespace = resolve(namespace)
+        with self._lock:
+            found = self._entries.pop(namespace, None) is not None
+            self._drop_gate(namespace)
+            return found
+
+    def loaded(self) -> List[str]:
+        """Espaces en mémoire, du moins au plus récemment interrogé."""
+        with self._lock:
+            return list(self._entries)
+
 if __name__ == "__main__":
     # Petit test pour vérifier que le retriever fonctionne
+    import sys
+
     print("--- Test du Retriever ---")
     try:
-        retriever = get_retriever(k=2)
+        namespace = sys.argv[1] if len(sys.argv) > 1 else None   # ex: python -m rag.retriever desk-taux
+        retriever = get_retriever(k=2, namespace=namespace)
         print("Retriever initialisé avec succès.")
         
         # Test de recherche (similaire à une question de l'agent)